@@ -1,5 +1,10 @@
 from django.contrib import admin
-from .models import ScreeningEntity, Address, EntityID, SearchQuery
+from .models import ScreeningEntity, AlternateName, Address, EntityID, SearchQuery, Job, SourceImport
+from core.services.stats import dataset_stats
+
+class AlternateNameInline(admin.TabularInline):
+    model = AlternateName
+    extra = 0
 
 class AddressInline(admin.TabularInline):
     model = Address
@@ -12,10 +17,10 @@ class EntityIDInline(admin.TabularInline):
 @admin.register(ScreeningEntity)
 class ScreeningEntityAdmin(admin.ModelAdmin):
     list_display = ('name', 'source_list', 'entity_number', 'created_at', 'updated_at')
-    list_filter = ('source_list', 'sdn_type')
-    search_fields = ('name', 'alt_names', 'source_list', 'entity_number')
-    readonly_fields = ('created_at', 'updated_at')
-    inlines = [AddressInline, EntityIDInline]
+    list_filter = ('source_list', 'sdn_type', 'is_active')
+    search_fields = ('name', 'aliases__name', 'source_list', 'entity_number')
+    readonly_fields = ('created_at', 'updated_at', 'content_hash')
+    inlines = [AlternateNameInline, AddressInline, EntityIDInline]
     date_hierarchy = 'created_at'
     fieldsets = (
         ('Basic Information', {
@@ -26,16 +31,30 @@ class ScreeningEntityAdmin(admin.ModelAdmin):
                       'federal_register_notice', 'start_date', 'end_date', 'remarks')
         }),
         ('Metadata', {
-            'fields': ('score', 'created_at', 'updated_at')
+            'fields': ('score', 'is_active', 'content_hash', 'created_at', 'updated_at')
         }),
     )
 
+    def save_formset(self, request, form, formset, change):
+        super().save_formset(request, form, formset, change)
+        # Address deletes send no signals the statistics listen to
+        if formset.model is Address and formset.deleted_objects:
+            dataset_stats.mark_stale()
+
 @admin.register(Address)
 class AddressAdmin(admin.ModelAdmin):
     list_display = ('entity', 'country', 'city', 'address')
     list_filter = ('country',)
     search_fields = ('entity__name', 'country', 'city', 'address')
 
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        dataset_stats.mark_stale()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        dataset_stats.mark_stale()
+
 @admin.register(EntityID)
 class EntityIDAdmin(admin.ModelAdmin):
     list_display = ('entity', 'id_type', 'id_number', 'id_country')
@@ -48,3 +67,15 @@ class SearchQueryAdmin(admin.ModelAdmin):
     list_filter = ('timestamp',)
     search_fields = ('query_text', 'user')
     readonly_fields = ('timestamp',)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('job_type', 'status', 'progress', 'total', 'user', 'created_at', 'finished_at')
+    list_filter = ('job_type', 'status')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'worker', 'lease_expires_at')
+
+@admin.register(SourceImport)
+class SourceImportAdmin(admin.ModelAdmin):
+    list_display = ('source', 'code', 'source_last_updated', 'synced_marker', 'synced_at', 'checked_at')
+    search_fields = ('source', 'code')
+    readonly_fields = ('checked_at', 'synced_at', 'last_error')
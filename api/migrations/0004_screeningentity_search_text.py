@@ -0,0 +1,107 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:33
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE api_screeningentity ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', search_text)) STORED",
+    "CREATE INDEX api_screeni_search_vector_gin ON api_screeningentity USING gin (search_vector)",
+    "CREATE INDEX api_screeni_search_text_trgm ON api_screeningentity USING gin (search_text gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS api_screeni_search_text_trgm",
+    "DROP INDEX IF EXISTS api_screeni_search_vector_gin",
+    "ALTER TABLE api_screeningentity DROP COLUMN IF EXISTS search_vector",
+]
+
+# External-content FTS5 table kept in step with api_screeningentity by triggers
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE api_screeningentity_fts USING fts5("
+    "search_text, content='api_screeningentity', content_rowid='id')",
+    "CREATE TRIGGER api_screeningentity_fts_ai AFTER INSERT ON api_screeningentity BEGIN "
+    "INSERT INTO api_screeningentity_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER api_screeningentity_fts_ad AFTER DELETE ON api_screeningentity BEGIN "
+    "INSERT INTO api_screeningentity_fts(api_screeningentity_fts, rowid, search_text) "
+    "VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER api_screeningentity_fts_au AFTER UPDATE OF search_text ON api_screeningentity BEGIN "
+    "INSERT INTO api_screeningentity_fts(api_screeningentity_fts, rowid, search_text) "
+    "VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO api_screeningentity_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "INSERT INTO api_screeningentity_fts(api_screeningentity_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS api_screeningentity_fts_au",
+    "DROP TRIGGER IF EXISTS api_screeningentity_fts_ad",
+    "DROP TRIGGER IF EXISTS api_screeningentity_fts_ai",
+    "DROP TABLE IF EXISTS api_screeningentity_fts",
+]
+
+
+def fold(text):
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return NON_ALNUM.sub(' ', stripped.casefold()).strip()
+
+
+def populate_search_text(apps, schema_editor):
+    ScreeningEntity = apps.get_model('api', 'ScreeningEntity')
+    batch = []
+    for entity in ScreeningEntity.objects.only('id', 'name', 'alt_names', 'remarks').iterator(chunk_size=2000):
+        alt_names = entity.alt_names if isinstance(entity.alt_names, list) else [entity.alt_names]
+        parts = [entity.name, *alt_names, entity.remarks]
+        entity.search_text = ' '.join(fold(part) for part in parts if isinstance(part, str) and part)
+        batch.append(entity)
+        if len(batch) >= 2000:
+            ScreeningEntity.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        ScreeningEntity.objects.bulk_update(batch, ['search_text'])
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = POSTGRES_FORWARD
+    elif vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            if 'ENABLE_FTS5' not in {row[0] for row in cursor.fetchall()}:
+                return  # Falls back to LIKE matching on search_text
+        statements = SQLITE_FORWARD
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}.get(vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='screeningentity',
+            name='search_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.RunPython(populate_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
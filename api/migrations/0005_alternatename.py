@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:35
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def fold(text):
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return NON_ALNUM.sub(' ', stripped.casefold()).strip()
+
+
+def populate_aliases(apps, schema_editor):
+    ScreeningEntity = apps.get_model('api', 'ScreeningEntity')
+    AlternateName = apps.get_model('api', 'AlternateName')
+    batch = []
+    for entity_id, alt_names in ScreeningEntity.objects.values_list('id', 'alt_names').iterator(chunk_size=2000):
+        if not isinstance(alt_names, list):
+            alt_names = [alt_names]
+        seen = set()
+        for name in alt_names:
+            if not isinstance(name, str) or not name.strip() or name in seen:
+                continue
+            seen.add(name)
+            batch.append(AlternateName(entity_id=entity_id, name=name, normalized_name=fold(name)))
+        if len(batch) >= 2000:
+            AlternateName.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        AlternateName.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_screeningentity_search_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlternateName',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField()),
+                ('normalized_name', models.TextField(db_index=True)),
+                ('entity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='api.screeningentity')),
+            ],
+            options={
+                'verbose_name': 'Alternate Name',
+                'verbose_name_plural': 'Alternate Names',
+            },
+        ),
+        migrations.RunPython(populate_aliases, migrations.RunPython.noop),
+    ]
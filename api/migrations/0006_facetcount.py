@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:42
+
+from django.db import migrations, models
+
+
+def mark_stale(apps, schema_editor):
+    # The first read of the statistics aggregates them from the existing data
+    FacetCount = apps.get_model('api', 'FacetCount')
+    FacetCount.objects.create(facet='_state', value='stale', count=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_alternatename'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=50)),
+                ('value', models.CharField(blank=True, default='', max_length=255)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Facet Count',
+                'verbose_name_plural': 'Facet Counts',
+                'constraints': [models.UniqueConstraint(fields=('facet', 'value'), name='unique_facet_value')],
+            },
+        ),
+        migrations.RunPython(mark_stale, migrations.RunPython.noop),
+    ]
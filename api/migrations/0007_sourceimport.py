@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_facetcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True)),
+                ('code', models.CharField(blank=True, max_length=20, null=True)),
+                ('source_last_updated', models.CharField(blank=True, max_length=100, null=True)),
+                ('last_imported', models.CharField(blank=True, max_length=100, null=True)),
+                ('synced_marker', models.CharField(blank=True, max_length=255, null=True)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('checked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Source Import',
+                'verbose_name_plural': 'Source Imports',
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:53
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_global_version(apps, schema_editor):
+    # Every version stamp is drawn from this row's counter
+    SourceVersion = apps.get_model('api', 'SourceVersion')
+    SourceVersion.objects.create(source_list='*', version=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_list', models.CharField(max_length=255, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Source Version',
+                'verbose_name_plural': 'Source Versions',
+            },
+        ),
+        migrations.CreateModel(
+            name='ScreeningResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('sources', models.CharField(blank=True, default='', max_length=255)),
+                ('version', models.BigIntegerField()),
+                ('matches', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Screening Result',
+                'verbose_name_plural': 'Screening Results',
+                'indexes': [models.Index(fields=['sources', 'version'], name='api_screeni_sources_b61cf2_idx')],
+            },
+        ),
+        migrations.RunPython(create_global_version, migrations.RunPython.noop),
+    ]
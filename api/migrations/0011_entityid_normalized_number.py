@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:59
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_id_number(value):
+    decomposed = unicodedata.normalize('NFKD', str(value or ''))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return NON_ALNUM.sub('', stripped.casefold()).upper()
+
+
+def populate_normalized_number(apps, schema_editor):
+    EntityID = apps.get_model('api', 'EntityID')
+    batch = []
+    for entity_id in EntityID.objects.only('id', 'id_number').iterator(chunk_size=2000):
+        entity_id.normalized_number = normalize_id_number(entity_id.id_number) or None
+        batch.append(entity_id)
+        if len(batch) >= 2000:
+            EntityID.objects.bulk_update(batch, ['normalized_number'])
+            batch = []
+    if batch:
+        EntityID.objects.bulk_update(batch, ['normalized_number'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_address_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entityid',
+            name='normalized_number',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='entityid',
+            index=models.Index(fields=['normalized_number'], name='api_entityi_normali_79aa68_idx'),
+        ),
+        migrations.RunPython(populate_normalized_number, migrations.RunPython.noop),
+    ]
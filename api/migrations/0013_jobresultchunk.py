@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_job_lease_and_payload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobResultChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.IntegerField()),
+                ('rows', models.JSONField(default=list)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='result_chunks', to='api.job')),
+            ],
+            options={
+                'verbose_name': 'Job Result Chunk',
+                'verbose_name_plural': 'Job Result Chunks',
+                'constraints': [models.UniqueConstraint(fields=('job', 'index'), name='unique_job_result_chunk')],
+            },
+        ),
+    ]
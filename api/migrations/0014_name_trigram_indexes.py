@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:50
+
+from django.db import migrations
+
+
+# Trigram similarity is matched against names and aliases on their own; over the
+# whole search_text (remarks included) a short query scored too low to match
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX api_screeni_name_trgm ON api_screeningentity USING gin (name gin_trgm_ops)",
+    "CREATE INDEX api_alterna_name_trgm ON api_alternatename USING gin (name gin_trgm_ops)",
+    "DROP INDEX IF EXISTS api_screeni_search_text_trgm",
+]
+
+POSTGRES_BACKWARD = [
+    "CREATE INDEX api_screeni_search_text_trgm ON api_screeningentity USING gin (search_text gin_trgm_ops)",
+    "DROP INDEX IF EXISTS api_alterna_name_trgm",
+    "DROP INDEX IF EXISTS api_screeni_name_trgm",
+]
+
+
+def create_name_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_FORWARD:
+            schema_editor.execute(statement)
+
+
+def drop_name_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in POSTGRES_BACKWARD:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_jobresultchunk'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_trigram_indexes, drop_name_trigram_indexes),
+    ]
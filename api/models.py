@@ -27,9 +27,31 @@ class ScreeningEntity(models.Model):
     # API identifier from source
     source_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
     
+    # Folded name, alt names and remarks, indexed for full-text and trigram search
+    search_text = models.TextField(blank=True, default='')
+    
+    # Mirror sync bookkeeping
+    content_hash = models.CharField(max_length=64, blank=True, null=True)  # SHA-256 of the source record
+    is_active = models.BooleanField(default=True)  # False once the entity disappears from the list
+
+    # Fields single-row saves compare against their loaded values (statistics, screening cache)
+    TRACKED_FIELDS = ('source_list', 'is_active')
+
     def __str__(self):
         return self.name
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.TRACKED_FIELDS
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {name: self.__dict__[name] for name in self.TRACKED_FIELDS if name in self.__dict__}
+
     class Meta:
         verbose_name = "Screening Entity"
         verbose_name_plural = "Screening Entities"
@@ -37,9 +59,27 @@ class ScreeningEntity(models.Model):
             models.Index(fields=['name']),
             models.Index(fields=['source_list']),
             models.Index(fields=['source_id']),
+            models.Index(fields=['is_active']),
         ]
 
 
+class AlternateName(models.Model):
+    """
+    Model for storing the alternative names (aliases) of a screening entity,
+    with a folded form for indexed lookups.
+    """
+    entity = models.ForeignKey(ScreeningEntity, related_name='aliases', on_delete=models.CASCADE)
+    name = models.TextField()
+    normalized_name = models.TextField(db_index=True)  # Diacritics stripped, case folded, punctuation collapsed
+    
+    def __str__(self):
+        return self.name
+    
+    class Meta:
+        verbose_name = "Alternate Name"
+        verbose_name_plural = "Alternate Names"
+
+
 class Address(models.Model):
     """
     Model for storing addresses associated with a screening entity.
@@ -50,6 +90,12 @@ class Address(models.Model):
     state = models.CharField(max_length=255, blank=True, null=True)
     country = models.CharField(max_length=255, blank=True, null=True)
     postal_code = models.CharField(max_length=50, blank=True, null=True)
+    # Normalized address index (folded street tokens, city, state and postal code, ISO country)
+    street_key = models.TextField(blank=True, null=True, editable=False)
+    city_key = models.CharField(max_length=255, blank=True, null=True, editable=False)
+    state_key = models.CharField(max_length=255, blank=True, null=True, editable=False)
+    postal_key = models.CharField(max_length=50, blank=True, null=True, editable=False)
+    country_key = models.CharField(max_length=64, blank=True, null=True, editable=False)
     
     def __str__(self):
         parts = []
@@ -68,6 +114,10 @@ class Address(models.Model):
         indexes = [
             models.Index(fields=['country']),
             models.Index(fields=['city']),
+            models.Index(fields=['country_key', 'city_key']),
+            models.Index(fields=['city_key']),
+            models.Index(fields=['state_key']),
+            models.Index(fields=['postal_key']),
         ]
 
 
@@ -78,6 +128,8 @@ class EntityID(models.Model):
     entity = models.ForeignKey(ScreeningEntity, related_name='ids', on_delete=models.CASCADE)
     id_type = models.CharField(max_length=100)
     id_number = models.CharField(max_length=255)
+    # Upper-cased letters and digits of id_number, for matching regardless of spacing and punctuation
+    normalized_number = models.CharField(max_length=255, blank=True, null=True, editable=False)
     id_country = models.CharField(max_length=255, blank=True, null=True)
     issue_date = models.DateField(blank=True, null=True)
     expiration_date = models.DateField(blank=True, null=True)
@@ -91,6 +143,7 @@ class EntityID(models.Model):
         indexes = [
             models.Index(fields=['id_type']),
             models.Index(fields=['id_number']),
+            models.Index(fields=['normalized_number']),
         ]
 
 
@@ -114,3 +167,171 @@ class SearchQuery(models.Model):
             models.Index(fields=['query_text']),
             models.Index(fields=['timestamp']),
         ]
+
+
+class Job(models.Model):
+    """
+    Model for long-running background work (syncs, batch screenings) queued
+    in the database and drained by the run_jobs worker command.
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    job_type = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    params = models.JSONField(blank=True, null=True)  # Arguments for the job handler
+    payload = models.JSONField(blank=True, null=True)  # Bulk input (e.g. batch screening rows), never listed
+    progress = models.IntegerField(default=0)  # Units of work done
+    total = models.IntegerField(default=0)  # Units of work expected (0 if unknown)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    user = models.CharField(max_length=255, blank=True, null=True)  # Optional user identifier
+    worker = models.CharField(max_length=255, blank=True, null=True)  # Worker that claimed the job
+    lease_expires_at = models.DateTimeField(blank=True, null=True)  # Renewed while running; another worker may re-claim after
+    
+    # Timestamps
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.job_type} #{self.pk} ({self.status})"
+    
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+
+class JobResultChunk(models.Model):
+    """
+    Model for a consecutive slice of a job's result rows (e.g. batch
+    screening results), saved as the job runs instead of held in memory.
+    """
+    job = models.ForeignKey(Job, related_name='result_chunks', on_delete=models.CASCADE)
+    index = models.IntegerField()  # Position of the slice in the result
+    rows = models.JSONField(default=list)
+    
+    def __str__(self):
+        return f"Job #{self.job_id} result chunk {self.index}"
+    
+    class Meta:
+        verbose_name = "Job Result Chunk"
+        verbose_name_plural = "Job Result Chunks"
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'index'], name='unique_job_result_chunk'),
+        ]
+
+
+class FacetCount(models.Model):
+    """
+    Model for pre-aggregated dashboard statistics: row counters and the
+    distinct values (with reference counts) used in filter dropdowns.
+    Maintained incrementally on ingest by core.services.stats.
+    """
+    facet = models.CharField(max_length=50)  # e.g. 'entities', 'country', 'source_list'
+    value = models.CharField(max_length=255, blank=True, default='')  # '' for plain counters
+    count = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.facet}={self.value}: {self.count}" if self.value else f"{self.facet}: {self.count}"
+    
+    class Meta:
+        verbose_name = "Facet Count"
+        verbose_name_plural = "Facet Counts"
+        constraints = [
+            models.UniqueConstraint(fields=['facet', 'value'], name='unique_facet_value'),
+        ]
+
+
+class SourceImport(models.Model):
+    """
+    Model recording, for each upstream source list, the version reported by
+    the CSL API /sources endpoint and the version last mirrored locally.
+    Compared by core.services.refresh to re-sync only the lists that changed.
+    """
+    source = models.CharField(max_length=255, unique=True)  # Source as reported by /sources
+    code = models.CharField(max_length=20, blank=True, null=True)  # Source list code, e.g. 'SDN'
+    source_last_updated = models.CharField(max_length=100, blank=True, null=True)  # Upstream list date
+    last_imported = models.CharField(max_length=100, blank=True, null=True)  # Upstream import time
+    synced_marker = models.CharField(max_length=255, blank=True, null=True)  # Upstream version last synced
+    synced_at = models.DateTimeField(blank=True, null=True)
+    checked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.code or self.source} ({self.source_last_updated or 'unknown'})"
+    
+    class Meta:
+        verbose_name = "Source Import"
+        verbose_name_plural = "Source Imports"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Model holding the state of a token bucket shared by every process that
+    calls the CSL API (used by core.services.rate_limiter.DatabaseTokenStore).
+    """
+    name = models.CharField(max_length=100, unique=True)
+    tokens = models.FloatField(default=0)
+    updated_at = models.FloatField(default=0)  # Unix time of the last refill
+    
+    def __str__(self):
+        return f"{self.name}: {self.tokens:.1f} tokens"
+    
+    class Meta:
+        verbose_name = "Rate Limit Bucket"
+        verbose_name_plural = "Rate Limit Buckets"
+
+
+class SourceVersion(models.Model):
+    """
+    Model holding a version stamp per source list, bumped whenever ingest or
+    an edit changes the list's entities. The '*' row is the global counter
+    every stamp is drawn from, so stamps only ever increase.
+    """
+    GLOBAL = '*'
+    
+    source_list = models.CharField(max_length=255, unique=True)  # List code, or the stored name
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.source_list} v{self.version}"
+    
+    class Meta:
+        verbose_name = "Source Version"
+        verbose_name_plural = "Source Versions"
+
+
+class ScreeningResult(models.Model):
+    """
+    Model caching the matches found for a normalized screening input. An
+    entry is valid while its version is at least the current stamp of the
+    source lists it covers (see core.services.screening_cache).
+    """
+    key = models.CharField(max_length=64, unique=True)  # SHA-256 of the normalized input and options
+    sources = models.CharField(max_length=255, blank=True, default='')  # Lists covered; '' for all
+    version = models.BigIntegerField()
+    matches = models.JSONField(default=list)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.key[:12]} v{self.version}"
+    
+    class Meta:
+        verbose_name = "Screening Result"
+        verbose_name_plural = "Screening Results"
+        indexes = [
+            models.Index(fields=['sources', 'version']),
+        ]
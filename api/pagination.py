@@ -0,0 +1,228 @@
+import base64
+import binascii
+import json
+import operator
+from datetime import date, datetime
+from decimal import Decimal
+from functools import reduce
+from typing import Any, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# Planner estimates below this are replaced by an exact count, which is cheap at that size
+ESTIMATE_EXACT_BELOW = 10000
+
+COUNT_MODES = ('exact', 'estimate', 'none')
+
+
+def estimate_count(queryset: QuerySet) -> Tuple[int, bool]:
+    """
+    Estimate the number of rows in a queryset from the query planner.
+
+    On PostgreSQL this reads the planner's row estimate from EXPLAIN, which
+    costs no table scan. Small estimates, and other backends (which have no
+    comparable planner statistics), fall back to an exact COUNT(*).
+
+    Args:
+        queryset: Queryset to count
+
+    Returns:
+        Tuple of (count, whether the count is an estimate)
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate >= ESTIMATE_EXACT_BELOW:
+            return estimate, True
+    return queryset.count(), False
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the queryset's ordering columns.
+
+    Each page is fetched with a WHERE clause on the last row's ordering values
+    (e.g. updated_at, id) instead of an OFFSET, so deep pages cost the same as
+    the first. The primary key is appended as a tie-breaker, so the ordering
+    columns should be non-null. Ordering can still be changed with
+    OrderingFilter; cursors encode values for whichever ordering produced them.
+
+    The total count is controlled with ?count=exact|estimate|none (default
+    from the CSL_PAGINATION_COUNT setting).
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    # Used when the queryset isn't ordered
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering_fields = self.get_ordering(queryset)
+        self.count, self.count_is_estimate = self.get_count(queryset, request)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['r'])
+
+        queryset = queryset.order_by(*self.ordering_fields)
+        if cursor:
+            try:
+                queryset = queryset.filter(self.position_filter(cursor['v'], reverse))
+            except (DjangoValidationError, TypeError, ValueError):
+                # A value the ordering field can't take (e.g. text for an id)
+                raise NotFound('Invalid cursor')
+        if reverse:
+            queryset = queryset.reverse()
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        page = rows[:self.page_size]
+
+        if reverse:
+            page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        if page:
+            self.next_position = self.position(page[-1])
+            self.previous_position = self.position(page[0])
+        else:
+            # Empty page: both links point back at the requested position
+            self.next_position = self.previous_position = cursor['v'] if cursor else None
+
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'count_is_estimate': self.count_is_estimate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True, 'example': 123},
+                'count_is_estimate': {'type': 'boolean'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def get_count(self, queryset: QuerySet, request) -> Tuple[Optional[int], bool]:
+        mode = request.query_params.get(self.count_query_param, settings.CSL_PAGINATION_COUNT)
+        if mode not in COUNT_MODES:
+            raise ValidationError({self.count_query_param: f"Must be one of: {', '.join(COUNT_MODES)}"})
+        if mode == 'exact':
+            return queryset.count(), False
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None, False
+
+    def get_ordering(self, queryset: QuerySet) -> List[str]:
+        ordering = list(queryset.query.order_by) or list(self.ordering)
+        fields = []
+        for field in ordering:
+            if not isinstance(field, str):
+                raise ImproperlyConfigured('KeysetPagination only supports ordering by field names')
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            fields.append(('-' if descending else '') + ('id' if name == 'pk' else name))
+        if not any(field.lstrip('-') == 'id' for field in fields):
+            fields.append('-id' if fields[0].startswith('-') else 'id')
+        return fields
+
+    def position(self, obj) -> List[Any]:
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering_fields]
+
+    def position_filter(self, values: List[Any], reverse: bool) -> Q:
+        """
+        Build the lexicographic "after this row" condition:
+        (a > x) OR (a = x AND b > y) OR ..., with each comparison flipped for
+        descending columns and again when paging backwards.
+        """
+        if len(values) != len(self.ordering_fields):
+            raise NotFound('Invalid cursor')
+        conditions = []
+        equal = Q()
+        for field, value in zip(self.ordering_fields, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            conditions.append(equal & Q(**{f'{name}__{lookup}': value}))
+            equal &= Q(**{name: value})
+        return reduce(operator.or_, conditions)
+
+    def encode_cursor(self, values: List[Any], reverse: bool) -> str:
+        payload = json.dumps({'v': [self.encode_value(value) for value in values], 'r': int(reverse)},
+                             separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request) -> Optional[dict]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            values = cursor.get('v')
+            # Crafted cursors must fail like corrupt ones: one scalar per ordering field and a 0/1 direction
+            if (
+                not isinstance(values, list) or len(values) != len(self.ordering_fields)
+                or not all(value is None or isinstance(value, (str, int, float)) for value in values)
+                or not isinstance(cursor.get('r'), int) or cursor['r'] not in (0, 1)
+            ):
+                raise ValueError
+        except (binascii.Error, UnicodeError, ValueError, AttributeError):
+            raise NotFound('Invalid cursor')
+        return cursor
+
+    @staticmethod
+    def encode_value(value: Any) -> Any:
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next or self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous or self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
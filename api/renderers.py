@@ -0,0 +1,15 @@
+from rest_framework.renderers import JSONRenderer
+
+from core.services.metrics import metrics
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that times encoding response data as the 'serialize' stage.
+    Set as the default renderer, so every API view is timed without
+    touching its serializers.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.timer('serialize'):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -1,5 +1,16 @@
+from collections import Counter
+
 from rest_framework import serializers
-from .models import ScreeningEntity, Address, EntityID, SearchQuery
+from .models import ScreeningEntity, AlternateName, Address, EntityID, SearchQuery, Job
+from core.services.search_backend import build_aliases, build_search_text
+from core.services.stats import dataset_stats
+
+
+def set_aliases(entity):
+    """Create the AlternateName rows for an entity's alt_names"""
+    AlternateName.objects.bulk_create(
+        AlternateName(entity=entity, **alias) for alias in build_aliases(entity.alt_names)
+    )
 
 
 class AddressSerializer(serializers.ModelSerializer):
@@ -55,7 +66,11 @@ class ScreeningEntityCreateUpdateSerializer(serializers.ModelSerializer):
         addresses_data = validated_data.pop('addresses', [])
         ids_data = validated_data.pop('ids', [])
         
+        validated_data['search_text'] = build_search_text(
+            validated_data.get('name'), validated_data.get('alt_names'), validated_data.get('remarks')
+        )
         entity = ScreeningEntity.objects.create(**validated_data)
+        set_aliases(entity)
         
         # Create addresses
         for address_data in addresses_data:
@@ -75,12 +90,21 @@ class ScreeningEntityCreateUpdateSerializer(serializers.ModelSerializer):
         # Update ScreeningEntity fields
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
+        instance.search_text = build_search_text(instance.name, instance.alt_names, instance.remarks)
         instance.save()
         
+        if 'alt_names' in validated_data:
+            instance.aliases.all().delete()
+            set_aliases(instance)
+        
         # Update addresses if provided
         if addresses_data is not None:
-            # Remove existing addresses
+            # Remove existing addresses (a bulk delete, so take their countries off the statistics here)
+            replaced = Counter(instance.addresses.exclude(country__isnull=True).exclude(country='').values_list(
+                'country', flat=True
+            ))
             instance.addresses.all().delete()
+            dataset_stats.apply(Counter({('country', country): -count for country, count in replaced.items()}))
             # Create new addresses
             for address_data in addresses_data:
                 Address.objects.create(entity=instance, **address_data)
@@ -102,4 +126,35 @@ class SearchQuerySerializer(serializers.ModelSerializer):
     class Meta:
         model = SearchQuery
         fields = ['id', 'query_text', 'results_count', 'user', 'timestamp', 'search_params']
-        read_only_fields = ['id', 'timestamp']
\ No newline at end of file
+        read_only_fields = ['id', 'timestamp']
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for Job status (the input rows and the result are served separately)"""
+    
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'job_type', 'status', 'params', 'progress', 'total', 'error',
+            'user', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'progress', 'total', 'error', 'user',
+            'created_at', 'started_at', 'finished_at'
+        ]
+    
+    def validate_job_type(self, value):
+        """Only accept job types that have a handler"""
+        from core.services.jobs import JOB_HANDLERS
+        if value not in JOB_HANDLERS:
+            raise serializers.ValidationError(
+                f"Unknown job type. Choose from: {', '.join(sorted(JOB_HANDLERS))}"
+            )
+        return value
+
+
+class JobListSerializer(JobSerializer):
+    """Serializer for job listings, without the handler arguments"""
+    
+    class Meta(JobSerializer.Meta):
+        fields = [field for field in JobSerializer.Meta.fields if field != 'params']
@@ -1,3 +1,953 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency: pip install "csl-api-app[export]"
+    pq = None
+
+from api.models import ScreeningEntity, Address, EntityID, FacetCount, Job, SearchQuery
+from core.services.addresses import filter_entities_by_address
+from core.services.csl_service import CSLService, csl_service
+from core.services.export import stream_export
+from core.services.facets import facets_from_queryset
+from core.services.jobs import claim_next_job, run_job
+from core.services.matching import name_matcher
+from core.services.metrics import Metrics, count_queries, metrics, observe_query
+from core.services.refresh import SourceRefresher
+from core.services.screening import BatchScreener
+from core.services.screening_cache import screening_cache
+from core.services.stats import dataset_stats
+
+
+def make_entities(count):
+    """Store `count` entities with two addresses and two IDs each"""
+    return csl_service.store_entities([
+        {
+            'id': f'test-{i}',
+            'name': f'Acme Trading {i}',
+            'alt_names': [f'Acme Intl {i}'],
+            'source_list': 'SDN',
+            'addresses': [
+                {'address': f'{i} Main St', 'city': 'Tehran', 'country': 'IR'},
+                {'address': f'{i} Side St', 'city': 'Dubai', 'country': 'AE'},
+            ],
+            'ids': [
+                {'type': 'Passport', 'number': f'P{i}'},
+                {'type': 'Tax ID', 'number': f'T{i}'},
+            ],
+        }
+        for i in range(count)
+    ])
+
+
+class EntityQueryCountTests(TestCase):
+    """
+    Guards against N+1 queries: each endpoint must cost the same number
+    of queries however many entities (and related rows) are returned.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        make_entities(15)
+        # on_commit hooks don't fire inside TestCase, so rebuild the index directly
+        name_matcher.load()
+
+    def test_list(self):
+        # count, entities, addresses, ids
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/v1/entities/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 15)
+        self.assertEqual(len(response.data['results'][0]['addresses']), 2)
+
+    def test_detail(self):
+        entity = ScreeningEntity.objects.first()
+        # entity, addresses, ids
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/v1/entities/{entity.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['ids']), 2)
+
+    def test_fuzzy_search(self):
+        # entities, addresses, ids; facets are counted from the loaded matches
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/v1/entities/search/', {'q': 'Acme Tradng'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 15)
+        self.assertEqual(response.data['facets']['source_list'], [{'value': 'SDN', 'count': 15}])
+
+    def test_full_text_search(self):
+        # Warm the once-per-connection search index probe
+        self.client.get('/api/v1/entities/search/', {'q': 'acme', 'fuzzy_name': 'false'})
+        # facet counts, count, entities, addresses, ids
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/v1/entities/search/', {'q': 'acme', 'fuzzy_name': 'false'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 15)
+        self.assertEqual(response.data['facets']['country'], [{'value': 'AE', 'count': 15}, {'value': 'IR', 'count': 15}])
+
+        # Prefix matching on every term, across alt names
+        response = self.client.get('/api/v1/entities/search/', {'q': 'ACME intl 1', 'fuzzy_name': 'false'})
+        self.assertEqual(
+            sorted(entity['name'] for entity in response.data['results']),
+            ['Acme Trading 1', 'Acme Trading 10', 'Acme Trading 11', 'Acme Trading 12',
+             'Acme Trading 13', 'Acme Trading 14']
+        )
+
+        response = self.client.get('/api/v1/entities/', {'search': 'trad 7'})
+        self.assertEqual([entity['name'] for entity in response.data['results']], ['Acme Trading 7'])
+
+        # Cursor pages of a ranked search resume after the last row's rank
+        names = []
+        response = self.client.get('/api/v1/entities/', {'search': 'acme', 'page_size': 4})
+        while True:
+            names += [entity['name'] for entity in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(sorted(names), sorted(f'Acme Trading {i}' for i in range(15)))
+
+    def test_export(self):
+        # entities, addresses, ids: one round trip each per chunk of rows
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/v1/entities/export/')
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(lines), 15)
+
+    def test_alias_search(self):
+        # facet counts, count, entities (alias subquery inline), addresses, ids
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/v1/entities/search/', {'alias': 'ACME intl 12', 'fuzzy_name': 'false'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['alt_names'], ['Acme Intl 12'])
+
+
+class AlternateNameTests(TestCase):
+    """
+    AlternateName rows follow alt_names: they're written on create, replaced
+    when alt_names changes and left alone by updates that don't touch it.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def aliases(self, entity):
+        return sorted(entity.aliases.values_list('name', 'normalized_name'))
+
+    def test_create_and_update(self):
+        response = self.client.post('/api/v1/entities/', {
+            'name': 'Globex', 'source_list': 'SDN', 'source_id': 'alias-1',
+            'alt_names': ['Société Générale, S.A.', 'Globex Corp', 'Globex Corp', ' '],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        entity = ScreeningEntity.objects.get(source_id='alias-1')
+        # Duplicates and blank names are dropped
+        self.assertEqual(
+            self.aliases(entity), [('Globex Corp', 'globex corp'), ('Société Générale, S.A.', 'societe generale s a')]
+        )
+
+        response = self.client.patch(
+            f'/api/v1/entities/{entity.pk}/', {'alt_names': ['Initech']}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.aliases(entity), [('Initech', 'initech')])
+
+        response = self.client.patch(f'/api/v1/entities/{entity.pk}/', {'remarks': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.aliases(entity), [('Initech', 'initech')])
+
+        response = self.client.get('/api/v1/entities/search/', {'alias': 'INITECH', 'fuzzy_name': 'false'})
+        self.assertEqual([e['source_id'] for e in response.data['results']], ['alias-1'])
+
+        self.client.patch(f'/api/v1/entities/{entity.pk}/', {'alt_names': []}, format='json')
+        self.assertEqual(self.aliases(entity), [])
+
+    def test_reingest_replaces_aliases(self):
+        make_entities(2)
+        entity = ScreeningEntity.objects.get(source_id='test-1')
+        self.assertEqual(self.aliases(entity), [('Acme Intl 1', 'acme intl 1')])
+
+        csl_service.store_entities([{
+            'id': 'test-1', 'name': 'Acme Trading 1', 'source_list': 'SDN',
+            'alt_names': ['Acme Global 1', 'ACME-Global 1'],
+        }])
+        self.assertEqual(
+            self.aliases(entity), [('ACME-Global 1', 'acme global 1'), ('Acme Global 1', 'acme global 1')]
+        )
+        # The other entity's aliases are untouched
+        other = ScreeningEntity.objects.get(source_id='test-0')
+        self.assertEqual(self.aliases(other), [('Acme Intl 0', 'acme intl 0')])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Trigram matching needs PostgreSQL (pg_trgm)')
+class TrigramSearchTests(TestCase):
+    """
+    Trigram similarity is scored against names and aliases, so long remarks
+    don't dilute it below the match threshold.
+    """
+
+    def setUp(self):
+        remarks = 'Designated for providing financial, material or technological support. ' * 5
+        csl_service.store_entities([
+            {'id': 'trgm-1', 'name': 'Mohammad Rezaei', 'alt_names': ['Mohammed Rezai'], 'remarks': remarks},
+            {'id': 'trgm-2', 'name': 'Aleksandr Ivanov', 'remarks': remarks},
+            {'id': 'trgm-3', 'name': 'Globex Industries', 'remarks': remarks},
+        ])
+
+    def found(self, query):
+        response = self.client.get('/api/v1/entities/', {'search': query})
+        return [entity['name'] for entity in response.data['results']]
+
+    def test_typos_and_transliterations(self):
+        self.assertEqual(self.found('Mohamad Rezaie'), ['Mohammad Rezaei'])
+        self.assertEqual(self.found('Alexander Ivanov'), ['Aleksandr Ivanov'])
+        self.assertEqual(self.found('Globx Industrie'), ['Globex Industries'])
+
+
+@override_settings(CSL_MATCH_LIMIT=3)
+class FilteredFuzzySearchTests(TestCase):
+    """
+    Filters apply to the fuzzy candidates before they're cut to the match
+    limit, so a weaker match on the filtered list isn't lost.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        make_entities(5)
+        csl_service.store_entities([{
+            'id': 'el-1', 'name': 'Acme Tradeco Holdings', 'source_list': 'EL', 'sdn_type': 'Entity',
+            'addresses': [{'city': 'Shenzhen', 'country': 'CN'}],
+        }])
+        name_matcher.load()
+
+    def test_filters_before_limit(self):
+        response = self.client.get('/api/v1/entities/search/', {'q': 'Acme Trading'})
+        self.assertEqual(response.data['count'], 3)
+        self.assertNotIn('Acme Tradeco Holdings', [entity['name'] for entity in response.data['results']])
+
+        for filters in ({'source_list': 'EL'}, {'country': 'CN'}, {'sdn_type': 'Entity'}):
+            response = self.client.get('/api/v1/entities/search/', {'q': 'Acme Trading', **filters})
+            self.assertEqual(response.data['count'], 1, filters)
+            self.assertEqual(response.data['results'][0]['name'], 'Acme Tradeco Holdings')
+            self.assertEqual(response.data['facets']['source_list'], [{'value': 'EL', 'count': 1}])
+
+        response = self.client.get('/api/v1/entities/search/', {'q': 'Acme Trading', 'source_list': 'SDN', 'country': 'CN'})
+        self.assertEqual(response.data['count'], 0)
+
+
+class FacetTests(TestCase):
+    """
+    Search results carry counts per source list, entity type and country over
+    every match, not just the page, and the fuzzy and full-text paths agree.
+    """
+
+    def setUp(self):
+        make_entities(22)
+        csl_service.store_entities([
+            {
+                'id': 'el-1', 'name': 'Acme Tradeco', 'source_list': 'EL', 'sdn_type': 'Entity',
+                'addresses': [{'city': 'Shenzhen', 'country': 'CN'}, {'city': 'Beijing', 'country': 'CN'}],
+            },
+            {'id': 'el-2', 'name': 'Acme Trading Partners', 'source_list': 'EL', 'sdn_type': 'Individual'},
+        ])
+        ScreeningEntity.objects.filter(source_id='test-21').update(is_active=False)
+        name_matcher.load()
+        self.client = APIClient()
+
+    def facets(self, response):
+        return {
+            facet: [(item['value'], item['count']) for item in items]
+            for facet, items in response.data['facets'].items()
+        }
+
+    def test_counts_span_pages(self):
+        response = self.client.get('/api/v1/entities/search/', {'q': 'acme', 'fuzzy_name': 'false'})
+        self.assertEqual(response.data['count'], 23)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(self.facets(response), {
+            'source_list': [('SDN', 21), ('EL', 2)],
+            'sdn_type': [('Entity', 1), ('Individual', 1)],
+            # The entity with two Chinese addresses is counted once
+            'country': [('AE', 21), ('IR', 21), ('CN', 1)],
+        })
+
+    def test_filters_narrow_counts(self):
+        response = self.client.get(
+            '/api/v1/entities/search/', {'q': 'acme', 'fuzzy_name': 'false', 'source_list': 'EL'}
+        )
+        self.assertEqual(self.facets(response), {
+            'source_list': [('EL', 2)],
+            'sdn_type': [('Entity', 1), ('Individual', 1)],
+            'country': [('CN', 1)],
+        })
+
+        response = self.client.get('/api/v1/entities/search/', {'q': 'acme', 'facets': 'false'})
+        self.assertNotIn('facets', response.data)
+
+    def test_fuzzy_matches_full_text(self):
+        for params in ({}, {'country': 'CN'}, {'sdn_type': 'Individual'}):
+            fuzzy = self.client.get('/api/v1/entities/search/', {'q': 'Acme Trading', **params})
+            self.assertGreater(fuzzy.data['count'], 0, params)
+            ids = []
+            response = fuzzy
+            while True:
+                ids += [entity['id'] for entity in response.data['results']]
+                if not response.data['next']:
+                    break
+                response = self.client.get(response.data['next'])
+            # The same matches, counted in the database
+            matched = ScreeningEntity.objects.filter(pk__in=ids)
+            self.assertEqual(fuzzy.data['facets'], facets_from_queryset(matched), params)
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Walks the keyset-paginated entity listing forwards and back.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        make_entities(25)
+
+    def test_walk_pages(self):
+        expected = list(ScreeningEntity.objects.order_by('-updated_at', '-id').values_list('id', flat=True))
+        seen = []
+        pages = []
+        url = '/api/v1/entities/?page_size=10'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['count'], 25)
+            pages.append([entity['id'] for entity in response.data['results']])
+            seen.extend(pages[-1])
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([entity['id'] for entity in response.data['results']], pages[1])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([entity['id'] for entity in response.data['results']], pages[0])
+        self.assertIsNone(response.data['previous'])
+
+    def test_count_modes(self):
+        response = self.client.get('/api/v1/entities/', {'count': 'none'})
+        self.assertIsNone(response.data['count'])
+        response = self.client.get('/api/v1/entities/', {'count': 'exact'})
+        self.assertEqual(response.data['count'], 25)
+        self.assertFalse(response.data['count_is_estimate'])
+        response = self.client.get('/api/v1/entities/', {'count': 'bogus'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/v1/entities/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+        # Well-formed cursors with the wrong shape or value types
+        next_url = self.client.get('/api/v1/entities/?page_size=10').data['next']
+        valid = json.loads(base64.urlsafe_b64decode(parse_qs(urlsplit(next_url).query)['cursor'][0]))
+        for crafted in (
+            {'v': [1]},
+            {'v': valid['v'] * 2, 'r': 0},
+            {'v': valid['v'], 'r': 'yes'},
+            {'v': valid['v'], 'r': 2},
+            {'v': [{'id': 1}] * len(valid['v']), 'r': 0},
+            {'v': ['not a value'] * len(valid['v']), 'r': 0},
+        ):
+            encoded = base64.urlsafe_b64encode(json.dumps(crafted).encode()).decode()
+            response = self.client.get('/api/v1/entities/', {'cursor': encoded})
+            self.assertEqual(response.status_code, 404, crafted)
+
+
+class DatasetStatsTests(TestCase):
+    """
+    The incrementally maintained statistics must match a full rebuild.
+    """
+
+    def test_ingest_matches_rebuild(self):
+        dataset_stats.rebuild()
+        make_entities(5)
+        # Move one entity to another list and country, and drop another's addresses
+        csl_service.store_entities([
+            {'id': 'test-0', 'name': 'Acme Trading 0', 'source_list': 'EL',
+             'addresses': [{'address': '1 Rue', 'city': 'Paris', 'country': 'FR'}]},
+            {'id': 'test-1', 'name': 'Acme Trading 1', 'source_list': 'SDN'},
+        ])
+        dataset_stats.invalidate()
+        incremental = dataset_stats.snapshot()
+
+        dataset_stats.rebuild()
+        self.assertEqual(incremental, dataset_stats.snapshot())
+        self.assertEqual(incremental['countries'], ['AE', 'FR', 'IR'])
+        self.assertEqual(incremental['source_lists'], ['EL', 'SDN'])
+        self.assertEqual(incremental['active_entities'], 5)
+
+    def test_api_writes_apply_deltas(self):
+        make_entities(2)
+        dataset_stats.rebuild()
+        client = APIClient()
+        response = client.post('/api/v1/entities/', {
+            'name': 'Volga Shipping', 'source_list': 'EL',
+            'addresses': [{'address': '1 Quay', 'city': 'Riga', 'country': 'LV'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Move an entity to another list and replace its addresses
+        entity = ScreeningEntity.objects.get(source_id='test-0')
+        response = client.patch(f'/api/v1/entities/{entity.pk}/', {
+            'source_list': 'MEU',
+            'addresses': [{'address': '2 Rue', 'city': 'Paris', 'country': 'FR'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        # Deactivate another, as the admin would
+        entity = ScreeningEntity.objects.get(source_id='test-1')
+        entity.is_active = False
+        entity.save()
+
+        self.assertFalse(FacetCount.objects.filter(facet='_state').exists())
+        dataset_stats.invalidate()
+        incremental = dataset_stats.snapshot()
+        dataset_stats.rebuild()
+        self.assertEqual(incremental, dataset_stats.snapshot())
+        self.assertEqual(incremental['source_lists'], ['EL', 'MEU', 'SDN'])
+        self.assertEqual(incremental['countries'], ['AE', 'FR', 'IR', 'LV'])
+        self.assertEqual((incremental['entities'], incremental['active_entities']), (3, 2))
+
+
+class MatcherFreshnessTests(TestCase):
+    """
+    Entities created or renamed through the API are found by the fuzzy
+    search once committed, and changes made by another process are picked
+    up when the version stamp moves.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        make_entities(2)
+        name_matcher.load()
+
+    def found(self, query):
+        response = self.client.get('/api/v1/entities/search/', {'q': query})
+        return [entity['name'] for entity in response.data['results']]
+
+    def test_api_create_and_rename(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/entities/', {'name': 'Volga Shipping', 'source_list': 'EL'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.found('Volga Shiping'), ['Volga Shipping'])
+
+        entity = ScreeningEntity.objects.get(source_id='test-0')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/v1/entities/{entity.pk}/', {'name': 'Quuxcorp Limited'}, format='json')
+        self.assertEqual(self.found('Quuxcorp Limted'), ['Quuxcorp Limited'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/v1/entities/{entity.pk}/')
+        self.assertEqual(self.found('Quuxcorp Limited'), [])
+
+    def test_reload_after_changes_elsewhere(self):
+        # Another process renames an entity: this one never sees the write, only the stamp
+        entity = ScreeningEntity.objects.get(source_id='test-0')
+        ScreeningEntity.objects.filter(pk=entity.pk).update(name='Quuxcorp Limited')
+        screening_cache.bump(['SDN'])
+        self.assertEqual(self.found('Quuxcorp Limited'), [])
+
+        with mock.patch.object(name_matcher, 'check_interval', 0):
+            self.assertEqual(self.found('Quuxcorp Limited'), ['Quuxcorp Limited'])
+
+            # This process's own committed writes are applied without a reload
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(f'/api/v1/entities/{entity.pk}/', {'name': 'Quuxcorp Holdings'}, format='json')
+            with mock.patch.object(name_matcher, 'load') as load:
+                self.assertEqual(self.found('Quuxcorp Holdings'), ['Quuxcorp Holdings'])
+            load.assert_not_called()
+
+
+class UpstreamLists(CSLService):
+    """CSL service answering /sources and source-filtered searches from in-memory lists"""
+
+    def __init__(self, lists):
+        self.lists = lists  # code -> (source_last_updated, entities)
+        self.synced = []
+
+    def fetch_sources(self):
+        return [
+            {'source': f'List {code} ({code})', 'source_last_updated': updated}
+            for code, (updated, _) in self.lists.items()
+        ]
+
+    def iter_pages(self, page_size=100, sources=None, **kwargs):
+        self.synced.append(sources)
+        results = [
+            {**entity, 'source': f'List {code} ({code})'}
+            for code, (_, entities) in self.lists.items() if code in sources.split(',')
+            for entity in entities
+        ]
+        yield {'total': len(results), 'results': results}
+
+
+@override_settings(CSL_MIRROR_MAX_REMOVE_FRACTION=1.0)
+class SourceRefreshTests(TestCase):
+    """
+    The delta refresh re-syncs only the source lists whose upstream version changed.
+    """
+
+    def test_refresh_changed_lists(self):
+        upstream = UpstreamLists({
+            'SDN': ('2024-01-01', [{'id': 'sdn-1', 'name': 'Acme Trading'}]),
+            'EL': ('2024-01-01', [{'id': 'el-1', 'name': 'Globex'}, {'id': 'el-2', 'name': 'Initech'}]),
+        })
+        refresher = SourceRefresher(upstream)
+
+        # The first run syncs every list, the second nothing
+        self.assertEqual(sorted(refresher.refresh()['refreshed']), ['EL', 'SDN'])
+        self.assertEqual(sorted(refresher.refresh()['unchanged']), ['EL', 'SDN'])
+
+        # EL is republished without one entity, and SDN is emptied without a new date
+        upstream.lists['EL'] = ('2024-02-01', [{'id': 'el-1', 'name': 'Globex'}])
+        upstream.lists['SDN'] = ('2024-01-01', [])
+        upstream.synced = []
+        summary = refresher.refresh()
+
+        self.assertEqual(upstream.synced, ['EL'])
+        self.assertEqual(summary['refreshed']['EL']['removed'], 1)
+        self.assertEqual(
+            sorted(ScreeningEntity.objects.filter(is_active=True).values_list('source_id', flat=True)),
+            ['el-1', 'sdn-1'],
+        )
+
+    def active_ids(self):
+        return sorted(ScreeningEntity.objects.filter(is_active=True).values_list('source_id', flat=True))
+
+    def test_refresh_emptied_list(self):
+        upstream = UpstreamLists({
+            'SDN': ('2024-01-01', [{'id': 'sdn-1', 'name': 'Acme Trading'}]),
+            'EL': ('2024-01-01', [{'id': 'el-1', 'name': 'Globex'}, {'id': 'el-2', 'name': 'Initech'}]),
+        })
+        SourceRefresher(upstream).refresh()
+
+        # SDN is republished empty: its entities go, EL's stay
+        upstream.lists['SDN'] = ('2024-02-01', [])
+        summary = SourceRefresher(upstream).refresh()
+        self.assertEqual(summary['unchanged'], ['EL'])
+        self.assertEqual(summary['refreshed']['SDN']['removed'], 1)
+        self.assertEqual(self.active_ids(), ['el-1', 'el-2'])
+
+        # Emptying a list above the removal limit fails that list and keeps it for the next run
+        upstream.lists['EL'] = ('2024-03-01', [])
+        summary = SourceRefresher(upstream, max_remove_fraction=0.5).refresh()
+        self.assertIn('EL', summary['failed'])
+        self.assertEqual(self.active_ids(), ['el-1', 'el-2'])
+        self.assertEqual(sorted(SourceRefresher(upstream).refresh()['refreshed']), ['EL'])
+        self.assertEqual(self.active_ids(), [])
+
+
+class ScreeningCacheTests(TestCase):
+    """
+    Repeat screenings are one lookup, and a list change only invalidates
+    screenings that cover that list.
+    """
+
+    def setUp(self):
+        make_entities(3)
+        csl_service.store_entities([{'id': 'el-1', 'name': 'Globex Trading', 'source_list': 'EL'}])
+        name_matcher.load()
+        self.rows = [{'name': 'Acme Trading 1', 'country': 'IR', 'address': ''}]
+
+    def screen(self, **options):
+        return list(BatchScreener(workers=1, **options).screen(self.rows))
+
+    def matched_names(self, **options):
+        return [match['name'] for match in self.screen(**options)[0]['matches']]
+
+    def test_repeat_screening_hits_cache(self):
+        first = self.screen(sources=['SDN'])
+        self.assertEqual(first[0]['matches'][0]['name'], 'Acme Trading 1')
+        self.screen()
+
+        # One indexed lookup
+        with self.assertNumQueries(1):
+            self.assertEqual(self.screen(sources=['SDN']), first)
+
+        # A change to EL leaves SDN-only screenings cached, but not unrestricted ones
+        csl_service.store_entities([{'id': 'el-1', 'name': 'Globex Trading Ltd', 'source_list': 'EL'}])
+        with self.assertNumQueries(1):
+            self.screen(sources=['SDN'])
+        # lookup, stamp, entities, addresses, store
+        with self.assertNumQueries(5):
+            self.screen()
+
+        # Re-ingesting unchanged entities doesn't invalidate anything
+        make_entities(3)
+        with self.assertNumQueries(1):
+            self.screen()
+
+    def test_entity_edit_invalidates_both_lists(self):
+        self.screen(sources=['SDN'])
+        self.screen(sources=['EL'])
+
+        entity = ScreeningEntity.objects.get(source_id='test-1')
+        entity.source_list = 'EL'
+        with CaptureQueriesContext(connection) as queries:
+            entity.save()
+        # The list it left comes from the loaded values, not a query
+        self.assertFalse([
+            query for query in queries
+            if query['sql'].startswith('SELECT') and 'api_screeningentity' in query['sql']
+        ])
+
+        name_matcher.load()
+        self.assertNotIn('Acme Trading 1', self.matched_names(sources=['SDN']))
+        self.assertIn('Acme Trading 1', self.matched_names(sources=['EL']))
+
+
+class JobEndpointTests(TestCase):
+    """
+    Batch screening rows are stored apart from the job's params, so job
+    responses and listings don't carry them.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        make_entities(3)
+        name_matcher.load()
+
+    def test_batch_screen_job(self):
+        rows = [{'name': f'Acme Trading {i}'} for i in range(3)] + ['Unrelated Name']
+        response = self.client.post(
+            '/api/v1/jobs/', {'job_type': 'batch_screen', 'params': {'rows': rows, 'limit': 1}}, format='json'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['params'], {'limit': 1})
+        self.assertEqual(len(Job.objects.get().payload), 4)
+
+        response = self.client.get('/api/v1/jobs/')
+        self.assertNotIn('params', response.data['results'][0])
+
+        with mock.patch('core.services.jobs.RESULT_CHUNK_SIZE', 3):
+            run_job(claim_next_job('worker'))
+        self.assertEqual(Job.objects.get().result_chunks.count(), 2)
+        response = self.client.get(f"/api/v1/jobs/{Job.objects.get().pk}/result/")
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['status'], Job.STATUS_SUCCEEDED)
+        self.assertEqual(data['result']['rows_with_matches'], 3)
+        self.assertEqual([result['row'] for result in data['result']['results']], [0, 1, 2, 3])
+        self.assertEqual(data['result']['results'][1]['matches'][0]['name'], 'Acme Trading 1')
+
+        response = self.client.post('/api/v1/jobs/', {'job_type': 'batch_screen', 'params': {}}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTests(TestCase):
+    """
+    Exports carry every active entity with its addresses and IDs in each
+    format, skip removed entities unless asked, and reject bad options.
+    """
+
+    def setUp(self):
+        make_entities(3)
+        ScreeningEntity.objects.filter(source_id='test-2').update(is_active=False)
+        self.client = APIClient()
+
+    def download(self, **params):
+        response = self.client.get('/api/v1/entities/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_rows(self):
+        response, content = self.download()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="entities.ndjson"')
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['source_id'] for row in rows], ['test-0', 'test-1'])
+        row = rows[1]
+        self.assertEqual(row['name'], 'Acme Trading 1')
+        self.assertEqual(row['alt_names'], ['Acme Intl 1'])
+        self.assertTrue(row['is_active'])
+        self.assertNotIn('search_text', row)
+        self.assertEqual([a['address'] for a in row['addresses']], ['1 Main St', '1 Side St'])
+        self.assertEqual(row['addresses'][0]['country'], 'IR')
+        self.assertEqual(
+            [(i['id_type'], i['id_number']) for i in row['ids']], [('Passport', 'P1'), ('Tax ID', 'T1')]
+        )
+
+        _, content = self.download(include_inactive='true')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['source_id'] for row in rows], ['test-0', 'test-1', 'test-2'])
+        self.assertFalse(rows[2]['is_active'])
+
+    def test_csv_gzip(self):
+        response, content = self.download(file_format='csv', gzip='true')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="entities.csv.gz"')
+
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(content).decode('utf-8'))))
+        self.assertEqual(len(rows), 2)
+        # Nested values are JSON text, booleans Python literals
+        self.assertEqual(json.loads(rows[0]['alt_names']), ['Acme Intl 0'])
+        self.assertEqual([i['id_number'] for i in json.loads(rows[0]['ids'])], ['P0', 'T0'])
+        self.assertEqual(rows[0]['is_active'], 'True')
+
+    @skipUnless(pq, 'pyarrow is not installed')
+    def test_parquet(self):
+        response, content = self.download(file_format='parquet', gzip='true')
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.parquet')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="entities.parquet"')
+
+        table = pq.read_table(io.BytesIO(content))
+        self.assertEqual(table.num_rows, 2)
+        self.assertEqual(table.column('source_id').to_pylist(), ['test-0', 'test-1'])
+        self.assertEqual(json.loads(table.column('addresses')[1].as_py())[1]['city'], 'Dubai')
+
+    def test_related_rows_across_chunks(self):
+        records = b''.join(stream_export(include_inactive=True, chunk_size=2)).splitlines()
+        for i, line in enumerate(records):
+            row = json.loads(line)
+            self.assertEqual([a['address'] for a in row['addresses']], [f'{i} Main St', f'{i} Side St'])
+            self.assertEqual([e['id_number'] for e in row['ids']], [f'P{i}', f'T{i}'])
+
+    def test_search_history(self):
+        SearchQuery.objects.create(query_text='acme', results_count=3, search_params={'fuzzy_name': True})
+        response = self.client.get('/api/v1/search-history/export/')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['query_text'], 'acme')
+        self.assertEqual(rows[0]['search_params'], {'fuzzy_name': True})
+
+    def test_invalid_options(self):
+        response = self.client.get('/api/v1/entities/export/', {'file_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Unknown format 'xml'", response.data['error'])
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'entities.ndjson')
+            call_command('export_csl', output=path, include_inactive=True, stdout=io.StringIO())
+            with open(path, 'rb') as fp:
+                rows = [json.loads(line) for line in fp]
+        self.assertEqual(len(rows), 3)
+
+
+class AddressIndexTests(TestCase):
+    """
+    Address filters match the normalized index: folded street tokens, city,
+    state and postal code, and canonical ISO countries, all on one address.
+    """
+
+    def setUp(self):
+        make_entities(3)
+        self.client = APIClient()
+
+    def test_address_viewset_filters(self):
+        response = self.client.get('/api/v1/addresses/', {'country': 'Iran', 'city': 'TEHRAN'})
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get('/api/v1/addresses/', {'country': 'ARE', 'address': 'side street 2'})
+        self.assertEqual([a['address'] for a in response.data['results']], ['2 Side St'])
+
+    def test_criteria_hold_for_one_address(self):
+        entities = ScreeningEntity.objects.all()
+        self.assertEqual(filter_entities_by_address(entities, address='1 main', country='ir').count(), 1)
+        # Tehran is on the Main St address, the UAE on the other one
+        self.assertEqual(filter_entities_by_address(entities, city='tehran', country='AE').count(), 0)
+
+    def test_keys_follow_saves(self):
+        # Bulk ingest writes the keys alongside the address
+        address = Address.objects.get(address='1 Main St')
+        self.assertEqual(
+            (address.street_key, address.city_key, address.country_key), ('1 main st', 'tehran', 'IR')
+        )
+
+        # Single-row saves through the API fill them in the pre_save hook
+        response = self.client.post('/api/v1/entities/', {
+            'name': 'Globex', 'source_list': 'EL', 'source_id': 'geo-1',
+            'addresses': [{'address': '5 Königstrasse', 'city': 'Zürich', 'state': 'ZH',
+                           'postal_code': '80-01', 'country': 'Switzerland'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        address = Address.objects.get(entity__source_id='geo-1')
+        self.assertEqual(
+            (address.street_key, address.city_key, address.state_key, address.postal_key, address.country_key),
+            ('5 konigstrasse', 'zurich', 'zh', '8001', 'CH'),
+        )
+
+        entity = address.entity
+        self.client.patch(f'/api/v1/entities/{entity.pk}/', {
+            'addresses': [{'address': '9 Harbour Road', 'city': 'Hong Kong', 'country': 'HKG'}],
+        }, format='json')
+        address = Address.objects.get(entity=entity)
+        self.assertEqual((address.street_key, address.country_key), ('9 harbour rd', 'HK'))
+
+    def test_geography_filters(self):
+        csl_service.store_entities([{
+            'id': 'geo-2', 'name': 'Globex', 'source_list': 'EL',
+            'addresses': [{'address': '10 Downing Street', 'city': 'London', 'state': 'Greater London',
+                           'postal_code': 'SW1A 2AA', 'country': 'United Kingdom'}],
+        }])
+        response = self.client.get('/api/v1/addresses/', {'postal_code': 'sw1a-2aa'})
+        self.assertEqual([a['address'] for a in response.data['results']], ['10 Downing Street'])
+        for params in ({'state': 'greater london'}, {'country': 'UK'}, {'country': 'gbr', 'address': 'downing st'}):
+            response = self.client.get('/api/v1/addresses/', params)
+            self.assertEqual(len(response.data['results']), 1, params)
+        self.assertEqual(self.client.get('/api/v1/addresses/', {'country': 'France'}).data['results'], [])
+
+        # Entity search takes the same country spellings
+        for country in ('IR', 'irn', 'Iran', 'Islamic Republic of Iran'):
+            response = self.client.get(
+                '/api/v1/entities/search/', {'q': 'acme', 'fuzzy_name': 'false', 'country': country}
+            )
+            self.assertEqual(response.data['count'], 3, country)
+        response = self.client.get(
+            '/api/v1/entities/search/', {'q': 'globex', 'fuzzy_name': 'false', 'country': 'GB'}
+        )
+        self.assertEqual([e['source_id'] for e in response.data['results']], ['geo-2'])
+
+
+class IdentifierLookupTests(TestCase):
+    """
+    IDs match regardless of case, spacing and punctuation, and a bulk lookup
+    costs a fixed number of queries.
+    """
+
+    def setUp(self):
+        make_entities(5)
+        self.client = APIClient()
+
+    def test_lookup_ids(self):
+        # identifiers with their entities, addresses, ids
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                '/api/v1/entities/lookup_ids/', {'ids': ['p-1', 'T 2', 'p1', 'X9']}, format='json'
+            )
+        self.assertEqual(response.data['matched'], 3)
+        first = response.data['results'][0]
+        self.assertEqual(first['normalized'], 'P1')
+        self.assertEqual(first['matches'][0]['entity']['name'], 'Acme Trading 1')
+        self.assertEqual(len(first['matches'][0]['entity']['addresses']), 2)
+        self.assertEqual(response.data['results'][3]['matches'], [])
+
+        response = self.client.post(
+            '/api/v1/entities/lookup_ids/', {'ids': ['P1'], 'id_type': 'tax id'}, format='json'
+        )
+        self.assertEqual(response.data['matched'], 0)
+
+    def test_normalized_number_follows_saves(self):
+        self.assertEqual(EntityID.objects.get(id_number='T3').normalized_number, 'T3')
+
+        response = self.client.post('/api/v1/entities/', {
+            'name': 'Globex', 'source_list': 'EL', 'source_id': 'id-1',
+            'ids': [{'id_type': 'Passport', 'id_number': 'ab-123 456'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        entity = ScreeningEntity.objects.get(source_id='id-1')
+        self.assertEqual(list(entity.ids.values_list('normalized_number', flat=True)), ['AB123456'])
+
+        self.client.patch(f'/api/v1/entities/{entity.pk}/', {
+            'ids': [{'id_type': 'Tax ID', 'id_number': 'x.99/7'}],
+        }, format='json')
+        self.assertEqual(list(entity.ids.values_list('normalized_number', flat=True)), ['X997'])
+
+    def test_lookup_ids_matching(self):
+        # An ID held by two entities returns both; removed entities are left out
+        csl_service.store_entities([
+            {'id': 'dup-1', 'name': 'Globex', 'source_list': 'EL', 'ids': [{'type': 'Passport', 'number': 'P 1'}]},
+            {'id': 'gone-1', 'name': 'Initech', 'source_list': 'EL', 'ids': [{'type': 'Passport', 'number': 'T2'}]},
+        ])
+        ScreeningEntity.objects.filter(source_id='gone-1').update(is_active=False)
+
+        # A plain list, with duplicates and inputs that normalize to nothing
+        response = self.client.post('/api/v1/entities/lookup_ids/', ['p.1', 't2', 'P1', '--', ''], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(response.data['matched'], 3)
+        results = response.data['results']
+        self.assertEqual([result['id_number'] for result in results], ['p.1', 't2', 'P1', '--', ''])
+        self.assertEqual(
+            sorted(match['entity']['source_id'] for match in results[0]['matches']), ['dup-1', 'test-1']
+        )
+        self.assertEqual([match['entity']['source_id'] for match in results[1]['matches']], ['test-2'])
+        self.assertEqual((results[1]['matches'][0]['id_type'], results[1]['matches'][0]['id_number']), ('Tax ID', 'T2'))
+        self.assertEqual((results[3]['normalized'], results[3]['matches']), ('', []))
+
+        # The type filter ignores case
+        response = self.client.post(
+            '/api/v1/entities/lookup_ids/', {'ids': ['t2', 'p1'], 'id_type': 'TAX ID'}, format='json'
+        )
+        self.assertEqual([len(result['matches']) for result in response.data['results']], [1, 0])
+
+    @override_settings(CSL_ID_LOOKUP_MAX_IDS=2)
+    def test_lookup_ids_validation(self):
+        for payload in ({'ids': 'P1'}, {'numbers': ['P1']}, ['P1', 7], ['P1', 'P2', 'P3']):
+            response = self.client.post('/api/v1/entities/lookup_ids/', payload, format='json')
+            self.assertEqual(response.status_code, 400, payload)
+            self.assertIn('error', response.data)
+
+    def test_entity_id_filter(self):
+        response = self.client.get('/api/v1/entity-ids/', {'id_number': 't-3'})
+        self.assertEqual([i['id_number'] for i in response.data['results']], ['T3'])
+
+
+class MetricsTests(TestCase):
+    """
+    Stage timings and query counts render in the Prometheus text format, and
+    the endpoint is only served when metrics are enabled.
+    """
+
+    def test_render(self):
+        recorder = Metrics(enabled=True)
+        with recorder.timer('match'):
+            pass
+        recorder.timed('serialize')(lambda: None)()
+        recorder.observe('csl_db_queries_per_request', 3, view='api:screeningentity-list')
+        recorder.inc('csl_http_requests_total', view='api:screeningentity-list', method='GET', status=200)
+
+        text = recorder.render()
+        self.assertIn('# TYPE csl_stage_seconds histogram', text)
+        self.assertIn('csl_stage_seconds_count{stage="match"} 1', text)
+        self.assertIn('csl_stage_seconds_count{stage="serialize"} 1', text)
+        self.assertIn('csl_db_queries_per_request_bucket{view="api:screeningentity-list",le="5"} 1', text)
+        self.assertIn(
+            'csl_http_requests_total{method="GET",status="200",view="api:screeningentity-list"} 1', text
+        )
+
+    def test_disabled_is_noop(self):
+        recorder = Metrics(enabled=False)
+        self.assertIs(recorder.timed('match')(len), len)
+        with recorder.timer('match'):
+            pass
+        self.assertEqual(recorder.render(), '\n')
+
+    def test_count_queries(self):
+        with connection.execute_wrapper(observe_query), count_queries() as queries:
+            list(ScreeningEntity.objects.all())
+            list(ScreeningEntity.objects.all())
+        self.assertEqual(queries[0], 2)
+
+    def test_endpoint(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/v1/metrics/').status_code, 404)
+
+        with mock.patch.object(metrics, 'enabled', True):
+            # The default renderer times encoding API responses
+            client.get('/api/v1/entities/', HTTP_ACCEPT='application/json')
+            response = client.get('/api/v1/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('csl_cache_lookups_total{cache="response",result="hit"}', response.content.decode())
+        self.assertIn('csl_stage_seconds_count{stage="serialize"}', response.content.decode())
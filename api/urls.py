@@ -4,7 +4,10 @@ from .views import (
     ScreeningEntityViewSet,
     AddressViewSet,
     EntityIDViewSet,
-    SearchQueryViewSet
+    SearchQueryViewSet,
+    JobViewSet,
+    external_search_async,
+    prometheus_metrics
 )
 
 router = routers.DefaultRouter()
@@ -12,9 +15,12 @@ router.register(r'entities', ScreeningEntityViewSet)
 router.register(r'addresses', AddressViewSet)
 router.register(r'entity-ids', EntityIDViewSet)
 router.register(r'search-history', SearchQueryViewSet)
+router.register(r'jobs', JobViewSet)
 
 app_name = 'api'
 
 urlpatterns = [
+    path('entities/external_search_async/', external_search_async, name='external-search-async'),
+    path('metrics/', prometheus_metrics, name='metrics'),
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
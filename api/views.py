@@ -1,20 +1,78 @@
+import csv
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q
 from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import ScreeningEntity, Address, EntityID, SearchQuery
+from .models import ScreeningEntity, Address, EntityID, SearchQuery, Job
+from .pagination import KeysetPagination
 from .serializers import (
     ScreeningEntitySerializer,
     ScreeningEntityCreateUpdateSerializer,
     AddressSerializer,
     EntityIDSerializer,
-    SearchQuerySerializer
+    SearchQuerySerializer,
+    JobSerializer,
+    JobListSerializer
 )
+from core.services.addresses import AddressIndexFilter, filter_entities_by_address
+from core.services.async_csl_service import async_csl_service
 from core.services.csl_service import csl_service
+from core.services.export import (
+    CONTENT_TYPES,
+    ExportError,
+    export_filename,
+    stream_export,
+    validate_export
+)
+from core.services.facets import facets_from_entities, facets_from_queryset
+from core.services.identifiers import IdentifierFilter, lookup_ids, normalize_id_number
+from core.services.jobs import stream_job_result, submit_job
+from core.services.matching import accept_queryset, name_matcher, rank_by_score
+from core.services.metrics import metrics, service_samples
+from core.services.screening import (
+    BatchScreener,
+    BatchInputError,
+    parse_csv_rows,
+    parse_json_rows,
+    stream_ndjson
+)
+from core.services.search_backend import FullTextSearchFilter, alias_search, full_text_search
+from core.services.stats import dataset_stats
+
+
+def export_response(request, dataset):
+    """
+    Build a streaming download of a dataset.
+    
+    Query parameters: file_format (ndjson, csv or parquet), gzip and
+    include_inactive. ('format' is reserved by DRF for renderer selection.)
+    """
+    file_format = request.query_params.get('file_format', 'ndjson')
+    compress = request.query_params.get('gzip', 'false').lower() == 'true'
+    include_inactive = request.query_params.get('include_inactive', 'false').lower() == 'true'
+    
+    try:
+        validate_export(dataset, file_format)
+    except ExportError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    chunks = stream_export(dataset, file_format, compress=compress, include_inactive=include_inactive)
+    compressed = compress and file_format != 'parquet'
+    response = StreamingHttpResponse(
+        chunks,
+        content_type='application/gzip' if compressed else CONTENT_TYPES[file_format]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{export_filename(dataset, file_format, compress)}"'
+    )
+    return response
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -28,9 +86,10 @@ class ScreeningEntityViewSet(viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing ScreeningEntity instances.
     """
-    queryset = ScreeningEntity.objects.all().order_by('-updated_at')
-    pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Addresses and IDs are serialized inline; prefetch them so a page costs a fixed number of queries
+    queryset = ScreeningEntity.objects.filter(is_active=True).prefetch_related('addresses', 'ids').order_by('-updated_at', '-id')
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['source_list', 'entity_number', 'sdn_type']
     search_fields = ['name', 'alt_names', 'remarks']
     ordering_fields = ['name', 'created_at', 'updated_at', 'score']
@@ -48,29 +107,60 @@ class ScreeningEntityViewSet(viewsets.ModelViewSet):
         """
         query = request.query_params.get('q', '')
         source_list = request.query_params.get('source_list')
+        sdn_type = request.query_params.get('sdn_type')
         country = request.query_params.get('country')
+        alias = request.query_params.get('alias')
+        fuzzy_name = request.query_params.get('fuzzy_name', 'true').lower() == 'true'
+        with_facets = request.query_params.get('facets', 'true').lower() == 'true'
         
         # Start with all entities
         queryset = self.get_queryset()
+        matches = None
         
         # Apply filters based on parameters
-        if query:
-            queryset = queryset.filter(
-                Q(name__icontains=query) |
-                Q(alt_names__icontains=query)
-            )
+        if query and not fuzzy_name:
+            # Ranked matches from the full-text/trigram index on search_text
+            queryset = full_text_search(queryset, query)
+        
+        if alias:
+            queryset = alias_search(queryset, alias)
         
         if source_list:
             queryset = queryset.filter(source_list=source_list)
         
+        if sdn_type:
+            queryset = queryset.filter(sdn_type=sdn_type)
+        
         if country:
-            queryset = queryset.filter(addresses__country__iexact=country)
+            queryset = filter_entities_by_address(queryset, country=country)
+        
+        if query and fuzzy_name:
+            # Ranked fuzzy matches from the in-memory name index, among the entities passing the filters
+            filtered = alias or source_list or sdn_type or country
+            matches = name_matcher.search(query, accept=accept_queryset(queryset) if filtered else None)
+            queryset = queryset.filter(pk__in=list(matches))
+        
+        if matches is not None:
+            queryset = rank_by_score(queryset, matches)
+        
+        # Counts per source list, type and country across all results, not just this page
+        facets = None
+        if with_facets:
+            if isinstance(queryset, list):
+                # Fuzzy matches are already loaded with their addresses
+                facets = facets_from_entities(queryset)
+            else:
+                facets = facets_from_queryset(queryset)
         
-        # Apply pagination
-        page = self.paginate_queryset(queryset)
+        # Results are ranked by relevance, so page by number rather than by keyset
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            response = paginator.get_paginated_response(serializer.data)
+            if facets is not None:
+                response.data['facets'] = facets
+            return response
         
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
@@ -97,8 +187,8 @@ class ScreeningEntityViewSet(viewsets.ModelViewSet):
         # Get user information if available
         user = request.user.username if request.user.is_authenticated else None
         
-        # Search using CSL service
-        results = csl_service.search_entities(
+        # Search using CSL service and store the entities (identical concurrent searches share one call)
+        results = csl_service.search_and_store(
             query=query,
             sources=sources,
             countries=countries,
@@ -108,47 +198,209 @@ class ScreeningEntityViewSet(viewsets.ModelViewSet):
             user=user
         )
         
-        # Store entities in database
-        if 'results' in results and results['results']:
-            for entity_data in results['results']:
-                csl_service.fetch_and_store_entity(entity_data)
-        
         return Response(results)
     
+    @action(detail=False, methods=['post'])
+    def batch_screen(self, request):
+        """
+        Screen a list of counterparties against local data.
+        
+        Accepts a JSON list (names or objects with name/country/address) or a
+        CSV upload in the 'file' field, and streams one NDJSON result per row.
+        Optional 'sources' restricts matches to comma-separated source lists.
+        """
+        try:
+            if 'file' in request.FILES:
+                rows = parse_csv_rows(request.FILES['file'])
+            else:
+                rows = parse_json_rows(request.data)
+        except (BatchInputError, UnicodeDecodeError, csv.Error) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(rows) > settings.CSL_SCREENING_MAX_ROWS:
+            return Response(
+                {"error": f"At most {settings.CSL_SCREENING_MAX_ROWS} counterparties per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            limit = int(request.query_params.get('limit', '10'))
+            min_score = request.query_params.get('min_score')
+            min_score = int(min_score) if min_score else None
+        except ValueError:
+            return Response(
+                {"error": "'limit' and 'min_score' must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        sources = request.query_params.get('sources', '').split(',') if request.query_params.get('sources') else None
+        screener = BatchScreener(limit=limit, min_score=min_score, sources=sources)
+        return StreamingHttpResponse(
+            stream_ndjson(screener.screen(rows)),
+            content_type='application/x-ndjson'
+        )
+    
+    @action(detail=False, methods=['post'])
+    def lookup_ids(self, request):
+        """
+        Resolve many identifiers (passport, tax, registration numbers) at once.
+        
+        Accepts {"ids": [...], "id_type": "..."} or a plain JSON list of IDs.
+        IDs match regardless of case, spacing and punctuation; each input is
+        returned with the entities holding it.
+        """
+        payload = request.data
+        id_type = None
+        if isinstance(payload, dict):
+            id_type = payload.get('id_type') or None
+            payload = payload.get('ids')
+        if not isinstance(payload, list) or not all(isinstance(number, str) for number in payload):
+            return Response(
+                {"error": "Expected a list of ID strings, or an object with an 'ids' list"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(payload) > settings.CSL_ID_LOOKUP_MAX_IDS:
+            return Response(
+                {"error": f"At most {settings.CSL_ID_LOOKUP_MAX_IDS} IDs per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        found = lookup_ids(payload, id_type=id_type)
+        results = []
+        for number in payload:
+            normalized = normalize_id_number(number)
+            results.append({
+                'id_number': number,
+                'normalized': normalized,
+                'matches': [
+                    {
+                        'id_type': entity_id.id_type,
+                        'id_number': entity_id.id_number,
+                        'id_country': entity_id.id_country,
+                        'entity': ScreeningEntitySerializer(entity_id.entity).data,
+                    }
+                    for entity_id in found.get(normalized, [])
+                ],
+            })
+        
+        return Response({
+            'count': len(results),
+            'matched': sum(1 for result in results if result['matches']),
+            'results': results,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream every entity, with addresses and IDs, as NDJSON, CSV or Parquet.
+        """
+        return export_response(request, 'entities')
+    
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """
+        Get hit/miss counters for the external search response cache, and
+        how many external searches were coalesced with one already in flight
+        """
+        return Response({**csl_service.cache.stats(), 'single_flight': csl_service.flights.stats()})
+    
+    @action(detail=False, methods=['get'])
+    def upstream_stats(self, request):
+        """
+        Get CSL API quota metrics: tokens available, calls in flight, 429s
+        seen, and queue wait per priority class
+        """
+        return Response(csl_service.governor.stats())
+    
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Get pre-aggregated entity and search counts and the filter values
+        """
+        return Response(dataset_stats.snapshot())
+    
     @action(detail=False, methods=['get'])
     def source_lists(self, request):
         """
         Get a list of all source lists
         """
-        source_lists = ScreeningEntity.objects.values_list('source_list', flat=True).distinct()
-        return Response(sorted(source_lists))
+        return Response(dataset_stats.snapshot()['source_lists'])
+
+
+async def external_search_async(request):
+    """
+    Async variant of ScreeningEntityViewSet.external_search for ASGI deployments.
+    
+    The upstream call runs on the pooled async client, so a single process
+    can keep many CSL API requests in flight. Under WSGI (CSL_ASGI off) or
+    without httpx the synchronous service makes the call.
+    """
+    query = request.GET.get('q', '')
+    if not query:
+        return JsonResponse(
+            {"error": "Search query parameter 'q' is required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Extract additional parameters
+    sources = request.GET.get('sources', '').split(',') if request.GET.get('sources') else None
+    countries = request.GET.get('countries', '').split(',') if request.GET.get('countries') else None
+    fuzzy_name = request.GET.get('fuzzy_name', 'true').lower() == 'true'
+    try:
+        size = int(request.GET.get('size', '20'))
+        offset = int(request.GET.get('offset', '0'))
+    except ValueError:
+        return JsonResponse(
+            {"error": "'size' and 'offset' must be integers"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Get user information if available
+    user = await request.auser()
+    
+    # Search and store the entities (identical concurrent searches share one call).
+    # The async client is only pooled on an ASGI server's long-lived event loop.
+    search_and_store = async_csl_service.search_and_store if (
+        async_csl_service is not None and settings.CSL_ASGI
+    ) else sync_to_async(csl_service.search_and_store)
+    results = await search_and_store(
+        query=query,
+        sources=sources,
+        countries=countries,
+        fuzzy_name=fuzzy_name,
+        size=size,
+        offset=offset,
+        user=user.username if user.is_authenticated else None
+    )
+    
+    return JsonResponse(results)
 
 
 class AddressViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing Address instances.
     """
-    queryset = Address.objects.all()
+    queryset = Address.objects.all().order_by('id')
     serializer_class = AddressSerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['country', 'city']
+    pagination_class = KeysetPagination
+    filter_backends = [AddressIndexFilter]
     
     @action(detail=False, methods=['get'])
     def countries(self, request):
         """
         Get a list of all countries
         """
-        countries = Address.objects.values_list('country', flat=True).distinct()
-        return Response(sorted(country for country in countries if country))
+        return Response(dataset_stats.snapshot()['countries'])
 
 
 class EntityIDViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing EntityID instances.
     """
-    queryset = EntityID.objects.all()
+    queryset = EntityID.objects.all().order_by('id')
     serializer_class = EntityIDSerializer
-    filter_backends = [DjangoFilterBackend]
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, IdentifierFilter]
     filterset_fields = ['id_type', 'id_country']
 
 
@@ -156,6 +408,94 @@ class SearchQueryViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing search history.
     """
-    queryset = SearchQuery.objects.all().order_by('-timestamp')
+    queryset = SearchQuery.objects.all().order_by('-timestamp', '-id')
     serializer_class = SearchQuerySerializer
+    pagination_class = KeysetPagination
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the full search history as NDJSON, CSV or Parquet.
+        """
+        return export_response(request, 'search_history')
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    ViewSet for submitting background jobs and polling their progress.
+    
+    Jobs are drained by the run_jobs management command.
+    """
+    # Inputs and results can be large; they're only loaded where needed
+    queryset = Job.objects.defer('payload', 'result').order_by('-created_at')
+    serializer_class = JobSerializer
     pagination_class = StandardResultsSetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['job_type', 'status']
+    
+    def get_serializer_class(self):
+        """Listings leave out the handler arguments"""
+        if self.action == 'list':
+            return JobListSerializer
+        return JobSerializer
+    
+    def create(self, request):
+        """
+        Queue a job. Batch screening jobs also accept a CSV upload in 'file'.
+        """
+        if 'file' in request.FILES:
+            try:
+                rows = parse_csv_rows(request.FILES['file'])
+            except (BatchInputError, UnicodeDecodeError, csv.Error) as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            data = {'job_type': request.data.get('job_type', 'batch_screen'), 'params': {'rows': rows}}
+        else:
+            data = request.data
+        
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        
+        params = serializer.validated_data.get('params') or {}
+        payload = None
+        if serializer.validated_data['job_type'] == 'batch_screen':
+            # The rows are stored apart from the params, which job listings and responses carry
+            try:
+                payload = parse_json_rows(params.pop('rows', None))
+            except BatchInputError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        user = request.user.username if request.user.is_authenticated else None
+        job = submit_job(serializer.validated_data['job_type'], params, user=user, payload=payload)
+        
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'])
+    def result(self, request, pk=None):
+        """
+        Get the result of a finished job
+        """
+        job = self.get_object()
+        if job.status not in (Job.STATUS_SUCCEEDED, Job.STATUS_FAILED):
+            return Response(
+                {"error": f"Job is {job.status}", "progress": job.progress, "total": job.total},
+                status=status.HTTP_409_CONFLICT
+            )
+        # Batch screening results are read from the database a chunk at a time
+        return StreamingHttpResponse(stream_job_result(job), content_type='application/json')
+
+
+def prometheus_metrics(request):
+    """
+    Export request, stage, query-count and cache metrics in the Prometheus
+    text format. Values cover this process only.
+    """
+    if not metrics.enabled:
+        return JsonResponse(
+            {"error": "Metrics are disabled; set CSL_METRICS_ENABLED=True"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    return HttpResponse(
+        metrics.render(service_samples()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
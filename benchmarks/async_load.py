@@ -0,0 +1,86 @@
+"""
+Concurrent CSL API searches through the sync and the async client.
+
+Sends the same number of searches to a local stub upstream that answers
+after a fixed delay: from a pool of threads through CSLService (as a
+threaded WSGI worker would), and as tasks on one event loop through
+AsyncCSLService (as an ASGI worker would). Pools and concurrency caps keep
+their default settings; only the rate limit is off, as the stub has no quota.
+
+    python -m benchmarks.async_load --requests 500 --delay 0.1 --threads 8 32 --tasks 20 50 100
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import StubUpstream, setup_django, summarize
+
+
+def timed(call, i, latencies):
+    begun = time.perf_counter()
+    data = call(i)
+    latencies.append(time.perf_counter() - begun)
+    assert 'results' in data, data
+
+
+def run_threads(service, count, threads):
+    latencies = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(
+            lambda i: timed(lambda i: service.fetch_data(use_cache=False, name=f'acme {i}'), i, latencies),
+            range(count),
+        ))
+    return latencies, time.perf_counter() - started
+
+
+async def run_tasks(service, count, tasks):
+    latencies = []
+    limit = asyncio.Semaphore(tasks)
+
+    async def search(i):
+        async with limit:
+            begun = time.perf_counter()
+            data = await service.fetch_data(use_cache=False, name=f'acme {i}')
+            latencies.append(time.perf_counter() - begun)
+            assert 'results' in data, data
+
+    started = time.perf_counter()
+    await asyncio.gather(*(search(i) for i in range(count)))
+    return latencies, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500, help='Searches per run')
+    parser.add_argument('--delay', type=float, default=0.1, help='Stub upstream latency per call (seconds)')
+    parser.add_argument('--threads', type=int, nargs='+', default=[8, 32], help='Threads for the sync client')
+    parser.add_argument('--tasks', type=int, nargs='+', default=[20, 50, 100], help='Concurrent tasks for the async client')
+    args = parser.parse_args()
+
+    with StubUpstream(delay=args.delay) as upstream:
+        setup_django(CSL_API_URL=upstream.url, CSL_API_RATE_LIMIT='0', CSL_CACHE_TTL='0')
+        from core.services.async_csl_service import AsyncCSLService
+        from core.services.csl_service import CSLService
+
+        service = CSLService()
+        print(f"{args.requests} searches against a stub answering in {args.delay * 1000:.0f} ms")
+        for threads in args.threads:
+            latencies, elapsed = run_threads(service, args.requests, threads)
+            print(summarize(f'sync, {threads} threads', latencies, elapsed))
+
+        async def run_async(tasks):
+            async_service = AsyncCSLService(service)
+            try:
+                return await run_tasks(async_service, args.requests, tasks)
+            finally:
+                await async_service.get_client().aclose()
+
+        for tasks in args.tasks:
+            latencies, elapsed = asyncio.run(run_async(tasks))
+            print(summarize(f'async, {tasks} tasks', latencies, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+import contextlib
+import json
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Iterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+def setup_django(**settings: str) -> None:
+    """
+    Configure Django for a benchmark run. Benchmarks default to SQLite so
+    they run without a database server; set USE_SQLITE= (empty) and the
+    DB_* variables to measure against PostgreSQL.
+
+    Args:
+        **settings: Environment variables to set before the settings load
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'csl_api_project.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('USE_SQLITE', 'True')
+    os.environ.update(settings)
+
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database() -> Iterator[None]:
+    """Run the block against a freshly migrated throwaway database"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of measurements"""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(label: str, latencies: List[float], elapsed: Optional[float] = None) -> str:
+    """One line with the p50/p99 latency (ms) of a run, and its throughput if timed"""
+    line = (
+        f"{label:<28} p50 {percentile(latencies, 50) * 1000:8.2f} ms"
+        f"   p99 {percentile(latencies, 99) * 1000:8.2f} ms"
+    )
+    if elapsed:
+        line += f"   {len(latencies) / elapsed:8.1f} req/s"
+    return line
+
+
+def synthetic_entity(i: int, source_list: str = 'SDN') -> Dict[str, Any]:
+    """A CSL API search result shaped like the real ones, with two addresses and two IDs"""
+    return {
+        'id': f'bench-{source_list}-{i}',
+        'name': f'Acme Trading Company {i}',
+        'alt_names': [f'Acme Intl {i}', f'ACME Handels GmbH {i}'],
+        'source_list': source_list,
+        'programs': ['IRAN'],
+        'remarks': f'Synthetic benchmark entity number {i}',
+        'sdn_type': 'Entity',
+        'addresses': [
+            {'address': f'{i} Main Street', 'city': 'Tehran', 'country': 'IR', 'postal_code': f'{10000 + i % 90000}'},
+            {'address': f'{i} Harbour Road', 'city': 'Dubai', 'country': 'AE'},
+        ],
+        'ids': [
+            {'type': 'Passport', 'number': f'P-{i:07d}', 'country': 'IR'},
+            {'type': 'Tax ID', 'number': f'T {i:07d}'},
+        ],
+    }
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Listen backlog (set before the socket listens): many clients connect at once
+    request_queue_size = 1024
+
+
+class StubUpstream:
+    """
+    Local stand-in for the CSL API search endpoint.
+
+    Answers every GET with a page of synthetic results after `delay`
+    seconds, over HTTP/1.1 keep-alive, and over TLS when `tls` is set
+    (with a throwaway self-signed certificate, which needs the openssl CLI).
+    """
+
+    def __init__(self, delay: float = 0.0, page_size: int = 10, total: int = 1000, tls: bool = False):
+        self.delay = delay
+        self.page_size = page_size
+        self.total = total
+        self.tls = tls
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._tempdir = None
+        self.cafile = None
+
+    @property
+    def url(self) -> str:
+        scheme = 'https' if self.tls else 'http'
+        return f"{scheme}://localhost:{self._server.server_address[1]}/search"
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out in separate writes; don't let Nagle hold the body back
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with upstream._lock:
+                    upstream.connections += 1
+
+            def do_GET(self):
+                with upstream._lock:
+                    upstream.requests += 1
+                if upstream.delay:
+                    time.sleep(upstream.delay)
+                query = parse_qs(urlparse(self.path).query)
+                offset = int(query.get('offset', ['0'])[0])
+                size = int(query.get('size', [str(upstream.page_size)])[0])
+                results = [
+                    synthetic_entity(i)
+                    for i in range(offset, min(offset + size, upstream.total))
+                ]
+                body = json.dumps({'total': upstream.total, 'results': results}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self) -> 'StubUpstream':
+        server = StubServer(('127.0.0.1', 0), self._handler())
+        if self.tls:
+            if not shutil.which('openssl'):
+                raise RuntimeError("TLS stub needs the openssl command")
+            self._tempdir = tempfile.TemporaryDirectory()
+            self.cafile = os.path.join(self._tempdir.name, 'cert.pem')
+            keyfile = os.path.join(self._tempdir.name, 'key.pem')
+            subprocess.run(
+                ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                 '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost',
+                 '-keyout', keyfile, '-out', self.cafile],
+                check=True, capture_output=True,
+            )
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.cafile, keyfile)
+            server.socket = context.wrap_socket(server.socket, server_side=True)
+        self._server = server
+        threading.Thread(target=server.serve_forever, name='stub-upstream', daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._tempdir is not None:
+            self._tempdir.cleanup()
@@ -0,0 +1,64 @@
+"""
+Latency of CSL API calls with and without the pooled keep-alive session.
+
+Runs the same sequence of searches against a local stub upstream, once
+with a new connection per call (module-level requests.get, as before
+the pooled session) and once through CSLService.fetch_data.
+
+    python -m benchmarks.http_pooling --requests 500 --tls
+"""
+import argparse
+import os
+import time
+
+import requests
+
+from benchmarks.common import StubUpstream, setup_django, summarize
+
+
+def run(label, call, count):
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        begun = time.perf_counter()
+        data = call(i)
+        latencies.append(time.perf_counter() - begun)
+        assert 'results' in data, data
+    print(summarize(label, latencies, time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500, help='Searches per run')
+    parser.add_argument('--delay', type=float, default=0.0, help='Stub upstream latency per call (seconds)')
+    parser.add_argument('--tls', action='store_true', help='Serve the stub over TLS (needs openssl)')
+    args = parser.parse_args()
+
+    with StubUpstream(delay=args.delay, tls=args.tls) as upstream:
+        setup_django(CSL_API_URL=upstream.url, CSL_API_RATE_LIMIT='0', CSL_CACHE_TTL='0')
+        from core.services.csl_service import CSLService
+
+        if upstream.cafile:
+            os.environ['REQUESTS_CA_BUNDLE'] = upstream.cafile
+        headers = {'Cache-Control': 'no-cache', 'subscription-key': ''}
+
+        def unpooled(i):
+            response = requests.get(upstream.url, params={'name': f'acme {i}'}, headers=headers)
+            return response.json()
+
+        service = CSLService()
+
+        def pooled(i):
+            return service.fetch_data(use_cache=False, name=f'acme {i}')
+
+        print(f"{args.requests} sequential searches against {upstream.url}")
+        before = upstream.connections
+        run('new connection per call', unpooled, args.requests)
+        print(f"{'':<28} {upstream.connections - before} connections opened")
+        before = upstream.connections
+        run('pooled session', pooled, args.requests)
+        print(f"{'':<28} {upstream.connections - before} connections opened")
+
+
+if __name__ == '__main__':
+    main()
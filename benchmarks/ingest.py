@@ -0,0 +1,55 @@
+"""
+Query count and wall time of storing CSL API results.
+
+Stores N synthetic entities in pages of 100 (as search and sync results
+arrive), then re-ingests the same pages, which replaces every entity's
+addresses and IDs.
+
+    python -m benchmarks.ingest --sizes 100 1000 10000
+"""
+import argparse
+import time
+
+from benchmarks.common import setup_django, synthetic_entity, test_database
+
+PAGE_SIZE = 100
+
+
+def store(pages):
+    from django.db import connection
+    from core.services.csl_service import csl_service
+
+    queries = []
+
+    def count(execute, sql, params, many, context):
+        queries.append(1)
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    with connection.execute_wrapper(count):
+        for page in pages:
+            csl_service.store_entities(page)
+    return len(queries), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='Entities per run')
+    args = parser.parse_args()
+
+    setup_django()
+    from api.models import ScreeningEntity
+
+    with test_database():
+        print(f"{'entities':>9} {'run':<10} {'queries':>8} {'seconds':>9} {'entities/s':>11}")
+        for size in args.sizes:
+            ScreeningEntity.objects.all().delete()
+            results = [synthetic_entity(i) for i in range(size)]
+            pages = [results[i:i + PAGE_SIZE] for i in range(0, size, PAGE_SIZE)]
+            for run in ('insert', 're-ingest'):
+                queries, elapsed = store(pages)
+                print(f"{size:>9} {run:<10} {queries:>8} {elapsed:>9.3f} {size / elapsed:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Queries/sec of fuzzy name search over a synthetic sanctions list.
+
+Stores N entities (three names each) with varied names, then runs
+misspelled lookups of stored names through:
+
+- the old icontains search on name and alt_names (a scan per query)
+- NameMatcher.search over the in-memory n-gram index
+- NameMatcher.search with a source list filter applied to the candidates
+  (1 in 20 entities is on the filtered list)
+
+    python -m benchmarks.matching --entities 20000 --queries 500
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import setup_django, synthetic_entity, test_database
+
+CONSONANTS = 'bcdfghjklmnprstvwz'
+VOWELS = 'aeiouy'
+SUFFIXES = ['Trading', 'Holdings', 'Shipping', 'Industries', 'Group', 'LLC', 'Company', 'Bank', '']
+
+
+def word(rng):
+    return ''.join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def company_name(rng):
+    return ' '.join(filter(None, [word(rng), word(rng), rng.choice(SUFFIXES)]))
+
+
+def misspell(rng, name):
+    """Drop, double or swap one character"""
+    i = rng.randrange(1, len(name) - 1)
+    return rng.choice([name[:i] + name[i + 1:], name[:i] + name[i] + name[i:], name[:i] + name[i + 1] + name[i] + name[i + 2:]])
+
+
+def run(label, search, queries):
+    started = time.perf_counter()
+    found = sum(1 for query in queries if search(query))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<36} {len(queries) / elapsed:9.1f} queries/s   {found}/{len(queries)} with results")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entities', type=int, default=20000, help='Entities in the list')
+    parser.add_argument('--queries', type=int, default=500, help='Lookups per run')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Q
+    from api.models import ScreeningEntity
+    from core.services.csl_service import csl_service
+    from core.services.matching import NameMatcher, accept_queryset
+
+    rng = random.Random(42)
+    with test_database():
+        names = []
+        for start in range(0, args.entities, 1000):
+            page = []
+            for i in range(start, min(start + 1000, args.entities)):
+                entity = synthetic_entity(i, source_list='EL' if i % 20 == 0 else 'SDN')
+                entity['name'] = company_name(rng)
+                entity['alt_names'] = [company_name(rng), company_name(rng)]
+                names.append(entity['name'])
+                page.append(entity)
+            csl_service.store_entities(page)
+
+        matcher = NameMatcher()
+        started = time.perf_counter()
+        matcher.load()
+        stats = matcher.stats()
+        print(f"{stats['entities']} entities, {stats['names']} names indexed in {time.perf_counter() - started:.2f} s")
+
+        queries = [misspell(rng, rng.choice(names)) for _ in range(args.queries)]
+        exact = [rng.choice(names) for _ in range(args.queries)]
+        active = ScreeningEntity.objects.filter(is_active=True)
+        on_list = accept_queryset(active.filter(source_list='EL'))
+
+        def icontains(query):
+            return list(active.filter(Q(name__icontains=query) | Q(alt_names__icontains=query))[:10])
+
+        run('icontains, exact names', icontains, exact[:max(1, args.queries // 10)])
+        run('icontains, misspelled', icontains, queries[:max(1, args.queries // 10)])
+        run('name matcher, misspelled', lambda query: matcher.search(query, limit=10, min_score=80), queries)
+        run('name matcher, source list filter', lambda query: matcher.search(
+            query, limit=10, min_score=80, accept=on_list), queries)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Latency of local text search: substring scans vs the full-text index.
+
+Stores N synthetic entities with varied names, then runs the same
+searches, each a first page of 20 results plus the total count (as the
+paginated API does), through:
+
+- ILIKE '%q%' over name, alt names and remarks (the old SearchFilter)
+- full_text_search (FTS5 on SQLite, tsvector/trigram on PostgreSQL)
+
+    python -m benchmarks.search --entities 100000 --queries 200
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import setup_django, summarize, synthetic_entity, test_database
+from benchmarks.matching import company_name
+
+
+def run(label, search, queries):
+    latencies = []
+    started = time.perf_counter()
+    for query in queries:
+        begun = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - begun)
+    print(summarize(label, latencies, time.perf_counter() - started))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entities', type=int, default=100000, help='Entities in the list')
+    parser.add_argument('--queries', type=int, default=200, help='Searches per run')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Q
+    from api.models import ScreeningEntity
+    from core.services.csl_service import csl_service
+    from core.services.search_backend import full_text_search
+
+    rng = random.Random(7)
+    with test_database():
+        names = []
+        started = time.perf_counter()
+        for start in range(0, args.entities, 1000):
+            page = []
+            for i in range(start, min(start + 1000, args.entities)):
+                entity = synthetic_entity(i)
+                entity['name'] = company_name(rng)
+                entity['alt_names'] = [company_name(rng)]
+                names.append(entity['name'])
+                page.append(entity)
+            csl_service.store_entities(page)
+        print(f"{args.entities} entities stored in {time.perf_counter() - started:.0f} s")
+
+        # A whole name, its first word, and a word shared by many entities
+        queries = []
+        for _ in range(args.queries // 3 + 1):
+            name = rng.choice(names)
+            queries += [name, name.split()[0], 'trading']
+        queries = queries[:args.queries]
+        active = ScreeningEntity.objects.filter(is_active=True).order_by('-updated_at')
+
+        def substring(query):
+            matched = active.filter(
+                Q(name__icontains=query) | Q(alt_names__icontains=query) | Q(remarks__icontains=query)
+            )
+            return list(matched[:20]), matched.count()
+
+        def full_text(query):
+            matched = full_text_search(active, query)
+            return list(matched[:20]), matched.count()
+
+        for query in queries[:3]:
+            print(f"  {query!r}: {substring(query)[1]} substring matches, {full_text(query)[1]} full-text matches")
+        run('ILIKE substring scan', substring, queries)
+        run('full-text index', full_text, queries)
+
+
+if __name__ == '__main__':
+    main()
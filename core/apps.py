@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Connects the signal receivers that keep the dataset statistics, screening cache, name matcher and
+        # address/ID indexes fresh, and the one timing database queries when metrics are enabled
+        from core.services import addresses, identifiers, matching, metrics, screening_cache, stats  # noqa: F401
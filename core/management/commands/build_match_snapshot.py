@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    """
+    Compile the active entities into the match snapshot file that web and
+    screening workers map read-only. Syncs rebuild it automatically; run
+    this for the first build or after loading data by other means.
+    """
+    help = 'Build the shared match snapshot (names, aliases and addresses) from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=settings.CSL_MATCH_SNAPSHOT,
+            help='Snapshot file path (default: CSL_MATCH_SNAPSHOT)',
+        )
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('Set CSL_MATCH_SNAPSHOT or pass --output')
+
+        try:
+            meta = write_snapshot(options['output'])
+        except OSError as e:
+            raise CommandError(f"Can't write the match snapshot: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Match snapshot v{meta['version']} written to {options['output']}: "
+            f"{meta['entities']} entities, {meta['names']} names"
+        ))
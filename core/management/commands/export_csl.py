@@ -0,0 +1,69 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.export import DATASETS, FORMATS, ExportError, stream_export, validate_export
+
+
+class Command(BaseCommand):
+    """
+    Export screening data to a file (or stdout) in constant memory.
+    """
+    help = 'Export entities or search history as NDJSON, CSV or Parquet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dataset',
+            choices=list(DATASETS),
+            default='entities',
+            help='What to export',
+        )
+        parser.add_argument(
+            '--format',
+            dest='file_format',
+            choices=FORMATS,
+            default='ndjson',
+            help='Output format (parquet requires pyarrow)',
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write; defaults to stdout',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Gzip the output (ignored for parquet, which is compressed internally)',
+        )
+        parser.add_argument(
+            '--include-inactive',
+            action='store_true',
+            help='Include entities that have been removed from the list',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            validate_export(options['dataset'], options['file_format'])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        chunks = stream_export(
+            options['dataset'],
+            options['file_format'],
+            compress=options['gzip'],
+            include_inactive=options['include_inactive'],
+        )
+
+        try:
+            if options['output']:
+                with open(options['output'], 'wb') as fp:
+                    for chunk in chunks:
+                        fp.write(chunk)
+            else:
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+        except OSError as e:
+            raise CommandError(f"Export failed: {e}")
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Exported {options['dataset']} to {options['output']}"))
@@ -0,0 +1,90 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.services.csl_service import CSLAPIError, csl_service
+from core.services.refresh import SourceRefresher
+
+
+class Command(BaseCommand):
+    """
+    Re-sync only the source lists that changed upstream, as reported by the
+    CSL API /sources endpoint. Runs once (e.g. from cron) or, with --loop, as
+    a scheduler polling every --interval seconds.
+    """
+    help = 'Delta-refresh the local mirror: re-sync the source lists that changed since the last refresh'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sources',
+            help='Comma-separated source list codes to consider (default: all)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Re-sync every source list, changed or not',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=100,
+            help='Entities per page/transaction (max 100)',
+        )
+        parser.add_argument(
+            '--max-remove-fraction',
+            type=float,
+            default=settings.CSL_MIRROR_MAX_REMOVE_FRACTION,
+            help='Fail a list instead of soft-deleting more than this fraction of the active entities',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, refreshing every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=settings.CSL_REFRESH_INTERVAL,
+            help='Seconds between refreshes with --loop',
+        )
+
+    def handle(self, *args, **options):
+        refresher = SourceRefresher(
+            csl_service, page_size=options['page_size'], max_remove_fraction=options['max_remove_fraction']
+        )
+        codes = options['sources'].split(',') if options['sources'] else None
+
+        while True:
+            try:
+                summary = refresher.refresh(force=options['force'], codes=codes)
+            except CSLAPIError as e:
+                if not options['loop']:
+                    raise CommandError(f"Source refresh failed: {e}")
+                self.stderr.write(f"Source refresh failed: {e}")
+            else:
+                self.report(summary)
+                if summary['failed'] and not options['loop']:
+                    raise CommandError(f"Source refresh failed for: {', '.join(summary['failed'])}")
+
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
+
+    def report(self, summary):
+        self.stdout.write(self.style.SUCCESS(
+            f"Source refresh complete: {summary['sources_checked']} checked, "
+            f"{len(summary['refreshed'])} refreshed, {len(summary['unchanged'])} unchanged"
+        ))
+        for code, stats in summary['refreshed'].items():
+            self.stdout.write(
+                f"  {code}: {stats['inserted']} inserted, {stats['updated']} updated, "
+                f"{stats['unchanged']} unchanged, {stats['removed']} removed "
+                f"({stats['elapsed_seconds']:.2f}s)"
+            )
+        for code, error in summary['failed'].items():
+            self.stderr.write(f"  {code}: failed: {error}")
+        for source in summary['skipped']:
+            self.stderr.write(f"  {source}: skipped (unknown source list code)")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from core.services.jobs import JobWorker
+
+
+class Command(BaseCommand):
+    """
+    Drain the database-backed job queue.
+    """
+    help = 'Run background jobs (syncs, batch screenings) queued in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of jobs to run in parallel',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling',
+        )
+
+    def handle(self, *args, **options):
+        worker = JobWorker(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+            once=options['once'],
+        )
+        self.stdout.write(f"Job worker {worker.name} started with concurrency {worker.concurrency}")
+        worker.run()
+        self.stdout.write(self.style.SUCCESS('Job worker stopped'))
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.csl_service import csl_service
+from core.services.mirror import MirrorSync, MirrorSyncError
+
+
+class Command(BaseCommand):
+    """
+    Mirror the full Consolidated Screening List into the local database.
+    """
+    help = 'Sync a local mirror of the Consolidated Screening List from the CSL API or a JSON dump'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dump',
+            help='Path to a downloaded CSL JSON file to load instead of paging through the API',
+        )
+        parser.add_argument(
+            '--sources',
+            help='Comma-separated source list codes to sync (API mode only)',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=100,
+            help='Entities per page/transaction (max 100)',
+        )
+        parser.add_argument(
+            '--max-remove-fraction',
+            type=float,
+            default=settings.CSL_MIRROR_MAX_REMOVE_FRACTION,
+            help='Fail instead of soft-deleting more than this fraction of the active entities',
+        )
+
+    def handle(self, *args, **options):
+        sync = MirrorSync(
+            csl_service, page_size=options['page_size'], max_remove_fraction=options['max_remove_fraction']
+        )
+
+        try:
+            if options['dump']:
+                with open(options['dump'], encoding='utf-8') as fp:
+                    stats = sync.sync_from_dump(fp)
+            else:
+                sources = options['sources'].split(',') if options['sources'] else None
+                stats = sync.sync_from_api(sources=sources)
+        except (MirrorSyncError, OSError, ValueError) as e:
+            raise CommandError(f"Mirror sync failed: {e}")
+
+        self.stdout.write(self.style.SUCCESS('Mirror sync complete'))
+        for key, value in stats.items():
+            if isinstance(value, float):
+                value = f"{value:.2f}"
+            self.stdout.write(f"  {key.replace('_', ' ')}: {value}")
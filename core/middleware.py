@@ -0,0 +1,55 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+
+from core.services.metrics import count_queries, metrics
+
+
+class MetricsMiddleware:
+    """
+    Records request latency, status and database query count per view, and
+    the time spent rendering template and DRF responses. Removed from the
+    middleware chain entirely when metrics are disabled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not metrics.enabled:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        with count_queries() as queries:
+            response = self.get_response(request)
+        self.record(request, response, started, queries[0])
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with count_queries() as queries:
+            response = await self.get_response(request)
+        self.record(request, response, started, queries[0])
+        return response
+
+    def process_template_response(self, request, response):
+        rendering = time.perf_counter()
+        response.add_post_render_callback(
+            lambda rendered: metrics.observe('csl_stage_seconds', time.perf_counter() - rendering, stage='render')
+        )
+        return response
+
+    @staticmethod
+    def record(request, response, started, queries):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        metrics.observe('csl_http_request_seconds', time.perf_counter() - started, view=view)
+        metrics.observe('csl_db_queries_per_request', queries, view=view)
+        metrics.inc('csl_http_requests_total', view=view, method=request.method, status=response.status_code)
@@ -0,0 +1,193 @@
+from typing import Dict, List, Any, Optional
+
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q, QuerySet
+from django.db.models.lookups import PostgresOperatorLookup
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from rest_framework import filters
+
+from api.models import Address
+from core.constants.countries import ISO_COUNTRIES, COUNTRY_ALIASES
+from core.services.matching import normalize_name
+
+# Street words folded to one spelling, so "Main Street" and "main st." index alike
+STREET_ABBREVIATIONS = {
+    'street': 'st', 'str': 'st', 'strasse': 'st',
+    'avenue': 'ave', 'av': 'ave',
+    'road': 'rd',
+    'boulevard': 'blvd',
+    'drive': 'dr',
+    'lane': 'ln',
+    'place': 'pl',
+    'square': 'sq',
+    'highway': 'hwy',
+    'building': 'bldg',
+    'floor': 'fl',
+    'suite': 'ste',
+    'apartment': 'apt',
+    'office': 'ofc',
+    'number': 'no', 'nr': 'no',
+    'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+}
+
+# Address query parameters and the Address field each one filters
+ADDRESS_FILTERS = {
+    'address': 'street_key',
+    'city': 'city_key',
+    'state': 'state_key',
+    'postal_code': 'postal_key',
+    'country': 'country_key',
+}
+
+
+def _country_lookup() -> Dict[str, str]:
+    lookup = {}
+    for alpha2, alpha3, name, other_names in ISO_COUNTRIES:
+        for value in (alpha2, alpha3, name, *other_names):
+            lookup[normalize_name(value)] = alpha2
+    for alias, alpha2 in COUNTRY_ALIASES.items():
+        lookup[normalize_name(alias)] = alpha2
+    return lookup
+
+
+COUNTRY_LOOKUP = _country_lookup()
+
+
+def canonical_country(value: Optional[str]) -> Optional[str]:
+    """
+    Canonicalize a country to its ISO 3166-1 alpha-2 code.
+
+    Args:
+        value: Country code (alpha-2 or alpha-3) or name, in any case
+
+    Returns:
+        Alpha-2 code, the folded value in upper case if it isn't a known
+        country, or None if it's empty
+    """
+    folded = normalize_name(value or '')
+    if not folded:
+        return None
+    return COUNTRY_LOOKUP.get(folded, folded.upper())
+
+
+def fold_street(value: Optional[str]) -> str:
+    """Fold a street address into space-separated tokens with common words abbreviated"""
+    return ' '.join(STREET_ABBREVIATIONS.get(token, token) for token in normalize_name(value or '').split())
+
+
+def fold_postal_code(value: Optional[str]) -> str:
+    """Fold a postal code to its letters and digits in upper case ("sw1a 1aa" -> "SW1A1AA")"""
+    return normalize_name(value or '').replace(' ', '').upper()
+
+
+def address_keys(fields: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """
+    Build the normalized index columns of an address.
+
+    Args:
+        fields: Address field values (address, city, state, postal_code, country)
+
+    Returns:
+        Dictionary of Address index field values, None where the field is empty
+    """
+    return {
+        'street_key': fold_street(fields.get('address')) or None,
+        'city_key': normalize_name(fields.get('city') or '') or None,
+        'state_key': normalize_name(fields.get('state') or '') or None,
+        'postal_key': fold_postal_code(fields.get('postal_code')) or None,
+        'country_key': canonical_country(fields.get('country')),
+    }
+
+
+class WordSimilar(PostgresOperatorLookup):
+    """pg_trgm word similarity: the query is similar to some run of words in the column"""
+    lookup_name = 'word_similar'
+    postgres_operator = '%%>'
+
+
+Address._meta.get_field('street_key').register_lookup(WordSimilar)
+
+
+def filter_addresses(queryset: QuerySet, **criteria: Optional[str]) -> QuerySet:
+    """
+    Filter Address rows on the normalized address index.
+
+    City, state, postal code and country are equality matches on the folded
+    columns. The street is a fuzzy match: on PostgreSQL it uses trigram word
+    similarity (pg_trgm index on street_key); elsewhere every query token must
+    start a word of the folded street, in any order.
+
+    Args:
+        queryset: Address queryset
+        **criteria: Values keyed by ADDRESS_FILTERS query parameter
+
+    Returns:
+        Filtered queryset
+    """
+    keys = address_keys({name: criteria.get(name) for name in ADDRESS_FILTERS})
+    conditions = {
+        field: keys[field]
+        for name, field in ADDRESS_FILTERS.items()
+        if name != 'address' and keys[field]
+    }
+    queryset = queryset.filter(**conditions)
+
+    street = keys['street_key']
+    if street:
+        if connection.vendor == 'postgresql':
+            queryset = queryset.filter(street_key__word_similar=street)
+        else:
+            for token in street.split():
+                queryset = queryset.filter(Q(street_key__startswith=token) | Q(street_key__contains=f' {token}'))
+    return queryset
+
+
+def filter_entities_by_address(queryset: QuerySet, **criteria: Optional[str]) -> QuerySet:
+    """
+    Filter ScreeningEntity rows to those with one address matching every criterion.
+
+    The criteria are checked together against each address in a single
+    EXISTS subquery, so results need no DISTINCT.
+
+    Args:
+        queryset: ScreeningEntity queryset
+        **criteria: Values keyed by ADDRESS_FILTERS query parameter
+
+    Returns:
+        Filtered queryset
+    """
+    if not any(criteria.get(name) for name in ADDRESS_FILTERS):
+        return queryset
+    return queryset.filter(Exists(
+        filter_addresses(Address.objects.filter(entity=OuterRef('pk')), **criteria)
+    ))
+
+
+class AddressIndexFilter(filters.BaseFilterBackend):
+    """Filter backend answering the address query parameters from the normalized address index"""
+
+    def filter_queryset(self, request, queryset, view):
+        criteria = {name: request.query_params.get(name) for name in ADDRESS_FILTERS}
+        if not any(criteria.values()):
+            return queryset
+        return filter_addresses(queryset, **criteria)
+
+    def get_schema_operation_parameters(self, view) -> List[Dict[str, Any]]:
+        return [
+            {
+                'name': name,
+                'required': False,
+                'in': 'query',
+                'description': f'Match the normalized {name.replace("_", " ")}',
+                'schema': {'type': 'string'},
+            }
+            for name in ADDRESS_FILTERS
+        ]
+
+
+@receiver(pre_save, sender=Address)
+def fill_address_keys(sender, instance, **kwargs):
+    """Index single-row saves (API, admin); bulk ingest builds the keys itself"""
+    for field, value in address_keys({name: getattr(instance, name) for name in ADDRESS_FILTERS}).items():
+        setattr(instance, field, value)
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import random
+import weakref
+from typing import Dict, List, Any, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from api.models import ScreeningEntity
+from core.services.csl_service import CSLService, RETRY_STATUS_CODES, csl_service
+from core.services.metrics import metrics
+from core.services.rate_limiter import INTERACTIVE, RateLimitTimeout
+from core.services.response_cache import make_cache_key
+from core.services.search_log import search_log
+from core.services.single_flight import AsyncSingleFlight
+
+try:
+    import httpx
+except ImportError:  # Optional dependency: pip install "csl-api-app[async]"
+    httpx = None
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+class AsyncCSLService:
+    """
+    Asyncio variant of CSLService for ASGI deployments (CSL_ASGI). Under
+    WSGI every async view runs on a new event loop, so the pooled client
+    would be created per request; use the synchronous service there.
+
+    Upstream calls go through a pooled httpx.AsyncClient so one process can
+    keep many CSL API requests in flight. Parameter building, response
+    caching and entity storage are shared with the synchronous service.
+    """
+
+    def __init__(self, service: CSLService):
+        if httpx is None:
+            raise ImportError("AsyncCSLService requires the 'httpx' package")
+        self.service = service
+        # httpx clients are bound to the event loop they were first used on
+        self._clients = weakref.WeakKeyDictionary()
+        # Concurrent identical searches share one upstream call and one ingest
+        self.flights = AsyncSingleFlight()
+
+    def get_client(self) -> 'httpx.AsyncClient':
+        """
+        Get the pooled HTTP client for the running event loop.
+
+        Returns:
+            Configured httpx AsyncClient
+        """
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.CSL_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.CSL_ASYNC_MAX_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(
+                    settings.CSL_HTTP_READ_TIMEOUT,
+                    connect=settings.CSL_HTTP_CONNECT_TIMEOUT,
+                ),
+                headers={
+                    'Cache-Control': 'no-cache',
+                    'subscription-key': self.service.subscription_key or '',
+                },
+            )
+            self._clients[loop] = client
+        return client
+
+    def backoff(self, attempt: int, response: Optional['httpx.Response'] = None) -> float:
+        """
+        Seconds to wait before a retry: Retry-After when the API sends one,
+        otherwise full-jitter exponential backoff.
+        """
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return float(retry_after)
+        return random.uniform(0, settings.CSL_HTTP_BACKOFF_FACTOR * (2 ** attempt))
+
+    async def acquire_slot(self, priority: str = INTERACTIVE) -> float:
+        """
+        Wait (in a worker thread) for a call slot from the governor. Pair with
+        governor.release(limited=False): the client's own connection pool
+        (CSL_ASYNC_MAX_CONNECTIONS) bounds concurrency instead of the sync
+        client's cap.
+
+        Returns:
+            Seconds spent waiting
+        """
+        governor = self.service.governor
+        acquiring = asyncio.ensure_future(
+            sync_to_async(governor.acquire, thread_sensitive=False)(
+                priority, settings.CSL_API_QUEUE_TIMEOUT, limited=False
+            )
+        )
+        try:
+            return await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The thread carries on waiting; hand back the slot once it's granted
+            acquiring.add_done_callback(
+                lambda done: governor.release(limited=False) if not done.cancelled() and done.exception() is None else None
+            )
+            raise
+
+    async def fetch_data(self, use_cache: bool = True, priority: str = INTERACTIVE, **kwargs) -> Dict[str, Any]:
+        """
+        Fetch data from the CSL API with the provided parameters.
+
+        Every attempt waits for a slot from the synchronous service's governor,
+        so async and sync calls share one quota.
+
+        Args:
+            use_cache: Whether to consult the response cache
+            priority: INTERACTIVE or BULK
+            **kwargs: Various search parameters for the CSL API
+
+        Returns:
+            Response data from CSL API
+        """
+        params = self.service.build_params(**kwargs)
+        base_url = self.service.base_url
+
+        # The cache backend and the governor's token store may block (Redis,
+        # database), so they're called from a worker thread, off the event loop
+        if use_cache:
+            cached = await sync_to_async(self.service.cache.get, thread_sensitive=False)(base_url, params)
+            if cached is not None:
+                return cached
+
+        client = self.get_client()
+        max_retries = settings.CSL_HTTP_MAX_RETRIES
+
+        governor = self.service.governor
+
+        for attempt in range(max_retries + 1):
+            try:
+                await self.acquire_slot(priority)
+            except RateLimitTimeout as e:
+                logger.error(f"CSL API call not admitted: {e}")
+                return {"error": str(e)}
+
+            try:
+                with metrics.timer('upstream_http'):
+                    response = await client.get(base_url, params=params)
+            except httpx.HTTPError as e:
+                if attempt == max_retries:
+                    logger.error(f"Error fetching data from CSL API: {e}")
+                    return {"error": str(e)}
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            finally:
+                governor.release(limited=False)
+
+            if response.status_code == 429:
+                await sync_to_async(governor.throttle, thread_sensitive=False)(self.service.retry_after(response.headers))
+                if governor.store is not None and attempt < max_retries:
+                    # The next acquire_slot waits out the pause
+                    continue
+            if response.status_code in RETRY_STATUS_CODES and attempt < max_retries:
+                await asyncio.sleep(self.backoff(attempt, response))
+                continue
+            break
+
+        if response.status_code != 200:
+            logger.error(f"CSL API Error - Status Code: {response.status_code}")
+            logger.error(f"CSL API Error - Response: {response.text}")
+            return {"error": f"API Error: {response.status_code}", "message": response.text}
+
+        with metrics.timer('json_decode'):
+            data = response.json()
+        if use_cache:
+            await sync_to_async(self.service.cache.set, thread_sensitive=False)(base_url, params, data)
+        return data
+
+    async def search_entities(self, query: str, user: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Search entities in the CSL API.
+
+        Args:
+            query: Search query string
+            user: Optional user identifier for logging
+            **kwargs: Filters accepted by CSLService.search_entities
+
+        Returns:
+            Search results with metadata
+        """
+        search_params = self.service.build_search_params(query, **kwargs)
+
+        started_at = timezone.now()
+
+        results = await self.fetch_data(**search_params)
+
+        # Log the search with its result count (buffered, written in the background)
+        await search_log.alog(
+            query,
+            results_count=results.get('total', 0),
+            user=user,
+            search_params=search_params,
+            timestamp=started_at
+        )
+
+        return results
+
+    async def search_and_store(self, query: str, user: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Search the CSL API and store the matching entities. Concurrent
+        identical searches on this event loop share one upstream call and
+        ingest (see CSLService.search_and_store); every caller's search is logged.
+
+        Args:
+            query: Search query string
+            user: Optional user identifier for logging
+            **kwargs: Filters accepted by CSLService.search_entities
+
+        Returns:
+            Search results with metadata
+        """
+        search_params = self.service.build_search_params(query, **kwargs)
+        started_at = timezone.now()
+
+        async def fetch_and_ingest() -> Dict[str, Any]:
+            results = await self.fetch_data(**search_params)
+            await sync_to_async(self.service.ingest_search_results)(search_params, results)
+            return results
+
+        results = await self.flights.do(make_cache_key(self.service.base_url, search_params), fetch_and_ingest)
+
+        # Log the search with its result count (buffered, written in the background)
+        await search_log.alog(
+            query,
+            results_count=results.get('total', 0),
+            user=user,
+            search_params=search_params,
+            timestamp=started_at
+        )
+
+        return results
+
+    async def store_entities(self, results: List[Dict[str, Any]]) -> List[ScreeningEntity]:
+        """
+        Store a batch of entities through the synchronous bulk ingest path.
+
+        Args:
+            results: List of entity dictionaries from a CSL API response
+
+        Returns:
+            Created or updated ScreeningEntity instances
+        """
+        return await sync_to_async(self.service.store_entities)(results)
+
+
+# Singleton instance for reuse (None when httpx isn't installed)
+async_csl_service = AsyncCSLService(csl_service) if httpx is not None else None
@@ -1,14 +1,67 @@
 import requests
+import hashlib
+import json
 import logging
 import os
-from datetime import datetime
+import random
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
 from django.conf import settings
-from typing import Dict, List, Any, Optional, Union
-from api.models import ScreeningEntity, Address, EntityID, SearchQuery
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, List, Any, Iterator, Optional, Union
+from api.models import ScreeningEntity, AlternateName, Address, EntityID
+from core.services.addresses import address_keys
+from core.services.identifiers import normalize_id_number
+from core.services.matching import name_matcher
+from core.services.metrics import metrics
+from core.services.rate_limiter import BULK, INTERACTIVE, RateLimiter, RateLimitTimeout, build_governor
+from core.services.response_cache import build_response_cache, make_cache_key
+from core.services.screening_cache import screening_cache
+from core.services.search_backend import build_aliases, build_search_text
+from core.services.search_log import search_log
+from core.services.single_flight import SingleFlight, advisory_lock
+from core.services.stats import dataset_stats, ingest_deltas
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Transient upstream failures, retried by the HTTP client
+TRANSIENT_STATUS_CODES = (500, 502, 503, 504)
+
+# HTTP statuses worth retrying: rate limiting (through the governor) and transient failures
+RETRY_STATUS_CODES = (429,) + TRANSIENT_STATUS_CODES
+
+# Rows per bulk statement / IN (...) lookup when ingesting entities
+INGEST_BATCH_SIZE = 500
+
+# ScreeningEntity columns overwritten when an existing source_id is re-ingested
+ENTITY_UPDATE_FIELDS = [
+    'name', 'alt_names', 'source_list', 'source_information_url', 'source_list_url',
+    'programs', 'federal_register_notice', 'start_date', 'end_date', 'remarks',
+    'entity_number', 'sdn_type', 'score', 'search_text', 'content_hash', 'is_active', 'updated_at',
+]
+
+
+class CSLAPIError(Exception):
+    """Raised when a CSL API call made on behalf of a multi-page operation fails."""
+
+
+class JitteredRetry(Retry):
+    """
+    Retry policy that applies full jitter to urllib3's exponential backoff so
+    that concurrent workers don't retry against the CSL API in lockstep.
+    """
+    
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff > 0 else 0
+
 
 class CSLService:
     """
@@ -26,6 +79,57 @@ class CSLService:
         # Check if we can get them directly from os.environ
         logger.info(f"CSL_API_URL from os.environ: '{os.environ.get('CSL_API_URL')}'")
         logger.info(f"CSL_SUBSCRIPTION_KEY from os.environ: '{os.environ.get('CSL_SUBSCRIPTION_KEY')}'")
+        
+        # (connect, read) timeouts so a slow upstream call can't hold a worker forever
+        self.timeout = (settings.CSL_HTTP_CONNECT_TIMEOUT, settings.CSL_HTTP_READ_TIMEOUT)
+        self.session = self.build_session()
+        
+        # Cache of upstream responses keyed on canonical search parameters
+        self.cache = build_response_cache()
+        
+        # Concurrent identical searches share one upstream call and one ingest
+        self.flights = SingleFlight()
+        
+        # Quota and concurrency limits for upstream calls, with interactive/bulk priorities
+        self.governor = build_governor()
+    
+    def build_session(self) -> requests.Session:
+        """
+        Build a pooled, keep-alive HTTP session for the CSL API.
+        
+        Connections are reused across calls, and idempotent requests are retried
+        with jittered exponential backoff on 5xx responses and connection errors.
+        429s are left to fetch_data, which retries them through the governor so
+        the pause applies to every caller sharing the quota.
+        
+        Returns:
+            Configured requests Session
+        """
+        retry = JitteredRetry(
+            total=settings.CSL_HTTP_MAX_RETRIES,
+            backoff_factor=settings.CSL_HTTP_BACKOFF_FACTOR,
+            status_forcelist=TRANSIENT_STATUS_CODES,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False,  # Hand the final response back so fetch_data can report it
+        )
+        adapter = HTTPAdapter(
+            pool_connections=settings.CSL_HTTP_POOL_SIZE,
+            pool_maxsize=settings.CSL_HTTP_POOL_SIZE,
+            max_retries=retry,
+        )
+        
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        
+        # Headers must match exactly what the API expects
+        session.headers.update({
+            'Cache-Control': 'no-cache',
+            'subscription-key': self.subscription_key or '',
+        })
+        
+        return session
     
     def build_params(self, **kwargs) -> Dict[str, Any]:
         """
@@ -46,11 +150,17 @@ class CSLService:
                 
         return params
     
-    def fetch_data(self, **kwargs) -> Dict[str, Any]:
+    def fetch_data(self, use_cache: bool = True, priority: str = INTERACTIVE, **kwargs) -> Dict[str, Any]:
         """
         Fetch data from the CSL API with the provided parameters.
         
+        Successful responses are served from and stored in the response cache
+        unless use_cache is False. Upstream calls wait for a slot from the
+        governor; interactive calls are admitted ahead of bulk ones.
+        
         Args:
+            use_cache: Whether to consult the response cache
+            priority: INTERACTIVE or BULK
             **kwargs: Various search parameters for the CSL API
             
         Returns:
@@ -58,37 +168,137 @@ class CSLService:
         """
         params = self.build_params(**kwargs)
         
-        # Set up headers with the API key
-        # Ensure headers match exactly what the API expects
-        headers = {
-            'Cache-Control': 'no-cache',
-            'subscription-key': self.subscription_key
-        }
+        if use_cache:
+            cached = self.cache.get(self.base_url, params)
+            if cached is not None:
+                logger.debug(f"CSL API cache hit - Params: {params}")
+                return cached
         
         # Log request details for debugging
         logger.debug(f"CSL API Request - URL: {self.base_url}")
         logger.debug(f"CSL API Request - Key: {self.subscription_key}")
-        logger.debug(f"CSL API Request - Headers: {headers}")
+        logger.debug(f"CSL API Request - Headers: {dict(self.session.headers)}")
         logger.debug(f"CSL API Request - Params: {params}")
         
         try:
-            # Make the request with the properly formatted headers
-            response = requests.get(self.base_url, params=params, headers=headers)
-            
-            # Log response details
-            logger.debug(f"CSL API Response - Status Code: {response.status_code}")
-            logger.debug(f"CSL API Response - Headers: {dict(response.headers)}")
+            for attempt in range(settings.CSL_HTTP_MAX_RETRIES + 1):
+                # Make the request over the pooled session (headers are set on the session)
+                with self.governor.slot(priority, timeout=settings.CSL_API_QUEUE_TIMEOUT):
+                    with metrics.timer('upstream_http'):
+                        response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+                
+                # Log response details
+                logger.debug(f"CSL API Response - Status Code: {response.status_code}")
+                logger.debug(f"CSL API Response - Headers: {dict(response.headers)}")
+                
+                if response.status_code != 429:
+                    break
+                # Over quota: the governor holds this call and every other one back
+                wait = self.retry_after(response.headers)
+                self.governor.throttle(wait)
+                if attempt < settings.CSL_HTTP_MAX_RETRIES and self.governor.store is None:
+                    time.sleep(wait)  # No token bucket to do the waiting
             
             if response.status_code != 200:
                 logger.error(f"CSL API Error - Status Code: {response.status_code}")
                 logger.error(f"CSL API Error - Response: {response.text}")
                 return {"error": f"API Error: {response.status_code}", "message": response.text}
             
-            return response.json()
+            with metrics.timer('json_decode'):
+                data = response.json()
+            if use_cache:
+                self.cache.set(self.base_url, params, data)
+            return data
+        except RateLimitTimeout as e:
+            logger.error(f"CSL API call not admitted: {e}")
+            return {"error": str(e)}
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching data from CSL API: {e}")
             return {"error": str(e)}
     
+    @staticmethod
+    def retry_after(headers: Any, default: float = 1.0) -> float:
+        """Seconds the CSL API asked us to wait (Retry-After), or `default`"""
+        value = headers.get('Retry-After', '')
+        return float(value) if value.isdigit() else default
+    
+    @property
+    def sources_url(self) -> Optional[str]:
+        """URL of the CSL API /sources endpoint (CSL_SOURCES_URL, or derived from CSL_API_URL)"""
+        if settings.CSL_SOURCES_URL:
+            return settings.CSL_SOURCES_URL
+        if not self.base_url:
+            return None
+        base = self.base_url.rstrip('/')
+        if base.endswith('/search'):
+            base = base[:-len('/search')]
+        return f"{base}/sources"
+    
+    def fetch_sources(self) -> List[Dict[str, Any]]:
+        """
+        Fetch per-source metadata (last updated/imported dates) from the CSL API.
+        Never cached: the refresh scheduler polls this to detect changed lists.
+    
+        Returns:
+            One dictionary per source list
+    
+        Raises:
+            CSLAPIError: If the request fails or the response isn't a list of sources
+        """
+        if not self.sources_url:
+            raise CSLAPIError("CSL_API_URL is not configured")
+    
+        try:
+            with self.governor.slot(BULK, timeout=settings.CSL_API_QUEUE_TIMEOUT):
+                with metrics.timer('upstream_http'):
+                    response = self.session.get(self.sources_url, timeout=self.timeout)
+        except RateLimitTimeout as e:
+            raise CSLAPIError(str(e)) from e
+        except requests.exceptions.RequestException as e:
+            raise CSLAPIError(f"CSL API /sources request failed: {e}") from e
+    
+        if response.status_code != 200:
+            raise CSLAPIError(f"CSL API /sources error: {response.status_code} {response.text[:200]}")
+    
+        try:
+            with metrics.timer('json_decode'):
+                data = response.json()
+        except ValueError as e:
+            raise CSLAPIError(f"CSL API /sources returned invalid JSON: {e}") from e
+    
+        # Accept a bare list or a list wrapped in an object
+        if isinstance(data, dict):
+            data = data.get('results', data.get('sources'))
+        if not isinstance(data, list):
+            raise CSLAPIError("CSL API /sources response doesn't contain a list of sources")
+        return [source for source in data if isinstance(source, dict)]
+    
+    def build_search_params(self, query: str, sources: Optional[List[str]] = None,
+                            countries: Optional[List[str]] = None, entity_types: Optional[List[str]] = None,
+                            fuzzy_name: bool = True, address: Optional[str] = None,
+                            city: Optional[str] = None, state: Optional[str] = None,
+                            postal_code: Optional[str] = None, size: int = 100,
+                            offset: int = 0) -> Dict[str, Any]:
+        """
+        Map search arguments onto CSL API search parameters.
+        
+        Returns:
+            Dict of search parameters
+        """
+        return {
+            'name': query,  # API uses 'name' not 'q'
+            'sources': ','.join(sources) if sources else None,
+            'countries': ','.join(countries) if countries else None,
+            'types': ','.join(entity_types) if entity_types else None,
+            'fuzzy_name': 'true' if fuzzy_name else 'false',
+            'address': address,
+            'city': city,
+            'state': state,
+            'postal_code': postal_code,
+            'size': min(size, 100),  # Cap at 100 as per API limits
+            'offset': offset
+        }
+    
     def search_entities(self, query: str, sources: Optional[List[str]] = None,
                        countries: Optional[List[str]] = None, entity_types: Optional[List[str]] = None,
                        fuzzy_name: bool = True, address: Optional[str] = None, 
@@ -115,131 +325,311 @@ class CSLService:
         Returns:
             Search results with metadata
         """
-        search_params = {
-            'name': query,  # API uses 'name' not 'q'
-            'sources': ','.join(sources) if sources else None,
-            'countries': ','.join(countries) if countries else None,
-            'types': ','.join(entity_types) if entity_types else None,
-            'fuzzy_name': 'true' if fuzzy_name else 'false',
-            'address': address,
-            'city': city,
-            'state': state,
-            'postal_code': postal_code,
-            'size': min(size, 100),  # Cap at 100 as per API limits
-            'offset': offset
-        }
-        
-        # Store search query in database
-        search_query = SearchQuery.objects.create(
-            query_text=query,
-            results_count=0,  # Will update after getting results
-            user=user,
-            search_params=search_params
+        search_params = self.build_search_params(
+            query, sources=sources, countries=countries, entity_types=entity_types,
+            fuzzy_name=fuzzy_name, address=address, city=city, state=state,
+            postal_code=postal_code, size=size, offset=offset
         )
         
+        started_at = timezone.now()
+        
         # Fetch results from API
         results = self.fetch_data(**search_params)
         
-        # Update search query with result count
-        if 'total' in results:
-            search_query.results_count = results.get('total', 0)
-            search_query.save()
+        # Log the search with its result count (buffered, written in the background)
+        search_log.log(
+            query,
+            results_count=results.get('total', 0),
+            user=user,
+            search_params=search_params,
+            timestamp=started_at
+        )
         
         return results
     
-    def fetch_and_store_entity(self, entity_data: Dict[str, Any]) -> ScreeningEntity:
+    def ingest_search_results(self, search_params: Dict[str, Any], results: Dict[str, Any]) -> None:
         """
-        Process an entity from API response and store in database.
+        Store the entities of a search response, once per cached response:
+        repeating a search while its response is cached doesn't rewrite them.
+        The flag lives in the response's cache entry, so evicting the
+        response also forgets that it was stored.
+        
+        Args:
+            search_params: CSL API parameters of the search
+            results: Response data from the CSL API
+        """
+        if not results.get('results'):
+            return
+        if self.cache.is_ingested(self.base_url, search_params):
+            return
+        self.store_entities(results['results'])
+        self.cache.mark_ingested(self.base_url, search_params, results)
+    
+    def search_and_store(self, query: str, user: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Search the CSL API and store the matching entities.
+        
+        Concurrent identical searches (same canonical parameters) in this
+        process share a single upstream call and ingest, and each caller gets
+        the result. With CSL_SINGLE_FLIGHT_LOCK on PostgreSQL, searches in
+        other processes wait on an advisory lock and then find the response
+        in the (shared) response cache. Every caller's search is logged.
+        
+        Args:
+            query: Search query string
+            user: Optional user identifier for logging
+            **kwargs: Filters accepted by search_entities
+            
+        Returns:
+            Search results with metadata
+        """
+        search_params = self.build_search_params(query, **kwargs)
+        started_at = timezone.now()
+        key = make_cache_key(self.base_url, search_params)
+        
+        def fetch_and_ingest() -> Dict[str, Any]:
+            with advisory_lock(key, enabled=settings.CSL_SINGLE_FLIGHT_LOCK):
+                results = self.fetch_data(**search_params)
+                self.ingest_search_results(search_params, results)
+            return results
+        
+        results = self.flights.do(key, fetch_and_ingest)
+        
+        # Log the search with its result count (buffered, written in the background)
+        search_log.log(
+            query,
+            results_count=results.get('total', 0),
+            user=user,
+            search_params=search_params,
+            timestamp=started_at
+        )
+        
+        return results
+    
+    def parse_date(self, value: Any) -> Optional[date]:
+        """
+        Parse a CSL API date string (YYYY-MM-DD).
+        
+        Args:
+            value: Raw date value from the API
+            
+        Returns:
+            Parsed date, or None if missing or malformed
+        """
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            return None
+    
+    def parse_entity(self, entity_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Map an entity from an API response onto model field values.
         
         Args:
             entity_data: Dictionary containing entity data from CSL API
             
         Returns:
-            Created or updated ScreeningEntity instance
+            Dictionary with the entity's source_id, model fields, aliases, addresses and IDs
         """
-        # Extract address and ID data
-        addresses_data = entity_data.pop('addresses', [])
-        ids_data = entity_data.pop('ids', [])
-        
-        # Format dates properly
-        for date_field in ['start_date', 'end_date']:
-            if entity_data.get(date_field):
-                try:
-                    entity_data[date_field] = datetime.strptime(
-                        entity_data[date_field], '%Y-%m-%d'
-                    ).date()
-                except (ValueError, TypeError):
-                    entity_data[date_field] = None
-        
-        # Create or update entity
         source_id = entity_data.get('source_id') or entity_data.get('id')
         if not source_id:
             # Generate a composite ID if not provided
             source_id = f"{entity_data.get('source_list')}-{entity_data.get('name')}"
         
-        entity, created = ScreeningEntity.objects.update_or_create(
-            source_id=source_id,
-            defaults={
-                'name': entity_data.get('name', ''),
-                'alt_names': entity_data.get('alt_names', []),
-                'source_list': entity_data.get('source_list', ''),
-                'source_information_url': entity_data.get('source_information_url'),
-                'source_list_url': entity_data.get('source_list_url'),
-                'programs': entity_data.get('programs', []),
-                'federal_register_notice': entity_data.get('federal_register_notice'),
-                'start_date': entity_data.get('start_date'),
-                'end_date': entity_data.get('end_date'),
-                'remarks': entity_data.get('remarks'),
-                'entity_number': entity_data.get('entity_number'),
-                'sdn_type': entity_data.get('sdn_type'),
-                'score': entity_data.get('score', 0),
+        fields = {
+            'name': entity_data.get('name', ''),
+            'alt_names': entity_data.get('alt_names', []),
+            # The search endpoint reports the list as 'source'; 'source_list' is the legacy name
+            'source_list': entity_data.get('source_list') or entity_data.get('source') or '',
+            'source_information_url': entity_data.get('source_information_url'),
+            'source_list_url': entity_data.get('source_list_url'),
+            'programs': entity_data.get('programs', []),
+            'federal_register_notice': entity_data.get('federal_register_notice'),
+            'start_date': self.parse_date(entity_data.get('start_date')),
+            'end_date': self.parse_date(entity_data.get('end_date')),
+            'remarks': entity_data.get('remarks'),
+            'entity_number': entity_data.get('entity_number'),
+            'sdn_type': entity_data.get('sdn_type'),
+            'score': entity_data.get('score', 0),
+        }
+        
+        addresses = [
+            {
+                'address': addr_data.get('address'),
+                'city': addr_data.get('city'),
+                'state': addr_data.get('state'),
+                'country': addr_data.get('country'),
+                'postal_code': addr_data.get('postal_code'),
+            }
+            for addr_data in entity_data.get('addresses') or []
+        ]
+        
+        ids = [
+            {
+                'id_type': id_data.get('type', ''),
+                'id_number': id_data.get('number', ''),
+                'id_country': id_data.get('country'),
+                'issue_date': self.parse_date(id_data.get('issue_date')),
+                'expiration_date': self.parse_date(id_data.get('expiration_date')),
             }
+            for id_data in entity_data.get('ids') or []
+        ]
+        
+        fields['content_hash'] = self.content_hash(source_id, fields, addresses, ids)
+        fields['is_active'] = True
+        # Derived from the hashed fields, so it's kept out of the hash
+        fields['search_text'] = build_search_text(fields['name'], fields['alt_names'], fields['remarks'])
+        
+        return {
+            'source_id': source_id,
+            'fields': fields,
+            'aliases': build_aliases(fields['alt_names']),
+            'addresses': addresses,
+            'ids': ids,
+        }
+    
+    def content_hash(self, source_id: str, fields: Dict[str, Any],
+                     addresses: List[Dict[str, Any]], ids: List[Dict[str, Any]]) -> str:
+        """
+        Hash the content of a parsed entity so unchanged records can be skipped on resync.
+        
+        The relevance score is excluded, since it depends on the query rather than the record.
+        
+        Returns:
+            Hex SHA-256 digest
+        """
+        content = {key: value for key, value in fields.items() if key != 'score'}
+        payload = json.dumps(
+            [source_id, content, addresses, ids],
+            sort_keys=True, default=str, separators=(',', ':')
         )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @metrics.timed('db_ingest')
+    def store_entities(self, results: List[Dict[str, Any]]) -> List[ScreeningEntity]:
+        """
+        Store a batch of entities from an API response in a single transaction.
         
-        # If entity was updated, clear existing related data
-        if not created:
-            entity.addresses.all().delete()
-            entity.ids.all().delete()
-        
-        # Create addresses
-        for addr_data in addresses_data:
-            Address.objects.create(
-                entity=entity,
-                address=addr_data.get('address'),
-                city=addr_data.get('city'),
-                state=addr_data.get('state'),
-                country=addr_data.get('country'),
-                postal_code=addr_data.get('postal_code')
-            )
+        Existing entities are matched on source_id and upserted with one
+        bulk statement per batch; their aliases, addresses and IDs are replaced in bulk.
+        
+        Args:
+            results: List of entity dictionaries from a CSL API response
+            
+        Returns:
+            Created or updated ScreeningEntity instances, one per distinct source_id
+        """
+        # Later duplicates of a source_id win, as they would with per-row upserts
+        parsed = {}
+        for entity_data in results:
+            record = self.parse_entity(entity_data)
+            parsed.pop(record['source_id'], None)
+            parsed[record['source_id']] = record
+        
+        if not parsed:
+            return []
         
-        # Create IDs
-        for id_data in ids_data:
-            # Format dates for IDs
-            issue_date = None
-            expiration_date = None
+        source_ids = list(parsed)
+        
+        with transaction.atomic():
+            existing = {}
+            stored_hashes = {}
+            for i in range(0, len(source_ids), INGEST_BATCH_SIZE):
+                for source_id, pk, source_list, is_active, content_hash in ScreeningEntity.objects.filter(
+                    source_id__in=source_ids[i:i + INGEST_BATCH_SIZE]
+                ).values_list('source_id', 'id', 'source_list', 'is_active', 'content_hash'):
+                    existing[source_id] = (pk, source_list, is_active)
+                    stored_hashes[source_id] = content_hash
             
-            if id_data.get('issue_date'):
-                try:
-                    issue_date = datetime.strptime(id_data['issue_date'], '%Y-%m-%d').date()
-                except (ValueError, TypeError):
-                    pass
-                    
-            if id_data.get('expiration_date'):
-                try:
-                    expiration_date = datetime.strptime(id_data['expiration_date'], '%Y-%m-%d').date()
-                except (ValueError, TypeError):
-                    pass
+            # Replace children of entities that are being updated
+            replaced_countries = Counter()
+            if existing:
+                stale = [pk for pk, _, _ in existing.values()]
+                for i in range(0, len(stale), INGEST_BATCH_SIZE):
+                    replaced_countries.update(dict(
+                        Address.objects.filter(
+                            entity_id__in=stale[i:i + INGEST_BATCH_SIZE], country__gt=''
+                        ).values_list('country').annotate(n=Count('id')).order_by()
+                    ))
+                    AlternateName.objects.filter(entity_id__in=stale[i:i + INGEST_BATCH_SIZE]).delete()
+                    Address.objects.filter(entity_id__in=stale[i:i + INGEST_BATCH_SIZE]).delete()
+                    EntityID.objects.filter(entity_id__in=stale[i:i + INGEST_BATCH_SIZE]).delete()
             
-            EntityID.objects.create(
-                entity=entity,
-                id_type=id_data.get('type', ''),
-                id_number=id_data.get('number', ''),
-                id_country=id_data.get('country'),
-                issue_date=issue_date,
-                expiration_date=expiration_date
+            entities = [
+                ScreeningEntity(source_id=source_id, **record['fields'])
+                for source_id, record in parsed.items()
+            ]
+            ScreeningEntity.objects.bulk_create(
+                entities,
+                batch_size=INGEST_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['source_id'],
+                update_fields=ENTITY_UPDATE_FIELDS,
             )
+            
+            # Backends that can't return upserted keys leave pk unset
+            missing = [entity.source_id for entity in entities if entity.pk is None]
+            if missing:
+                pk_by_source = {}
+                for i in range(0, len(missing), INGEST_BATCH_SIZE):
+                    pk_by_source.update(
+                        ScreeningEntity.objects.filter(
+                            source_id__in=missing[i:i + INGEST_BATCH_SIZE]
+                        ).values_list('source_id', 'id')
+                    )
+                for entity in entities:
+                    if entity.pk is None:
+                        entity.pk = pk_by_source[entity.source_id]
+            
+            aliases = []
+            addresses = []
+            ids = []
+            for entity in entities:
+                record = parsed[entity.source_id]
+                aliases.extend(AlternateName(entity=entity, **alias) for alias in record['aliases'])
+                addresses.extend(Address(entity=entity, **addr, **address_keys(addr)) for addr in record['addresses'])
+                ids.extend(
+                    EntityID(entity=entity, **id_fields, normalized_number=normalize_id_number(id_fields['id_number']) or None)
+                    for id_fields in record['ids']
+                )
+            
+            AlternateName.objects.bulk_create(aliases, batch_size=INGEST_BATCH_SIZE)
+            Address.objects.bulk_create(addresses, batch_size=INGEST_BATCH_SIZE)
+            EntityID.objects.bulk_create(ids, batch_size=INGEST_BATCH_SIZE)
+            
+            dataset_stats.apply(ingest_deltas(parsed.values(), existing, replaced_countries))
+            
+            # Invalidate cached screenings of the lists whose entities actually changed
+            changed_lists = set()
+            for source_id, record in parsed.items():
+                old = existing.get(source_id)
+                if old is None or not old[2] or stored_hashes[source_id] != record['fields']['content_hash']:
+                    changed_lists.add(record['fields']['source_list'])
+                    if old is not None:
+                        changed_lists.add(old[1])
+            if changed_lists:
+                screening_cache.bump(changed_lists)
+            
+            # Keep the in-memory matcher in step once the data is committed
+            transaction.on_commit(lambda: name_matcher.update_entities(entities))
+        
+        logger.debug(f"Stored {len(entities)} entities ({len(existing)} updated)")
+        
+        return entities
+    
+    def fetch_and_store_entity(self, entity_data: Dict[str, Any]) -> ScreeningEntity:
+        """
+        Process an entity from API response and store in database.
         
-        return entity
+        Args:
+            entity_data: Dictionary containing entity data from CSL API
+            
+        Returns:
+            Created or updated ScreeningEntity instance
+        """
+        return self.store_entities([entity_data])[0]
     
     def fetch_and_store(self, **kwargs) -> Dict[str, Any]:
         """
@@ -255,9 +645,7 @@ class CSLService:
         entities_created = 0
         
         if 'results' in results:
-            for entity_data in results['results']:
-                self.fetch_and_store_entity(entity_data)
-                entities_created += 1
+            entities_created = len(self.store_entities(results['results']))
         
         return {
             'total': results.get('total', 0),
@@ -265,6 +653,86 @@ class CSLService:
             'search_performed': kwargs
         }
 
+    def iter_pages(self, page_size: int = 100, workers: Optional[int] = None,
+                   rate: Optional[float] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Fetch every page of a search, in order.
+        
+        The first page tells us the total; the remaining offsets are fetched
+        concurrently by a bounded thread pool under a rate limit. At most a
+        few pages per worker are buffered, so callers can stream pages into
+        storage without holding the full result set.
+        
+        Args:
+            page_size: Results per page (max 100)
+            workers: Concurrent page fetches (defaults to CSL_FETCH_WORKERS)
+            rate: Maximum page requests per second (defaults to CSL_FETCH_RATE_LIMIT)
+            **kwargs: Search parameters for the CSL API
+            
+        Yields:
+            Response data for each page, ordered by offset
+            
+        Raises:
+            CSLAPIError: If any page fails
+        """
+        page_size = min(page_size, 100)  # Cap at 100 as per API limits
+        workers = workers or settings.CSL_FETCH_WORKERS
+        limiter = RateLimiter(settings.CSL_FETCH_RATE_LIMIT if rate is None else rate)
+        
+        def fetch_page(offset: int) -> Dict[str, Any]:
+            limiter.acquire()
+            page = self.fetch_data(use_cache=False, priority=BULK, size=page_size, offset=offset, **kwargs)
+            if 'error' in page:
+                raise CSLAPIError(f"CSL API page at offset {offset} failed: {page['error']}")
+            return page
+        
+        first = fetch_page(0)
+        yield first
+        
+        total = first.get('total', 0)
+        if len(first.get('results', [])) >= total:
+            return
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='csl-page') as executor:
+            pending = deque()
+            try:
+                for offset in range(page_size, total, page_size):
+                    pending.append(executor.submit(fetch_page, offset))
+                    # Bound the number of pages fetched ahead of the consumer
+                    if len(pending) >= workers * 2:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+    
+    def fetch_and_store_all(self, **kwargs) -> Dict[str, Any]:
+        """
+        Fetch every page of a search from the CSL API and store each page as it arrives.
+        
+        Args:
+            **kwargs: Search parameters for the CSL API (see iter_pages)
+            
+        Returns:
+            Dictionary with results and metadata
+        """
+        total = 0
+        pages_fetched = 0
+        entities_created = 0
+        
+        for page in self.iter_pages(**kwargs):
+            total = page.get('total', total)
+            pages_fetched += 1
+            entities_created += len(self.store_entities(page.get('results', [])))
+        
+        return {
+            'total': total,
+            'pages_fetched': pages_fetched,
+            'entities_created': entities_created,
+            'search_performed': kwargs
+        }
+
 
 # Singleton instance for reuse
 csl_service = CSLService()
\ No newline at end of file
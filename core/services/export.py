@@ -0,0 +1,335 @@
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import date, datetime
+from typing import Dict, List, Any, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from api.models import ScreeningEntity, Address, EntityID, SearchQuery
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Rows fetched per server-side cursor round trip (and per prefetch of related rows)
+EXPORT_CHUNK_SIZE = 2000
+
+# Encoded output is buffered up to this many bytes before being yielded
+FLUSH_BYTES = 64 * 1024
+
+# Rows per Parquet row group
+PARQUET_ROW_GROUP_SIZE = 50000
+
+FORMATS = ('ndjson', 'csv', 'parquet')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+ENTITY_COLUMNS = [
+    'id', 'source_id', 'name', 'alt_names', 'source_list', 'source_information_url',
+    'source_list_url', 'programs', 'federal_register_notice', 'start_date', 'end_date',
+    'remarks', 'entity_number', 'sdn_type', 'is_active', 'created_at', 'updated_at',
+    'addresses', 'ids',
+]
+
+SEARCH_HISTORY_COLUMNS = ['id', 'query_text', 'results_count', 'user', 'timestamp', 'search_params']
+
+# Columns holding lists or objects; CSV and Parquet carry them as JSON text
+NESTED_COLUMNS = {'alt_names', 'programs', 'addresses', 'ids', 'search_params'}
+
+
+class ExportError(ValueError):
+    """Raised when an export is requested with invalid options."""
+
+
+def entity_records(include_inactive: bool = False,
+                   chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over every entity with its addresses and IDs.
+
+    Rows are read through a server-side cursor in chunks; related rows are
+    prefetched once per chunk, so memory use doesn't grow with the table.
+
+    Args:
+        include_inactive: Also export entities that have been removed from the list
+        chunk_size: Rows per chunk
+
+    Yields:
+        One dictionary per entity
+    """
+    queryset = ScreeningEntity.objects.defer('search_text', 'content_hash').prefetch_related(
+        Prefetch('addresses', queryset=Address.objects.order_by('id')),
+        Prefetch('ids', queryset=EntityID.objects.order_by('id')),
+    ).order_by('id')
+    if not include_inactive:
+        queryset = queryset.filter(is_active=True)
+
+    for entity in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            'id': entity.id,
+            'source_id': entity.source_id,
+            'name': entity.name,
+            'alt_names': entity.alt_names or [],
+            'source_list': entity.source_list,
+            'source_information_url': entity.source_information_url,
+            'source_list_url': entity.source_list_url,
+            'programs': entity.programs or [],
+            'federal_register_notice': entity.federal_register_notice,
+            'start_date': entity.start_date,
+            'end_date': entity.end_date,
+            'remarks': entity.remarks,
+            'entity_number': entity.entity_number,
+            'sdn_type': entity.sdn_type,
+            'is_active': entity.is_active,
+            'created_at': entity.created_at,
+            'updated_at': entity.updated_at,
+            'addresses': [
+                {
+                    'address': address.address,
+                    'city': address.city,
+                    'state': address.state,
+                    'country': address.country,
+                    'postal_code': address.postal_code,
+                }
+                for address in entity.addresses.all()
+            ],
+            'ids': [
+                {
+                    'id_type': entity_id.id_type,
+                    'id_number': entity_id.id_number,
+                    'id_country': entity_id.id_country,
+                    'issue_date': entity_id.issue_date,
+                    'expiration_date': entity_id.expiration_date,
+                }
+                for entity_id in entity.ids.all()
+            ],
+        }
+
+
+def search_history_records(include_inactive: bool = False,
+                           chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the search history, oldest first.
+
+    Args:
+        include_inactive: Unused; accepted so every dataset takes the same arguments
+        chunk_size: Rows per chunk
+
+    Yields:
+        One dictionary per logged search
+    """
+    queryset = SearchQuery.objects.order_by('id').values(*SEARCH_HISTORY_COLUMNS)
+    yield from queryset.iterator(chunk_size=chunk_size)
+
+
+# Exportable datasets: record iterator and column order
+DATASETS = {
+    'entities': (entity_records, ENTITY_COLUMNS),
+    'search_history': (search_history_records, SEARCH_HISTORY_COLUMNS),
+}
+
+
+def encode_cell(column: str, value: Any) -> Any:
+    """Flatten a value for CSV/Parquet: nested values become JSON, dates ISO 8601"""
+    if column in NESTED_COLUMNS:
+        return json.dumps(value, cls=DjangoJSONEncoder) if value is not None else None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_ndjson(records: Iterator[Dict[str, Any]], columns: List[str]) -> Iterator[bytes]:
+    """
+    Encode records as newline-delimited JSON.
+
+    Yields:
+        Chunks of roughly FLUSH_BYTES of encoded output
+    """
+    buffer = []
+    size = 0
+    for record in records:
+        line = (json.dumps(record, cls=DjangoJSONEncoder) + '\n').encode('utf-8')
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_csv(records: Iterator[Dict[str, Any]], columns: List[str]) -> Iterator[bytes]:
+    """
+    Encode records as CSV with a header row. Nested values are JSON-encoded.
+
+    Yields:
+        Chunks of roughly FLUSH_BYTES of encoded output
+    """
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(columns)
+    for record in records:
+        writer.writerow([encode_cell(column, record[column]) for column in columns])
+        if text.tell() >= FLUSH_BYTES:
+            yield text.getvalue().encode('utf-8')
+            text.seek(0)
+            text.truncate()
+    if text.tell():
+        yield text.getvalue().encode('utf-8')
+
+
+class _ChunkSink:
+    """Write-only file object whose contents are drained after each write to the Parquet writer"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(records: Iterator[Dict[str, Any]], columns: List[str],
+                 row_group_size: int = PARQUET_ROW_GROUP_SIZE) -> Iterator[bytes]:
+    """
+    Encode records as a Parquet file, one row group at a time.
+    Requires the optional ``pyarrow`` package.
+
+    Every column is written as text (nested values as JSON), except
+    integers and booleans, so row groups always share one schema.
+
+    Yields:
+        The encoded bytes of each row group, then the footer
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ExportError("Parquet export requires the 'pyarrow' package") from e
+
+    def column_type(column: str):
+        if column in ('id', 'results_count'):
+            return pa.int64()
+        if column == 'is_active':
+            return pa.bool_()
+        return pa.string()
+
+    schema = pa.schema([(column, column_type(column)) for column in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+
+    def write_group(rows):
+        table = pa.Table.from_pydict(
+            {column: [encode_cell(column, row[column]) for row in rows] for column in columns},
+            schema=schema,
+        )
+        writer.write_table(table)
+
+    try:
+        rows = []
+        for record in records:
+            rows.append(record)
+            if len(rows) >= row_group_size:
+                write_group(rows)
+                rows = []
+                yield sink.drain()
+        if rows:
+            write_group(rows)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {
+    'ndjson': iter_ndjson,
+    'csv': iter_csv,
+    'parquet': iter_parquet,
+}
+
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Gzip a byte stream incrementally.
+
+    Yields:
+        Compressed chunks (empty chunks are skipped)
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def validate_export(dataset: str, file_format: str) -> None:
+    """
+    Check export options before streaming starts, so errors can still be reported.
+
+    Raises:
+        ExportError: Unknown dataset or format, or a missing optional dependency
+    """
+    if dataset not in DATASETS:
+        raise ExportError(f"Unknown dataset '{dataset}'; expected one of: {', '.join(DATASETS)}")
+    if file_format not in FORMATS:
+        raise ExportError(f"Unknown format '{file_format}'; expected one of: {', '.join(FORMATS)}")
+    if file_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ExportError("Parquet export requires the 'pyarrow' package") from e
+
+
+def export_filename(dataset: str, file_format: str, compress: bool = False) -> str:
+    """Download filename for an export"""
+    filename = f"{dataset}.{file_format}"
+    return f"{filename}.gz" if compress and file_format != 'parquet' else filename
+
+
+def stream_export(dataset: str = 'entities', file_format: str = 'ndjson', compress: bool = False,
+                  include_inactive: bool = False,
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Stream a full export of a dataset in constant memory.
+
+    Args:
+        dataset: One of DATASETS
+        file_format: One of FORMATS
+        compress: Gzip the output (Parquet is already compressed, so this is ignored for it)
+        include_inactive: Include entities removed from the list
+        chunk_size: Rows per database round trip
+
+    Returns:
+        Iterator of encoded byte chunks
+    """
+    validate_export(dataset, file_format)
+    record_iterator, columns = DATASETS[dataset]
+    records = record_iterator(include_inactive=include_inactive, chunk_size=chunk_size)
+    chunks = ENCODERS[file_format](records, columns)
+    if compress and file_format != 'parquet':
+        chunks = gzip_chunks(chunks)
+    return chunks
@@ -0,0 +1,83 @@
+import logging
+from collections import Counter
+from typing import Dict, List, Any, Iterable
+
+from django.db.models import Count, QuerySet, Value
+from django.db.models import CharField
+from api.models import Address
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Facets returned with local search results, in display order
+FACETS = ('source_list', 'sdn_type', 'country')
+
+
+def format_facets(counts: Dict[str, Counter]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Order facet counts for display: most common values first, then by value.
+
+    Args:
+        counts: Counter of entities per value, for each facet
+
+    Returns:
+        For each facet, a list of {'value', 'count'} dictionaries
+    """
+    return {
+        facet: [
+            {'value': value, 'count': count}
+            for value, count in sorted(counts.get(facet, Counter()).items(), key=lambda item: (-item[1], item[0]))
+        ]
+        for facet in FACETS
+    }
+
+
+def facets_from_entities(entities: Iterable[Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Count facet values over search results that are already loaded, with
+    their addresses prefetched, in one pass and without further queries.
+
+    Args:
+        entities: ScreeningEntity instances
+
+    Returns:
+        Facet counts (see format_facets)
+    """
+    counts = {facet: Counter() for facet in FACETS}
+    for entity in entities:
+        if entity.source_list:
+            counts['source_list'][entity.source_list] += 1
+        if entity.sdn_type:
+            counts['sdn_type'][entity.sdn_type] += 1
+        # Count each entity once per country, however many addresses it has there
+        counts['country'].update({address.country for address in entity.addresses.all() if address.country})
+    return format_facets(counts)
+
+
+def facets_from_queryset(queryset: QuerySet) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Count facet values over an unevaluated result set with a single query:
+    one GROUP BY per facet, combined with UNION ALL.
+
+    Args:
+        queryset: ScreeningEntity queryset with the search filters applied
+
+    Returns:
+        Facet counts (see format_facets)
+    """
+    matched = queryset.order_by().values('pk')
+
+    def grouped(model_queryset, facet, field, entity_field):
+        return model_queryset.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}).values_list(
+            Value(facet, output_field=CharField()), field
+        ).annotate(n=Count(entity_field, distinct=True)).order_by()
+
+    entities = queryset.model.objects.filter(pk__in=matched)
+    source_lists = grouped(entities, 'source_list', 'source_list', 'pk')
+    sdn_types = grouped(entities, 'sdn_type', 'sdn_type', 'pk')
+    countries = grouped(Address.objects.filter(entity__in=matched), 'country', 'country', 'entity_id')
+
+    counts = {facet: Counter() for facet in FACETS}
+    for facet, value, count in source_lists.union(sdn_types, countries, all=True):
+        counts[facet][value] = count
+    return format_facets(counts)
@@ -0,0 +1,81 @@
+from typing import Dict, List, Any, Iterable, Optional
+
+from django.db.models import Prefetch
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from rest_framework import filters
+
+from api.models import Address, EntityID
+from core.services.matching import normalize_name
+
+
+def normalize_id_number(value: Optional[str]) -> str:
+    """
+    Normalize an identifier for matching: strip diacritics, spacing and
+    punctuation, and upper-case it ("ab-123 456" -> "AB123456").
+
+    Args:
+        value: Raw identifier
+
+    Returns:
+        Normalized identifier
+    """
+    return normalize_name(value or '').replace(' ', '').upper()
+
+
+def lookup_ids(id_numbers: Iterable[str], id_type: Optional[str] = None) -> Dict[str, List[EntityID]]:
+    """
+    Resolve many identifiers at once against the normalized identifier index.
+
+    One query finds every matching EntityID with its active entity; the
+    entities' addresses and IDs are prefetched for serialization.
+
+    Args:
+        id_numbers: Raw identifiers
+        id_type: Only match IDs of this type (case-insensitive)
+
+    Returns:
+        Matching EntityID rows keyed by normalized identifier
+    """
+    normalized = {normalize_id_number(number) for number in id_numbers} - {''}
+    if not normalized:
+        return {}
+
+    queryset = EntityID.objects.filter(
+        normalized_number__in=normalized, entity__is_active=True
+    ).select_related('entity').prefetch_related(
+        Prefetch('entity__addresses', queryset=Address.objects.order_by('id')),
+        Prefetch('entity__ids', queryset=EntityID.objects.order_by('id')),
+    ).order_by('id')
+    if id_type:
+        queryset = queryset.filter(id_type__iexact=id_type)
+
+    found: Dict[str, List[EntityID]] = {}
+    for entity_id in queryset:
+        found.setdefault(entity_id.normalized_number, []).append(entity_id)
+    return found
+
+
+class IdentifierFilter(filters.BaseFilterBackend):
+    """Filter backend matching ?id_number= against the normalized identifier index"""
+
+    def filter_queryset(self, request, queryset, view):
+        id_number = normalize_id_number(request.query_params.get('id_number'))
+        if not id_number:
+            return queryset
+        return queryset.filter(normalized_number=id_number)
+
+    def get_schema_operation_parameters(self, view) -> List[Dict[str, Any]]:
+        return [{
+            'name': 'id_number',
+            'required': False,
+            'in': 'query',
+            'description': 'Match the identifier ignoring case, spacing and punctuation',
+            'schema': {'type': 'string'},
+        }]
+
+
+@receiver(pre_save, sender=EntityID)
+def fill_normalized_number(sender, instance, **kwargs):
+    """Index single-row saves (API, admin); bulk ingest normalizes the numbers itself"""
+    instance.normalized_number = normalize_id_number(instance.id_number) or None
@@ -0,0 +1,318 @@
+import json
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from typing import Dict, Any, Callable, Iterator, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+from api.models import Job, JobResultChunk
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Save progress to the database at most every this many units of work
+PROGRESS_SAVE_INTERVAL = 500
+
+# Result rows per JobResultChunk
+RESULT_CHUNK_SIZE = 500
+
+
+class JobContext:
+    """
+    Handed to job handlers so they can report progress.
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+        self._last_saved = 0
+
+    def set_total(self, total: int) -> None:
+        self.job.total = total
+        Job.objects.filter(pk=self.job.pk).update(total=total)
+
+    def advance(self, amount: int = 1) -> None:
+        self.job.progress += amount
+        if self.job.progress - self._last_saved >= PROGRESS_SAVE_INTERVAL or self.job.progress == self.job.total:
+            Job.objects.filter(pk=self.job.pk).update(progress=self.job.progress)
+            self._last_saved = self.job.progress
+
+
+def run_fetch_and_store(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """Fetch a page (or with all_pages, every page) of CSL API results and store them"""
+    from core.services.csl_service import csl_service
+
+    params = dict(params)
+    if params.pop('all_pages', False):
+        result = csl_service.fetch_and_store_all(**params)
+    else:
+        result = csl_service.fetch_and_store(**params)
+    context.set_total(result['entities_created'])
+    context.advance(result['entities_created'])
+    return result
+
+
+def run_mirror_sync(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """Refresh the local mirror of the full list from the CSL API"""
+    from core.services.csl_service import csl_service
+    from core.services.mirror import MirrorSync
+
+    sync = MirrorSync(
+        csl_service, page_size=params.get('page_size', 100), max_remove_fraction=params.get('max_remove_fraction')
+    )
+    return sync.sync_from_api(sources=params.get('sources'))
+
+
+def run_source_refresh(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """Re-sync the source lists that changed upstream since the last refresh"""
+    from core.services.csl_service import csl_service
+    from core.services.refresh import SourceRefresher
+
+    refresher = SourceRefresher(
+        csl_service, page_size=params.get('page_size', 100), max_remove_fraction=params.get('max_remove_fraction')
+    )
+    return refresher.refresh(force=params.get('force', False), codes=params.get('sources'))
+
+
+def run_batch_screen(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """Screen a list of counterparties against local data"""
+    from core.services.screening import BatchScreener, parse_json_rows
+
+    # Rows are stored apart from the params (jobs queued before that carry them in params)
+    rows = parse_json_rows(context.job.payload if context.job.payload is not None else params.get('rows'))
+    context.set_total(len(rows))
+
+    # Jobs run outside the web server, so they can afford to start worker processes
+    screener = BatchScreener(
+        limit=params.get('limit', 10), min_score=params.get('min_score'), sources=params.get('sources'),
+        workers=settings.CSL_SCREENING_WORKERS
+    )
+    # Results are saved a chunk at a time rather than held in memory; a re-claimed job starts over
+    JobResultChunk.objects.filter(job=context.job).delete()
+    chunk = []
+    chunks = 0
+    rows_with_matches = 0
+    for result in screener.screen(rows):
+        chunk.append(result)
+        rows_with_matches += bool(result['matches'])
+        if len(chunk) >= RESULT_CHUNK_SIZE:
+            JobResultChunk.objects.create(job=context.job, index=chunks, rows=chunk)
+            chunks += 1
+            chunk = []
+        context.advance()
+    if chunk:
+        JobResultChunk.objects.create(job=context.job, index=chunks, rows=chunk)
+        chunks += 1
+
+    return {
+        'rows': len(rows),
+        'rows_with_matches': rows_with_matches,
+        'result_chunks': chunks,
+    }
+
+
+def stream_job_result(job: Job) -> Iterator[str]:
+    """
+    Encode a finished job's status and result as one JSON document, reading
+    result rows saved in chunks (under result.results) one chunk at a time.
+
+    Args:
+        job: Finished Job
+
+    Yields:
+        Consecutive pieces of the JSON document
+    """
+    result = dict(job.result or {})
+    chunked = result.pop('result_chunks', None) is not None
+    head = json.dumps({'id': job.id, 'status': job.status, 'error': job.error, 'result': result})
+    if not chunked:
+        yield head
+        return
+
+    # Re-open the result object to append the rows
+    yield head[:-2] + (', ' if result else '') + '"results": ['
+    first = True
+    rows = job.result_chunks.order_by('index').values_list('rows', flat=True)
+    for chunk in rows.iterator(chunk_size=1):
+        for row in chunk:
+            yield ('' if first else ', ') + json.dumps(row)
+            first = False
+    yield ']}}'
+
+
+# Job types and the handlers that run them
+JOB_HANDLERS: Dict[str, Callable[[Dict[str, Any], JobContext], Dict[str, Any]]] = {
+    'fetch_and_store': run_fetch_and_store,
+    'mirror_sync': run_mirror_sync,
+    'source_refresh': run_source_refresh,
+    'batch_screen': run_batch_screen,
+}
+
+
+def submit_job(job_type: str, params: Optional[Dict[str, Any]] = None,
+               user: Optional[str] = None, payload: Any = None) -> Job:
+    """
+    Queue a job for the workers.
+
+    Args:
+        job_type: One of JOB_HANDLERS
+        params: Arguments for the handler
+        user: Optional user identifier
+        payload: Bulk input for the handler (e.g. batch screening rows), kept
+            out of the params so job listings don't carry it
+
+    Returns:
+        The queued Job
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type '{job_type}'")
+    return Job.objects.create(job_type=job_type, params=params or {}, payload=payload, user=user)
+
+
+def lease_expiry():
+    """When a claim or heartbeat made now lapses"""
+    return timezone.now() + timedelta(seconds=settings.CSL_JOB_LEASE_SECONDS)
+
+
+def claim_next_job(worker: str) -> Optional[Job]:
+    """
+    Claim the oldest queued job, or a running one whose worker stopped
+    renewing its lease (e.g. it crashed).
+
+    Claims are a single conditional UPDATE on the job's status and lease,
+    so concurrent workers (threads or processes) never claim the same job
+    twice, on any database backend. On SQLite the statement takes the
+    write lock itself, waiting up to the connection timeout for it.
+
+    Args:
+        worker: Identifier recorded on the claimed job
+
+    Returns:
+        The claimed Job, or None if the queue is empty
+    """
+    now = timezone.now()
+    claimable = Q(status=Job.STATUS_QUEUED) | Q(status=Job.STATUS_RUNNING, lease_expires_at__lt=now)
+    candidates = Job.objects.filter(claimable).order_by('created_at', 'pk')
+    for job_id, job_status in candidates.values_list('pk', 'status')[:10]:
+        claimed = Job.objects.filter(claimable, pk=job_id).update(
+            status=Job.STATUS_RUNNING, worker=worker, started_at=now, lease_expires_at=lease_expiry()
+        )
+        if claimed:
+            if job_status == Job.STATUS_RUNNING:
+                logger.warning(f"Re-claimed job #{job_id} after its lease expired")
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+class Heartbeat:
+    """
+    Renews a running job's lease from a background thread until stopped.
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"job-heartbeat-{job.pk}", daemon=True)
+
+    def run(self) -> None:
+        try:
+            while not self.stop_event.wait(settings.CSL_JOB_LEASE_SECONDS / 3):
+                Job.objects.filter(pk=self.job.pk, worker=self.job.worker).update(lease_expires_at=lease_expiry())
+        except Exception as e:
+            logger.error(f"Heartbeat for job {self.job} failed: {e}")
+        finally:
+            connection.close()
+
+    def __enter__(self) -> 'Heartbeat':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop_event.set()
+        self.thread.join()
+
+
+def run_job(job: Job) -> None:
+    """
+    Run a claimed job and record its outcome, renewing its lease meanwhile.
+
+    Args:
+        job: Job in the running state
+    """
+    logger.info(f"Running job {job}")
+    # Only the worker holding the claim records the outcome
+    claim = Job.objects.filter(pk=job.pk, worker=job.worker)
+    try:
+        with Heartbeat(job):
+            result = JOB_HANDLERS[job.job_type](job.params or {}, JobContext(job))
+    except Exception as e:
+        logger.error(f"Job {job} failed: {e}")
+        claim.update(
+            status=Job.STATUS_FAILED,
+            error=''.join(traceback.format_exception(e)),
+            finished_at=timezone.now(),
+            lease_expires_at=None,
+        )
+        return
+
+    claim.update(
+        status=Job.STATUS_SUCCEEDED,
+        result=result,
+        finished_at=timezone.now(),
+        lease_expires_at=None,
+    )
+    logger.info(f"Job {job} succeeded")
+
+
+class JobWorker:
+    """
+    Drains the job queue with a pool of worker threads.
+    """
+
+    def __init__(self, concurrency: int = 1, poll_interval: float = 2.0, once: bool = False):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.once = once
+        self.stop_event = threading.Event()
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+
+    def work(self, index: int) -> None:
+        worker = f"{self.name}:{index}"
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                job = claim_next_job(worker)
+                if job is None:
+                    if self.once:
+                        return
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                run_job(job)
+        finally:
+            connection.close()
+
+    def run(self) -> None:
+        """Run worker threads until stopped (or until the queue is empty with once=True)"""
+        threads = [
+            threading.Thread(target=self.work, args=(i,), name=f"job-worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            logger.info("Stopping job workers after their current jobs")
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+
+    def stop(self) -> None:
+        self.stop_event.set()
@@ -0,0 +1,616 @@
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Any, Iterable, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from api.models import ScreeningEntity, SourceVersion
+from core.services.metrics import metrics
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Character n-gram length used by the inverted index
+NGRAM_SIZE = 3
+
+# Minimum Dice overlap of n-grams for a name to be scored at all
+MIN_NGRAM_OVERLAP = 0.25
+
+# Rebuild the index once this fraction of name slots has been superseded
+COMPACT_THRESHOLD = 0.25
+
+# Most candidate entities passed to a search filter at once
+MAX_ACCEPT_BATCH = 1000
+
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_name(text: str) -> str:
+    """
+    Normalize a name for matching: strip diacritics, case fold and
+    collapse punctuation and whitespace into single spaces.
+
+    Args:
+        text: Raw name
+
+    Returns:
+        Normalized name
+    """
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return NON_ALNUM.sub(' ', stripped.casefold()).strip()
+
+
+def ngrams(normalized: str, size: int = NGRAM_SIZE) -> List[str]:
+    """
+    Split a normalized name into padded character n-grams.
+
+    Args:
+        normalized: Output of normalize_name
+        size: N-gram length
+
+    Returns:
+        List of distinct n-grams
+    """
+    padded = f' {normalized} '
+    if len(padded) <= size:
+        return [padded]
+    return list({padded[i:i + size] for i in range(len(padded) - size + 1)})
+
+
+def jaro_winkler(s1: str, s2: str, prefix_weight: float = 0.1) -> float:
+    """
+    Jaro-Winkler similarity between two strings.
+
+    Returns:
+        Similarity in the range [0, 1]
+    """
+    if s1 == s2:
+        return 1.0
+    len1, len2 = len(s1), len(s2)
+    if not len1 or not len2:
+        return 0.0
+
+    window = max(max(len1, len2) // 2 - 1, 0)
+    matched1 = [False] * len1
+    matched2 = [False] * len2
+    matches = 0
+
+    for i, ch in enumerate(s1):
+        start = max(0, i - window)
+        end = min(i + window + 1, len2)
+        for j in range(start, end):
+            if not matched2[j] and s2[j] == ch:
+                matched1[i] = matched2[j] = True
+                matches += 1
+                break
+
+    if not matches:
+        return 0.0
+
+    transpositions = 0
+    j = 0
+    for i in range(len1):
+        if matched1[i]:
+            while not matched2[j]:
+                j += 1
+            if s1[i] != s2[j]:
+                transpositions += 1
+            j += 1
+
+    jaro = (matches / len1 + matches / len2 + (matches - transpositions / 2) / matches) / 3
+
+    prefix = 0
+    for a, b in zip(s1[:4], s2[:4]):
+        if a != b:
+            break
+        prefix += 1
+
+    return jaro + prefix * prefix_weight * (1 - jaro)
+
+
+def token_set_similarity(tokens1: Iterable[str], tokens2: Iterable[str]) -> float:
+    """
+    Token-set similarity: compares the shared tokens against each side's
+    remainder, so word order and extra words (e.g. "LLC") matter less.
+
+    Returns:
+        Similarity in the range [0, 1]
+    """
+    set1, set2 = set(tokens1), set(tokens2)
+    common = set1 & set2
+    if not common:
+        return 0.0
+
+    base = ' '.join(sorted(common))
+    left = ' '.join([base] + sorted(set1 - common)).strip()
+    right = ' '.join([base] + sorted(set2 - common)).strip()
+
+    return max(jaro_winkler(base, left), jaro_winkler(base, right), jaro_winkler(left, right))
+
+
+def score_names(query: str, query_tokens: List[str], name: str, name_tokens: List[str]) -> float:
+    """
+    Score a normalized candidate name against a normalized query.
+
+    Returns:
+        Similarity in the range [0, 1]
+    """
+    return max(
+        jaro_winkler(query, name),
+        jaro_winkler(' '.join(sorted(query_tokens)), ' '.join(sorted(name_tokens))),
+        token_set_similarity(query_tokens, name_tokens),
+    )
+
+
+def name_variants(name: str, alt_names: Any) -> Set[str]:
+    """
+    Distinct normalized names an entity is indexed under.
+
+    Args:
+        name: Entity name
+        alt_names: List of alternative names (or a single name)
+
+    Returns:
+        Set of non-empty normalized names
+    """
+    names = [name]
+    if isinstance(alt_names, (list, tuple)):
+        names.extend(alt_names)
+    elif alt_names:
+        names.append(alt_names)
+    return {normalized for normalized in (normalize_name(n) for n in names if isinstance(n, str)) if normalized}
+
+
+class NameIndex:
+    """
+    Name slots and their n-gram postings held in Python lists and dicts.
+    Removing an entity only marks its slots dead.
+    """
+
+    def __init__(self):
+        self.names = []  # Normalized name per slot
+        self.gram_counts = []  # Number of n-grams per slot
+        self.owners = []  # Entity id per slot (None once superseded)
+        self.slots_by_entity = defaultdict(list)
+        self.postings = defaultdict(list)
+        self.dead_slots = 0
+
+    @property
+    def slots(self) -> int:
+        return len(self.names)
+
+    @property
+    def entities(self) -> int:
+        return len(self.slots_by_entity)
+
+    def add(self, entity_id: int, name: str, alt_names: Any) -> None:
+        for normalized in name_variants(name, alt_names):
+            slot = len(self.names)
+            grams = ngrams(normalized)
+            self.names.append(normalized)
+            self.gram_counts.append(len(grams))
+            self.owners.append(entity_id)
+            self.slots_by_entity[entity_id].append(slot)
+            for gram in grams:
+                self.postings[gram].append(slot)
+
+    def remove(self, entity_id: int) -> None:
+        for slot in self.slots_by_entity.pop(entity_id, []):
+            self.owners[slot] = None
+            self.dead_slots += 1
+
+    def shared_grams(self, grams: Iterable[str]) -> Counter:
+        """Number of the given n-grams each name slot has"""
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        return shared
+
+    def name(self, slot: int) -> str:
+        return self.names[slot]
+
+    def owner(self, slot: int) -> Optional[int]:
+        return self.owners[slot]
+
+    def gram_count(self, slot: int) -> int:
+        return self.gram_counts[slot]
+
+
+class NameMatcher:
+    """
+    In-memory fuzzy matching engine over ScreeningEntity names and alt names.
+
+    Names are normalized and indexed by character n-grams. A query first
+    collects candidates sharing enough n-grams, then scores them with
+    Jaro-Winkler and token-set similarity.
+
+    With a snapshot configured (CSL_MATCH_SNAPSHOT), the index is a
+    read-only snapshot file mapped into memory and shared by every worker,
+    instead of a copy built from the database in each one. Entities this
+    process ingests after the snapshot was built are matched from a small
+    in-memory overlay, and a new snapshot file is picked up on the next
+    check after it's published.
+
+    Without a snapshot, the index is rebuilt from the database when a check
+    finds that another process changed entities: the global SourceVersion
+    stamp moved by more than the bumps of this process's own writes, which
+    it has already applied.
+    """
+
+    def __init__(self, snapshot_path: Optional[str] = None, check_interval: float = 5.0):
+        self.snapshot_path = snapshot_path
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self.loaded = False
+        self._base = NameIndex()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._overlay = NameIndex()
+        self._masked = set()  # Entities in the snapshot superseded by the overlay
+        self._pending = {}  # Entity id -> (time, name or None if removed, alt_names), kept for the next snapshot
+        self._stamp = 0  # Global SourceVersion stamp the database-built index reflects
+        self._own_stamps = set()  # Later stamps drawn by this process's own (already applied) writes
+
+    def load(self) -> None:
+        """Map the snapshot, or build the index from all active entities in the database"""
+        with self._lock:
+            if self.snapshot_path and self._swap_snapshot():
+                return
+
+            self._checked_at = time.monotonic()
+            stamp = current_stamp()
+            index = NameIndex()
+            rows = ScreeningEntity.objects.filter(is_active=True).values_list(
+                'id', 'name', 'alt_names'
+            )
+            for entity_id, name, alt_names in rows.iterator(chunk_size=2000):
+                index.add(entity_id, name, alt_names)
+            self._close_snapshot()
+            self._base = index
+            self._overlay = NameIndex()
+            self._masked = set()
+            self._stamp = stamp
+            self._own_stamps = set()
+            self.loaded = True
+
+        logger.info(f"Name matcher loaded {index.slots} names")
+
+    def _swap_snapshot(self) -> bool:
+        """Map the snapshot file if it's new; True if a snapshot is in use"""
+        from core.services.snapshot import MatchSnapshot, SnapshotError
+
+        self._checked_at = time.monotonic()
+        try:
+            stat = os.stat(self.snapshot_path)
+        except OSError:
+            if self._snapshot is None:
+                logger.warning(f"Match snapshot {self.snapshot_path} not found; building the index from the database")
+            return self._snapshot is not None
+        if self._snapshot is not None and self._snapshot.identity == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            return True
+
+        try:
+            snapshot = MatchSnapshot(self.snapshot_path)
+        except (OSError, ValueError, SnapshotError) as e:
+            logger.error(f"Can't map match snapshot {self.snapshot_path}: {e}")
+            return self._snapshot is not None
+
+        # Keep the changes this process made that the new snapshot may not include
+        pending = {
+            entity_id: change for entity_id, change in self._pending.items()
+            if change[0] >= snapshot.meta['started_at']
+        }
+        self._close_snapshot()
+        self._snapshot = self._base = snapshot
+        self._overlay = NameIndex()
+        self._masked = set()
+        self._pending = {}
+        for entity_id, change in pending.items():
+            self._change(entity_id, *change)
+        self.loaded = True
+
+        logger.info(f"Name matcher mapped snapshot v{snapshot.version} ({snapshot.slots} names)")
+        return True
+
+    def _close_snapshot(self) -> None:
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    def ensure_loaded(self) -> None:
+        """Load the index on first use, and pick up a newly published snapshot or other processes' changes"""
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.load()
+        elif time.monotonic() - self._checked_at >= self.check_interval:
+            with self._lock:
+                if self.snapshot_path and self._swap_snapshot():
+                    return
+                self._checked_at = time.monotonic()
+                stamp = current_stamp()
+                own = {version for version in self._own_stamps if version <= stamp}
+                if stamp - self._stamp > len(own):
+                    logger.info(f"Entities changed elsewhere (v{self._stamp} -> v{stamp}); reloading the name matcher")
+                    self.load()
+                else:
+                    self._stamp = stamp
+                    self._own_stamps -= own
+
+    def note_stamp(self, version: int) -> None:
+        """
+        Record a version stamp drawn by a write of this process, once
+        committed, so that the change isn't mistaken for another process's.
+
+        Args:
+            version: Global stamp returned by ScreeningCache.bump
+        """
+        with self._lock:
+            if self.loaded and version > self._stamp:
+                self._own_stamps.add(version)
+
+    def _change(self, entity_id: int, changed_at: float, name: Optional[str], alt_names: Any) -> None:
+        if self.snapshot_path:
+            self._pending[entity_id] = (changed_at, name, alt_names)
+        if self._snapshot is None:
+            self._base.remove(entity_id)
+            if name is not None:
+                self._base.add(entity_id, name, alt_names)
+        else:
+            # The snapshot is read-only: hide the entity there and index it in the overlay
+            self._masked.add(entity_id)
+            self._overlay.remove(entity_id)
+            if name is not None:
+                self._overlay.add(entity_id, name, alt_names)
+
+    def update_entities(self, entities: Iterable[ScreeningEntity]) -> None:
+        """
+        Re-index stored entities after an ingest. A no-op until the index is loaded.
+
+        Args:
+            entities: Created or updated ScreeningEntity instances
+        """
+        if not self.loaded:
+            return
+
+        with self._lock:
+            now = time.time()
+            for entity in entities:
+                self._change(entity.pk, now, entity.name if entity.is_active else None, entity.alt_names)
+
+            if (self._snapshot is None and self._base.slots
+                    and self._base.dead_slots / self._base.slots > COMPACT_THRESHOLD):
+                self.load()
+
+    def remove_entities(self, entity_ids: Iterable[int]) -> None:
+        """
+        Drop entities from the index (e.g. after a soft delete).
+
+        Args:
+            entity_ids: Primary keys of the removed entities
+        """
+        if not self.loaded:
+            return
+
+        with self._lock:
+            now = time.time()
+            for entity_id in entity_ids:
+                self._change(entity_id, now, None, None)
+
+    @metrics.timed('match')
+    def search(self, query: str, limit: Optional[int] = None, min_score: Optional[int] = None,
+               accept: Optional[Callable[[List[int]], Set[int]]] = None) -> Dict[int, int]:
+        """
+        Find entities whose name or alt names match the query.
+
+        Args:
+            query: Name to screen
+            limit: Maximum number of entities to return
+            min_score: Minimum score (0-100) for a match
+            accept: Filter on candidate entities, applied before the cut to
+                `limit`: called with a list of entity ids, returns the set of
+                those that may match (e.g. the ids in a filtered queryset)
+
+        Returns:
+            Ordered dict of entity id to score (0-100), best match first
+        """
+        limit = limit or settings.CSL_MATCH_LIMIT
+        min_score = settings.CSL_MATCH_MIN_SCORE if min_score is None else min_score
+
+        normalized = normalize_name(query)
+        if not normalized:
+            return {}
+        query_tokens = normalized.split()
+        query_grams = ngrams(normalized)
+
+        self.ensure_loaded()
+
+        while True:
+            with self._lock:
+                indexes = [self._base, self._overlay]
+                candidates = self._candidates(indexes, query_grams)
+                if accept is None:
+                    best = self._score(indexes, heapq.nlargest(limit * 4, candidates), normalized, query_tokens, min_score)
+                    break
+
+            # The filter may query the database, so it runs outside the lock
+            top = self._accepted(candidates, accept, limit * 4)
+
+            with self._lock:
+                if indexes[0] is self._base and indexes[1] is self._overlay:
+                    best = self._score(indexes, top, normalized, query_tokens, min_score)
+                    break
+            # The index was reloaded while the filter ran; collect the candidates again
+
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return dict(ranked)
+
+    def _candidates(self, indexes: List[Any], query_grams: List[str]) -> List[Tuple[float, int, int, int]]:
+        """Live name slots sharing enough n-grams with the query, as (dice, index position, slot, entity id)"""
+        # Dice coefficient over n-grams as a cheap pre-filter. A name has at
+        # least one n-gram, so slots sharing fewer than this can't pass it.
+        min_shared = MIN_NGRAM_OVERLAP * (len(query_grams) + 1) / 2
+        candidates = []
+        for position, index in enumerate(indexes):
+            masked = self._masked if index is self._snapshot else ()
+            for slot, count in index.shared_grams(query_grams).items():
+                if count < min_shared:
+                    continue
+                owner = index.owner(slot)
+                if owner is None or owner in masked:
+                    continue
+                dice = 2 * count / (len(query_grams) + index.gram_count(slot))
+                if dice >= MIN_NGRAM_OVERLAP:
+                    candidates.append((dice, position, slot, owner))
+        return candidates
+
+    @staticmethod
+    def _accepted(candidates: List[Tuple[float, int, int, int]], accept: Callable[[List[int]], Set[int]],
+                  wanted: int) -> List[Tuple[float, int, int, int]]:
+        """Best candidates (up to `wanted`) whose entity passes the filter, checked in growing batches"""
+        candidates.sort(reverse=True)
+        kept, allowed, checked = [], set(), set()
+        start, batch = 0, max(wanted, MAX_ACCEPT_BATCH // 4)
+        while start < len(candidates) and len(kept) < wanted:
+            chunk = candidates[start:start + batch]
+            unchecked = list({owner for *_, owner in chunk} - checked)
+            if unchecked:
+                allowed |= accept(unchecked)
+                checked.update(unchecked)
+            kept.extend(candidate for candidate in chunk if candidate[3] in allowed)
+            start += batch
+            batch = min(batch * 2, MAX_ACCEPT_BATCH)
+        return kept[:wanted]
+
+    def _score(self, indexes: List[Any], top: List[Tuple[float, int, int, int]], normalized: str,
+               query_tokens: List[str], min_score: int) -> Dict[int, int]:
+        """Best score per entity over the given candidates whose slot is still live"""
+        best = {}
+        for _, position, slot, entity_id in top:
+            index = indexes[position]
+            if index.owner(slot) != entity_id or (index is self._snapshot and entity_id in self._masked):
+                continue
+            name = index.name(slot)
+            score = round(100 * score_names(normalized, query_tokens, name, name.split()))
+            if score >= min_score and score > best.get(entity_id, -1):
+                best[entity_id] = score
+        return best
+
+    def describe(self, entity_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Screening details of matched entities, answered from the snapshot.
+
+        Args:
+            entity_ids: Primary keys of matched entities
+
+        Returns:
+            Entity id to summary dictionary for the entities the snapshot
+            holds current details of (none without a snapshot)
+        """
+        with self._lock:
+            if self._snapshot is None:
+                return {}
+            described = {}
+            for entity_id in entity_ids:
+                if entity_id not in self._masked:
+                    details = self._snapshot.describe(entity_id)
+                    if details is not None:
+                        described[entity_id] = details
+            return described
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get index size information.
+
+        Returns:
+            Dictionary with entity, name and n-gram counts, and the snapshot in use
+        """
+        with self._lock:
+            if self._snapshot is not None:
+                return {
+                    'loaded': self.loaded,
+                    'snapshot': {'path': self.snapshot_path, **self._snapshot.meta},
+                    'entities': self._snapshot.entities,
+                    'names': self._snapshot.slots,
+                    'overlay_entities': self._overlay.entities,
+                    'masked_entities': len(self._masked),
+                }
+            return {
+                'loaded': self.loaded,
+                'snapshot': None,
+                'entities': self._base.entities,
+                'names': self._base.slots - self._base.dead_slots,
+                'ngrams': len(self._base.postings),
+            }
+
+
+def rank_by_score(queryset, matches: Dict[int, int]) -> List[ScreeningEntity]:
+    """
+    Evaluate a queryset of matched entities, fill in their match scores
+    and order them best match first.
+
+    Args:
+        queryset: ScreeningEntity queryset restricted to the matched ids
+        matches: Entity id to score, as returned by NameMatcher.search
+
+    Returns:
+        List of distinct entities ordered by descending score
+    """
+    entities = {entity.pk: entity for entity in queryset}
+    for entity in entities.values():
+        entity.score = matches[entity.pk]
+    return sorted(entities.values(), key=lambda entity: (-entity.score, entity.name))
+
+
+def current_stamp() -> int:
+    """Current global SourceVersion stamp (0 before any change)"""
+    return SourceVersion.objects.filter(source_list=SourceVersion.GLOBAL).values_list(
+        'version', flat=True
+    ).first() or 0
+
+
+def accept_queryset(queryset) -> Callable[[List[int]], Set[int]]:
+    """
+    Search filter accepting only the entities in a queryset, so that filters
+    apply to the candidates before a fuzzy search is cut to its limit.
+
+    Args:
+        queryset: Filtered ScreeningEntity queryset
+
+    Returns:
+        Callable for the `accept` argument of NameMatcher.search
+    """
+    def accept(entity_ids: List[int]) -> Set[int]:
+        return set(queryset.filter(pk__in=entity_ids).order_by().values_list('pk', flat=True))
+    return accept
+
+
+# Singleton instance for reuse
+name_matcher = NameMatcher(
+    snapshot_path=settings.CSL_MATCH_SNAPSHOT or None,
+    check_interval=settings.CSL_MATCH_SNAPSHOT_CHECK_INTERVAL,
+)
+
+
+@receiver(post_save, sender=ScreeningEntity)
+def index_saved_entity(sender, instance, **kwargs):
+    """Single-row saves (API, admin) bypass the ingest path's re-index"""
+    transaction.on_commit(lambda: name_matcher.update_entities([instance]))
+
+
+@receiver(post_delete, sender=ScreeningEntity)
+def unindex_deleted_entity(sender, instance, **kwargs):
+    """Single-row deletes (API, admin) bypass the mirror's index removal"""
+    entity_id = instance.pk  # Cleared once the delete completes
+    transaction.on_commit(lambda: name_matcher.remove_entities([entity_id]))
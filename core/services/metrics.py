@@ -0,0 +1,262 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Any, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Upper bounds of the latency histogram buckets, in seconds
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the per-request query count histogram buckets
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'csl_stage_seconds': (
+        'histogram', 'Time spent per processing stage', SECONDS_BUCKETS
+    ),
+    'csl_http_requests_total': (
+        'counter', 'HTTP requests handled, by view, method and status code', None
+    ),
+    'csl_http_request_seconds': (
+        'histogram', 'HTTP request latency by view', SECONDS_BUCKETS
+    ),
+    'csl_db_queries_per_request': (
+        'histogram', 'Database queries run while handling a request, by view', QUERY_BUCKETS
+    ),
+}
+
+# Query counter of the request being handled; sync_to_async threads share it
+_request_queries: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    'csl_request_queries', default=None
+)
+
+_NOOP = contextlib.nullcontext()
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def escape(value: Any) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Labels, extra: str = '') -> str:
+    parts = [f'{key}="{escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """
+    In-process counters and histograms exported in the Prometheus text format.
+
+    Disabled, timers are a shared no-op context manager and the decorators
+    return the function untouched, so instrumented code pays next to nothing.
+    Values are per process: scrape each worker, or run one.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], List[Any]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Add to a counter"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Record a histogram observation"""
+        if not self.enabled:
+            return
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def timer(self, stage: str):
+        """Context manager timing a block as a processing stage"""
+        if not self.enabled:
+            return _NOOP
+        return self._time(stage)
+
+    @contextlib.contextmanager
+    def _time(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('csl_stage_seconds', time.perf_counter() - started, stage=stage)
+
+    def timed(self, stage: str) -> Callable[[Callable], Callable]:
+        """Decorator timing every call of a function as a processing stage"""
+        def decorator(fn: Callable) -> Callable:
+            if not self.enabled:
+                return fn
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self._time(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self) -> None:
+        """Forget every recorded value"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self, samples: Optional[List[Tuple[str, str, str, Labels, float]]] = None) -> str:
+        """
+        Render the recorded metrics in the Prometheus text exposition format.
+
+        Args:
+            samples: Extra (name, type, help, labels, value) samples read at
+                scrape time, e.g. from service counters
+
+        Returns:
+            Exposition text
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: [list(h[0]), h[1], h[2]] for key, h in self._histograms.items()}
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            if kind == 'counter':
+                series = sorted((labels, value) for (metric, labels), value in counters.items() if metric == name)
+            else:
+                series = sorted((labels, value) for (metric, labels), value in histograms.items() if metric == name)
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in series:
+                if kind == 'counter':
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip((*buckets, float('inf')), counts):
+                    cumulative += bucket_count
+                    le = 'le="' + format_value(bound) + '"'
+                    lines.append(f'{name}_bucket{format_labels(labels, le)} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+        described = set()
+        for name, kind, help_text, labels, value in samples or []:
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics(enabled=settings.CSL_METRICS_ENABLED)
+
+
+def service_samples() -> List[Tuple[str, str, str, Labels, float]]:
+    """
+    Read the counters the services already keep (response and screening
+    caches, single-flight, upstream governor, match index) as samples.
+
+    Returns:
+        (name, type, help, labels, value) tuples, grouped by name
+    """
+    from core.services.csl_service import csl_service
+    from core.services.matching import name_matcher
+    from core.services.screening_cache import screening_cache
+
+    samples = []
+
+    def add(name, kind, help_text, value, **labels):
+        if value is not None:
+            samples.append((name, kind, help_text, tuple(sorted(labels.items())), value))
+
+    caches = {'response': csl_service.cache.stats(), 'screening': screening_cache.stats()}
+    for cache, stats in caches.items():
+        add('csl_cache_lookups_total', 'counter', 'Cache lookups by result', stats['hits'], cache=cache, result='hit')
+        add('csl_cache_lookups_total', 'counter', 'Cache lookups by result', stats['misses'], cache=cache, result='miss')
+    for cache, stats in caches.items():
+        add('csl_cache_hit_ratio', 'gauge', 'Share of cache lookups that hit', stats['hit_rate'], cache=cache)
+
+    flights = csl_service.flights.stats()
+    add('csl_single_flight_calls_total', 'counter', 'Upstream searches run, and joined while in flight',
+        flights['executed'], result='executed')
+    add('csl_single_flight_calls_total', 'counter', 'Upstream searches run, and joined while in flight',
+        flights['shared'], result='shared')
+
+    governor = csl_service.governor.stats()
+    add('csl_upstream_tokens_available', 'gauge', 'CSL API rate limit tokens available', governor['tokens_available'])
+    add('csl_upstream_in_flight', 'gauge', 'CSL API calls in flight', governor['in_flight'])
+    add('csl_upstream_throttled_total', 'counter', 'CSL API 429 responses', governor['throttled'])
+    for priority, stats in governor['priorities'].items():
+        add('csl_upstream_waiting', 'gauge', 'CSL API calls waiting for a slot', stats['waiting'], priority=priority)
+    for priority, stats in governor['priorities'].items():
+        add('csl_upstream_queue_timeouts_total', 'counter', 'CSL API calls that timed out waiting for a slot',
+            stats['timeouts'], priority=priority)
+    for priority, stats in governor['priorities'].items():
+        add('csl_upstream_queue_wait_seconds_total', 'counter', 'Time CSL API calls waited for a slot',
+            stats['wait_seconds_total'], priority=priority)
+
+    matcher = name_matcher.stats()
+    add('csl_match_index_names', 'gauge', 'Names in the fuzzy match index', matcher['names'] if matcher['loaded'] else None)
+
+    return samples
+
+
+@contextlib.contextmanager
+def count_queries() -> Iterator[List[int]]:
+    """Count the database queries run inside the block, including in sync_to_async threads"""
+    counter = [0]
+    token = _request_queries.set(counter)
+    try:
+        yield counter
+    finally:
+        _request_queries.reset(token)
+
+
+def observe_query(execute, sql, params, many, context):
+    """Database execute wrapper timing every query and counting it for the current request"""
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.observe('csl_stage_seconds', time.perf_counter() - started, stage='db_query')
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """Time the queries of every new database connection while metrics are enabled"""
+    if metrics.enabled and observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
@@ -0,0 +1,336 @@
+import json
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Any, Iterator, Optional, TextIO
+
+from django.conf import settings
+from django.db import transaction
+from api.models import ScreeningEntity
+from core.services.csl_service import CSLAPIError
+from core.services.matching import name_matcher
+from core.services.screening_cache import screening_cache
+from core.services.snapshot import publish_snapshot
+from core.services.stats import dataset_stats
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Characters read from a dump file per chunk while streaming
+READ_CHUNK_SIZE = 64 * 1024
+
+# Rows per soft-delete UPDATE
+REMOVE_BATCH_SIZE = 500
+
+
+class MirrorSyncError(Exception):
+    """Raised when a mirror sync can't complete (e.g. an upstream page failed)."""
+
+
+def iter_json_array(fp: TextIO, key: Optional[str] = 'results') -> Iterator[Dict[str, Any]]:
+    """
+    Stream the items of a JSON array without loading the whole document.
+
+    Accepts either a top-level array or an object holding the array under ``key``
+    (the layout of the downloadable CSL JSON file).
+
+    Args:
+        fp: Text file object positioned at the start of the document
+        key: Name of the array member when the document is an object
+
+    Yields:
+        Decoded array items, one at a time
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = fp.read(READ_CHUNK_SIZE)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_whitespace() -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return
+
+    def decode_value() -> Any:
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if not fill():
+                    raise
+                continue
+            # A scalar at the very end of the buffer may have been cut short
+            if end == len(buffer) and not isinstance(value, (dict, list)) and fill():
+                continue
+            pos = end
+            return value
+
+    # Walk the top-level object's members until the array is reached;
+    # other members (sources_used, total, ...) are small and simply skipped
+    skip_whitespace()
+    if buffer[pos:pos + 1] == '{':
+        pos += 1
+        while True:
+            skip_whitespace()
+            if buffer[pos:pos + 1] == ',':
+                pos += 1
+                skip_whitespace()
+            if buffer[pos:pos + 1] in ('}', ''):
+                raise ValueError(f"No '{key}' array found in JSON document")
+            member = decode_value()
+            skip_whitespace()
+            if buffer[pos:pos + 1] != ':':
+                raise ValueError("Malformed JSON object")
+            pos += 1
+            skip_whitespace()
+            if member == key:
+                break
+            decode_value()
+
+    if buffer[pos:pos + 1] != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+
+    while True:
+        skip_whitespace()
+        if buffer[pos:pos + 1] == ',':
+            pos += 1
+            skip_whitespace()
+        if buffer[pos:pos + 1] == ']':
+            return
+        if eof and pos >= len(buffer):
+            raise ValueError("Unexpected end of JSON array")
+
+        yield decode_value()
+
+
+class MirrorSync:
+    """
+    Keeps the local database a mirror of the full Consolidated Screening List.
+
+    Records are ingested page by page. Each page is compared against stored
+    content hashes so only new or changed entities are written, and entities
+    not seen during a complete run are soft-deleted.
+
+    A bad page or truncated dump must not empty the screening list, so
+    removal is refused (with MirrorSyncError) when a full run saw no records,
+    when the API listing came back shorter than its total, or when it would
+    deactivate more than `max_remove_fraction` of the active entities. A run
+    restricted to some lists may legitimately find one empty; it clears that
+    list within the same limit.
+    """
+
+    def __init__(self, service, page_size: int = 100, publish: bool = True,
+                 max_remove_fraction: Optional[float] = None):
+        self.service = service
+        self.page_size = min(page_size, 100)  # Cap at 100 as per API limits
+        self.publish = publish  # Rebuild the match snapshot after a complete run
+        self.max_remove_fraction = (
+            settings.CSL_MIRROR_MAX_REMOVE_FRACTION if max_remove_fraction is None else max_remove_fraction
+        )
+        self.seen_source_ids = set()
+        self.stats = {
+            'pages_fetched': 0,
+            'records_seen': 0,
+            'inserted': 0,
+            'updated': 0,
+            'unchanged': 0,
+            'removed': 0,
+            'elapsed_seconds': 0.0,
+        }
+
+    def ingest_page(self, results: List[Dict[str, Any]]) -> None:
+        """
+        Write the new and changed entities from one page of records.
+
+        Args:
+            results: List of entity dictionaries in CSL API format
+        """
+        records = {}
+        for entity_data in results:
+            record = self.service.parse_entity(entity_data)
+            records[record['source_id']] = (entity_data, record['fields']['content_hash'])
+
+        self.stats['records_seen'] += len(results)
+        self.seen_source_ids.update(records)
+
+        stored = {
+            source_id: (content_hash, is_active)
+            for source_id, content_hash, is_active in ScreeningEntity.objects.filter(
+                source_id__in=list(records)
+            ).values_list('source_id', 'content_hash', 'is_active')
+        }
+
+        changed = []
+        for source_id, (entity_data, content_hash) in records.items():
+            if source_id not in stored:
+                self.stats['inserted'] += 1
+            elif stored[source_id] != (content_hash, True):
+                self.stats['updated'] += 1
+            else:
+                self.stats['unchanged'] += 1
+                continue
+            changed.append(entity_data)
+
+        if changed:
+            self.service.store_entities(changed)
+
+    def remove_missing(self, source_lists: Optional[List[str]] = None) -> None:
+        """
+        Soft-delete active entities that were not seen during this run.
+
+        Args:
+            source_lists: Restrict removal to these source lists (for partial syncs);
+                an empty list removes nothing
+
+        Raises:
+            MirrorSyncError: If a full run saw no records, or removal would
+                exceed max_remove_fraction of the active entities
+        """
+        if source_lists is None and not self.stats['records_seen']:
+            raise MirrorSyncError("The listing had no records; nothing was removed")
+
+        queryset = ScreeningEntity.objects.filter(is_active=True)
+        if source_lists is not None:
+            queryset = queryset.filter(source_list__in=source_lists)
+
+        missing = []
+        missing_lists = set()
+        for pk, source_id, source_list in queryset.values_list('pk', 'source_id', 'source_list').iterator():
+            if source_id not in self.seen_source_ids:
+                missing.append(pk)
+                missing_lists.add(source_list)
+
+        if missing:
+            active = ScreeningEntity.objects.filter(is_active=True).count()
+            if len(missing) > active * self.max_remove_fraction:
+                raise MirrorSyncError(
+                    f"Refusing to remove {len(missing)} of {active} active entities "
+                    f"(limit {self.max_remove_fraction:.0%}); nothing was removed"
+                )
+
+        with transaction.atomic():
+            removed = 0
+            for i in range(0, len(missing), REMOVE_BATCH_SIZE):
+                removed += ScreeningEntity.objects.filter(
+                    pk__in=missing[i:i + REMOVE_BATCH_SIZE], is_active=True
+                ).update(is_active=False)
+            dataset_stats.apply(Counter({('active_entities', ''): -removed}))
+            if removed:
+                screening_cache.bump(missing_lists)
+            transaction.on_commit(lambda: name_matcher.remove_entities(missing))
+
+        self.stats['removed'] = removed
+
+    def sync_from_api(self, sources: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Page through the CSL API search endpoint and mirror every entity.
+        Pages are fetched concurrently and ingested in order as they arrive.
+
+        Args:
+            sources: Optional list of source list codes to restrict the sync to
+
+        Returns:
+            Per-run statistics
+        """
+        started = time.monotonic()
+
+        total = 0
+        try:
+            for page in self.service.iter_pages(
+                page_size=self.page_size,
+                sources=','.join(sources) if sources else None,
+            ):
+                self.stats['pages_fetched'] += 1
+                total = max(total, page.get('total', 0))
+                self.ingest_page(page.get('results', []))
+                logger.info(f"Mirror sync: {self.stats['records_seen']} of {total} records")
+        except CSLAPIError as e:
+            raise MirrorSyncError(str(e)) from e
+
+        if self.stats['records_seen'] < total:
+            raise MirrorSyncError(
+                f"Listing incomplete: {self.stats['records_seen']} of {total} records; nothing was removed"
+            )
+
+        # Only remove against a complete listing; partial syncs never reach here
+        self.remove_missing(source_lists=self.source_list_names(sources) if sources else None)
+        screening_cache.prune()
+        if self.publish:
+            publish_snapshot()
+        self.stats['elapsed_seconds'] = time.monotonic() - started
+
+        return self.stats
+
+    def sync_from_dump(self, fp: TextIO) -> Dict[str, Any]:
+        """
+        Mirror every entity from a downloaded CSL JSON file.
+
+        Args:
+            fp: Open text file containing the CSL JSON dump
+
+        Returns:
+            Per-run statistics
+        """
+        started = time.monotonic()
+        page = []
+
+        for entity_data in iter_json_array(fp):
+            page.append(entity_data)
+            if len(page) >= self.page_size:
+                self.stats['pages_fetched'] += 1
+                self.ingest_page(page)
+                page = []
+
+        if page:
+            self.stats['pages_fetched'] += 1
+            self.ingest_page(page)
+
+        self.remove_missing()
+        screening_cache.prune()
+        if self.publish:
+            publish_snapshot()
+        self.stats['elapsed_seconds'] = time.monotonic() - started
+
+        return self.stats
+
+    def source_list_names(self, codes: Optional[List[str]] = None) -> List[str]:
+        """
+        Get the stored source_list values covered by this run: those of the
+        entities seen, and those of the active entities on the requested lists
+        (so a list that came back empty is still cleared).
+
+        Args:
+            codes: Source list codes the run was restricted to
+
+        Returns:
+            Distinct source_list values
+        """
+        from core.services.source_lists import list_key
+
+        seen = list(self.seen_source_ids)
+        names = set()
+        for i in range(0, len(seen), REMOVE_BATCH_SIZE):
+            names.update(
+                ScreeningEntity.objects.filter(
+                    source_id__in=seen[i:i + REMOVE_BATCH_SIZE]
+                ).values_list('source_list', flat=True).distinct()
+            )
+        if codes:
+            stored = ScreeningEntity.objects.filter(is_active=True).values_list('source_list', flat=True).distinct()
+            names.update(name for name in stored if list_key(name) in codes)
+        return sorted(names)
@@ -0,0 +1,363 @@
+import contextlib
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter that spaces calls evenly at a fixed rate.
+    """
+
+    def __init__(self, rate: float):
+        """
+        Args:
+            rate: Maximum calls per second (0 or less disables limiting)
+        """
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Block until the caller may proceed.
+
+        Returns:
+            Seconds spent waiting
+        """
+        if not self.interval:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+# Priority classes for CSL API calls, highest first
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+PRIORITIES = (INTERACTIVE, BULK)
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a call waits longer than its timeout for permission to proceed."""
+
+
+class LocalTokenStore:
+    """
+    Token bucket state held in this process, shared by its threads.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, floor: float = 0.0) -> float:
+        """
+        Take a token if one is available above floor.
+
+        Args:
+            floor: Tokens that must remain in the bucket afterwards
+
+        Returns:
+            0 if a token was taken, otherwise seconds until one will be
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens - 1 >= floor:
+                self._tokens -= 1
+                return 0.0
+            return (floor + 1 - self._tokens) / self.rate
+
+    def available(self) -> float:
+        """Tokens currently in the bucket"""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def pause(self, seconds: float) -> None:
+        """Empty the bucket so no token is available for `seconds`"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class DatabaseTokenStore:
+    """
+    Token bucket state kept in a RateLimitBucket row, so every process
+    (web workers, job workers, sync commands) draws from one quota.
+    Each take is one short row-locked transaction.
+    """
+
+    def __init__(self, rate: float, capacity: float, name: str = 'csl-api'):
+        self.rate = rate
+        self.capacity = capacity
+        self.name = name
+
+    def _bucket(self):
+        """The bucket row, locked for the current transaction and refilled to now"""
+        from api.models import RateLimitBucket
+
+        bucket, _ = RateLimitBucket.objects.get_or_create(
+            name=self.name, defaults={'tokens': self.capacity, 'updated_at': time.time()}
+        )
+        bucket = RateLimitBucket.objects.select_for_update().get(pk=bucket.pk)
+        now = time.time()
+        bucket.tokens = min(self.capacity, bucket.tokens + max(0.0, now - bucket.updated_at) * self.rate)
+        bucket.updated_at = now
+        return bucket
+
+    def take(self, floor: float = 0.0) -> float:
+        """See LocalTokenStore.take"""
+        from django.db import transaction
+
+        with transaction.atomic():
+            bucket = self._bucket()
+            if bucket.tokens - 1 >= floor:
+                bucket.tokens -= 1
+                wait = 0.0
+            else:
+                wait = (floor + 1 - bucket.tokens) / self.rate
+            bucket.save(update_fields=['tokens', 'updated_at'])
+        return wait
+
+    def available(self) -> float:
+        """Tokens currently in the bucket (read-only: a missing row counts as full)"""
+        from api.models import RateLimitBucket
+
+        bucket = RateLimitBucket.objects.filter(name=self.name).values('tokens', 'updated_at').first()
+        if bucket is None:
+            return self.capacity
+        return min(self.capacity, bucket['tokens'] + max(0.0, time.time() - bucket['updated_at']) * self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Empty the bucket so no token is available for `seconds`"""
+        from django.db import transaction
+
+        with transaction.atomic():
+            bucket = self._bucket()
+            bucket.tokens = min(bucket.tokens, 0) - seconds * self.rate
+            bucket.save(update_fields=['tokens', 'updated_at'])
+
+
+class UpstreamGovernor:
+    """
+    Admission control for CSL API calls: a token bucket for the request
+    rate plus a cap on calls in flight, with priority classes.
+
+    A caller proceeds only when no higher-priority caller in this process is
+    waiting, so interactive searches jump ahead of queued bulk sync pages.
+    The concurrency cap sizes the sync client's threads to its connection
+    pool; callers with their own connection limit (the async client) pass
+    `limited=False` and only share the token bucket and the priorities.
+    Bulk calls also leave `bulk_reserve` of the burst capacity untouched,
+    which keeps headroom for interactive calls from other processes when
+    the bucket is shared through the database.
+    """
+
+    def __init__(self, rate: float, burst: float, max_concurrency: int = 0,
+                 bulk_reserve: float = 0.0, store: Optional[Any] = None):
+        """
+        Args:
+            rate: Tokens added per second (0 or less disables rate limiting)
+            burst: Bucket capacity
+            max_concurrency: Maximum limited calls in flight in this process (0 = unlimited)
+            bulk_reserve: Fraction of the burst capacity bulk calls may not use
+            store: Token store (defaults to a LocalTokenStore)
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_concurrency = max_concurrency
+        self.store = (store or LocalTokenStore(rate, self.burst)) if rate > 0 else None
+        self.floors = {INTERACTIVE: 0.0, BULK: self.burst * bulk_reserve}
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._unlimited_in_flight = 0
+        self._waiting = {priority: 0 for priority in PRIORITIES}
+        self._metrics = {
+            priority: {'acquired': 0, 'timeouts': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0}
+            for priority in PRIORITIES
+        }
+        self.throttled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.store is not None or self.max_concurrency > 0
+
+    def acquire(self, priority: str = INTERACTIVE, timeout: Optional[float] = None, limited: bool = True) -> float:
+        """
+        Block until a call of this priority may proceed. Pair with release().
+
+        Args:
+            priority: One of PRIORITIES
+            timeout: Maximum seconds to wait (None waits indefinitely)
+            limited: Whether the call counts against max_concurrency
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            RateLimitTimeout: If the timeout expires first
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        started = time.monotonic()
+        if not self.enabled:
+            return 0.0
+
+        ahead = PRIORITIES[:PRIORITIES.index(priority)]
+        with self._cond:
+            self._waiting[priority] += 1
+        try:
+            while True:
+                with self._cond:
+                    admitted = not any(self._waiting[other] for other in ahead) and (
+                        not limited or not self.max_concurrency or self._in_flight < self.max_concurrency
+                    )
+                    if admitted:
+                        # Hold the slot while taking a token
+                        if limited:
+                            self._in_flight += 1
+                        else:
+                            self._unlimited_in_flight += 1
+                    else:
+                        # Slots and higher-priority turns are signalled
+                        self._cond.wait(self._wait_time(started, timeout, 1.0))
+
+                retry_in = None
+                if admitted:
+                    # Outside the lock: the database store takes a row lock and a round trip
+                    retry_in = self.store.take(self.floors[priority]) if self.store else 0.0
+                    if retry_in == 0:
+                        break
+                    self.release(limited)
+
+                if timeout is not None and time.monotonic() - started >= timeout:
+                    with self._cond:
+                        self._metrics[priority]['timeouts'] += 1
+                    raise RateLimitTimeout(f"Waited {timeout}s for a CSL API call slot")
+                if retry_in is not None:
+                    # Tokens refill with time
+                    with self._cond:
+                        self._cond.wait(self._wait_time(started, timeout, retry_in))
+        finally:
+            with self._cond:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        with self._cond:
+            metrics = self._metrics[priority]
+            metrics['acquired'] += 1
+            metrics['wait_seconds_total'] += waited
+            metrics['wait_seconds_max'] = max(metrics['wait_seconds_max'], waited)
+        return waited
+
+    @staticmethod
+    def _wait_time(started: float, timeout: Optional[float], wait: float) -> float:
+        """`wait`, cut short to the time left before `timeout`"""
+        if timeout is None:
+            return wait
+        return max(0.0, min(wait, timeout - (time.monotonic() - started)))
+
+    def release(self, limited: bool = True) -> None:
+        """Mark a call acquired with acquire() as finished (pass the same `limited`)"""
+        if not self.enabled:
+            return
+        with self._cond:
+            if limited:
+                self._in_flight -= 1
+            else:
+                self._unlimited_in_flight -= 1
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, priority: str = INTERACTIVE, timeout: Optional[float] = None) -> Iterator[float]:
+        """
+        Hold permission for one call for the duration of the block.
+
+        Yields:
+            Seconds spent waiting
+        """
+        waited = self.acquire(priority, timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def throttle(self, seconds: float) -> None:
+        """
+        Back off after the CSL API rejected a call as over quota (429):
+        no token is handed out for `seconds`.
+        """
+        self.throttled += 1
+        if self.store is not None:
+            self.store.pause(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get queue and quota metrics.
+
+        Returns:
+            Dictionary with tokens available, calls in flight and 429s seen,
+            and per priority the calls waiting and admitted, timeouts and queue wait
+        """
+        tokens = self.store.available() if self.store is not None else None
+        with self._cond:
+            priorities = {}
+            for priority in PRIORITIES:
+                metrics = self._metrics[priority]
+                priorities[priority] = {
+                    'waiting': self._waiting[priority],
+                    **metrics,
+                    'wait_seconds_avg': metrics['wait_seconds_total'] / metrics['acquired'] if metrics['acquired'] else 0.0,
+                }
+            return {
+                'enabled': self.enabled,
+                'store': type(self.store).__name__ if self.store is not None else None,
+                'rate': self.rate,
+                'burst': self.burst,
+                'tokens_available': tokens,
+                'in_flight': self._in_flight + self._unlimited_in_flight,
+                'max_concurrency': self.max_concurrency,
+                'throttled': self.throttled,
+                'priorities': priorities,
+            }
+
+
+def build_governor() -> UpstreamGovernor:
+    """
+    Build the CSL API governor described by the CSL_API_* settings.
+
+    Returns:
+        Configured UpstreamGovernor
+    """
+    from django.conf import settings
+
+    rate = settings.CSL_API_RATE_LIMIT
+    burst = settings.CSL_API_BURST
+    store = None
+    if rate > 0 and settings.CSL_API_RATE_LIMIT_STORE == 'database':
+        store = DatabaseTokenStore(rate, burst)
+
+    return UpstreamGovernor(
+        rate=rate,
+        burst=burst,
+        max_concurrency=settings.CSL_API_MAX_CONCURRENCY,
+        bulk_reserve=settings.CSL_API_BULK_RESERVE,
+        store=store,
+    )
@@ -0,0 +1,145 @@
+import logging
+from typing import Dict, List, Any, Optional
+
+from django.utils import timezone
+from api.models import SourceImport
+from core.services.csl_service import CSLAPIError
+from core.services.mirror import MirrorSync, MirrorSyncError
+from core.services.snapshot import publish_snapshot
+from core.services.source_lists import source_code
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+def source_marker(source: Dict[str, Any]) -> Optional[str]:
+    """
+    Version marker of a source list: its publication date, or failing that
+    the time it was last imported upstream.
+
+    Args:
+        source: Entry from the /sources endpoint
+
+    Returns:
+        Marker string, or None if the entry has neither date
+    """
+    marker = source.get('source_last_updated') or source.get('last_imported')
+    return str(marker) if marker else None
+
+
+def row_marker(row: SourceImport) -> Optional[str]:
+    """Version marker of a source list as last reported upstream (see source_marker)"""
+    return source_marker({'source_last_updated': row.source_last_updated, 'last_imported': row.last_imported})
+
+
+class SourceRefresher:
+    """
+    Delta refresh of the local mirror driven by the CSL API /sources endpoint.
+
+    Each run compares the version of every source list reported upstream with
+    the version last synced (stored in SourceImport) and re-syncs only the
+    lists that changed, through the same bulk ingest path as a full mirror
+    sync. A list whose sync fails keeps its old marker and is retried on the
+    next run.
+    """
+
+    def __init__(self, service, page_size: int = 100, max_remove_fraction: Optional[float] = None):
+        self.service = service
+        self.page_size = page_size
+        self.max_remove_fraction = max_remove_fraction  # None: CSL_MIRROR_MAX_REMOVE_FRACTION
+
+    def check(self) -> List[SourceImport]:
+        """
+        Poll /sources and record what it reports.
+
+        Returns:
+            SourceImport rows of the source lists currently reported upstream
+
+        Raises:
+            CSLAPIError: If /sources can't be fetched
+        """
+        now = timezone.now()
+        rows = []
+
+        for source in self.service.fetch_sources():
+            name = source.get('source')
+            if not name:
+                continue
+
+            row, _ = SourceImport.objects.update_or_create(
+                source=name,
+                defaults={
+                    'code': source_code(name),
+                    'source_last_updated': source.get('source_last_updated'),
+                    'last_imported': source.get('last_imported'),
+                    'checked_at': now,
+                },
+            )
+            rows.append(row)
+
+        return rows
+
+    @staticmethod
+    def is_changed(row: SourceImport) -> bool:
+        """Whether the upstream version of a source list differs from the one last synced"""
+        marker = row_marker(row)
+        return marker is None or marker != row.synced_marker
+
+    def refresh(self, force: bool = False, codes: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Re-sync the source lists that changed upstream.
+
+        Args:
+            force: Re-sync every source list, changed or not
+            codes: Only consider these source list codes
+
+        Returns:
+            Per-run summary with sync statistics for each refreshed list
+
+        Raises:
+            CSLAPIError: If /sources can't be fetched
+        """
+        rows = sorted(self.check(), key=lambda row: row.source)
+        if codes:
+            rows = [row for row in rows if row.code in codes]
+
+        summary = {
+            'sources_checked': 0,
+            'unchanged': [],
+            'refreshed': {},
+            'failed': {},
+            'skipped': [],
+        }
+
+        for row in rows:
+            summary['sources_checked'] += 1
+            if not force and not self.is_changed(row):
+                summary['unchanged'].append(row.code or row.source)
+                continue
+            if not row.code:
+                logger.warning(f"Source refresh: can't identify the list code for '{row.source}'")
+                summary['skipped'].append(row.source)
+                continue
+
+            logger.info(f"Source refresh: re-syncing {row.code} (updated {row.source_last_updated})")
+            try:
+                sync = MirrorSync(
+                    self.service, page_size=self.page_size, publish=False, max_remove_fraction=self.max_remove_fraction
+                )
+                stats = sync.sync_from_api(sources=[row.code])
+            except (MirrorSyncError, CSLAPIError) as e:
+                logger.error(f"Source refresh: {row.code} failed: {e}")
+                SourceImport.objects.filter(pk=row.pk).update(last_error=str(e))
+                summary['failed'][row.code] = str(e)
+                continue
+
+            SourceImport.objects.filter(pk=row.pk).update(
+                synced_marker=row_marker(row),
+                synced_at=timezone.now(),
+                last_error=None,
+            )
+            summary['refreshed'][row.code] = stats
+
+        if summary['refreshed']:
+            publish_snapshot()
+        return summary
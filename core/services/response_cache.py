@@ -0,0 +1,313 @@
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Params whose values are free text: compared case- and whitespace-insensitively
+TEXT_PARAMS = {'name', 'address', 'city', 'state', 'postal_code'}
+
+# Params whose values are comma-separated code lists: compared as sets
+LIST_PARAMS = {'sources', 'countries', 'types'}
+
+# Flag kept inside a cached response once its entities are stored, so the
+# flag can't outlive the response it describes
+INGESTED_KEY = '_ingested'
+
+
+def canonical_params(params: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Reduce CSL search parameters to a canonical form so that equivalent
+    searches ("Smith", " smith ") share a cache entry.
+
+    Args:
+        params: Query parameters as produced by CSLService.build_params
+
+    Returns:
+        Dict of canonical string values, with empty values dropped
+    """
+    canonical = {}
+
+    for key, value in params.items():
+        if value in (None, '', [], 0):
+            continue
+
+        if key in LIST_PARAMS:
+            items = value if isinstance(value, (list, tuple)) else str(value).split(',')
+            value = ','.join(sorted({item.strip().upper() for item in items if item.strip()}))
+        elif key in TEXT_PARAMS:
+            value = ' '.join(str(value).split()).casefold()
+        else:
+            value = str(value).lower()
+
+        if value:
+            canonical[key] = value
+
+    return canonical
+
+
+def make_cache_key(url: str, params: Dict[str, Any]) -> str:
+    """
+    Build a stable cache key for a CSL API request.
+
+    Args:
+        url: CSL API endpoint URL
+        params: Query parameters for the request
+
+    Returns:
+        Cache key string
+    """
+    payload = json.dumps([url, canonical_params(params)], sort_keys=True, separators=(',', ':'))
+    return 'csl:response:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class BaseCacheBackend:
+    """
+    Interface for response cache storage backends.
+    """
+
+    def __init__(self, ttl: int, max_entries: int, **options):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        return 0
+
+
+class InProcessCache(BaseCacheBackend):
+    """
+    Thread-safe in-process LRU cache with per-entry TTL.
+    """
+
+    def __init__(self, ttl: int, max_entries: int, **options):
+        super().__init__(ttl, max_entries, **options)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+        # Callers mutate response payloads (e.g. fetch_and_store_entity pops addresses)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DjangoCacheBackend(BaseCacheBackend):
+    """
+    Backend delegating to a Django cache alias, so responses can be shared
+    between workers through whatever CACHES is configured with.
+    Eviction follows the underlying cache's own policy.
+    """
+
+    def __init__(self, ttl: int, max_entries: int, alias: str = 'default', **options):
+        super().__init__(ttl, max_entries, **options)
+        from django.core.cache import caches
+        self.cache = caches[alias]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        self.cache.set(key, value, timeout=self.ttl)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+
+class RedisCacheBackend(BaseCacheBackend):
+    """
+    Backend storing JSON-encoded responses in Redis (or any server speaking
+    the Redis protocol). Requires the optional ``redis`` package.
+    Configure the server with ``maxmemory-policy allkeys-lru`` for LRU eviction.
+    """
+
+    def __init__(self, ttl: int, max_entries: int, url: str = 'redis://localhost:6379/0', **options):
+        super().__init__(ttl, max_entries, **options)
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisCacheBackend requires the 'redis' package") from e
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        self.client.set(key, json.dumps(value), ex=self.ttl)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter('csl:response:*'):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    """
+    Cache for CSL API responses keyed on canonical search parameters,
+    with hit/miss accounting.
+    """
+
+    def __init__(self, backend: BaseCacheBackend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, url: str, params: Dict[str, Any], count: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response.
+
+        Args:
+            url: CSL API endpoint URL
+            params: Query parameters for the request
+            count: Record the lookup in the hit/miss counters
+
+        Returns:
+            Cached response data, or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            value = self.backend.get(make_cache_key(url, params))
+        except Exception as e:
+            logger.warning(f"CSL response cache lookup failed: {e}")
+            value = None
+
+        if value is not None:
+            value.pop(INGESTED_KEY, None)
+
+        if not count:
+            return value
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return value
+
+    def set(self, url: str, params: Dict[str, Any], value: Dict[str, Any]) -> None:
+        """
+        Store a successful response. Error payloads are never cached.
+
+        Args:
+            url: CSL API endpoint URL
+            params: Query parameters for the request
+            value: Response data from the CSL API
+        """
+        if not self.enabled or 'error' in value:
+            return
+
+        try:
+            self.backend.set(make_cache_key(url, params), value)
+        except Exception as e:
+            logger.warning(f"CSL response cache store failed: {e}")
+
+    def is_ingested(self, url: str, params: Dict[str, Any]) -> bool:
+        """Whether the cached response for a request is present and its entities are stored"""
+        if not self.enabled:
+            return False
+        try:
+            value = self.backend.get(make_cache_key(url, params))
+        except Exception as e:
+            logger.warning(f"CSL response cache lookup failed: {e}")
+            return False
+        return bool(value and value.get(INGESTED_KEY))
+
+    def mark_ingested(self, url: str, params: Dict[str, Any], value: Dict[str, Any]) -> None:
+        """
+        Store a response flagged as ingested, replacing (or restoring) its entry.
+
+        Args:
+            url: CSL API endpoint URL
+            params: Query parameters for the request
+            value: Response data from the CSL API
+        """
+        self.set(url, params, {**value, INGESTED_KEY: True})
+
+    def clear(self) -> None:
+        """Drop all cached responses"""
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss counters for the cache.
+
+        Returns:
+            Dictionary with hits, misses, hit rate and current size
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'size': len(self.backend),
+        }
+
+
+def build_response_cache() -> ResponseCache:
+    """
+    Build the response cache described by the CSL_RESPONSE_CACHE setting.
+
+    Returns:
+        Configured ResponseCache instance
+    """
+    config = settings.CSL_RESPONSE_CACHE
+    backend_class = import_string(config['BACKEND'])
+    backend = backend_class(
+        ttl=config['TTL'],
+        max_entries=config['MAX_ENTRIES'],
+        **config.get('OPTIONS', {})
+    )
+
+    return ResponseCache(backend, enabled=config['TTL'] > 0)
@@ -0,0 +1,379 @@
+import copy
+import csv
+import io
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Any, Iterable, Iterator, Optional, Set, Tuple
+
+from django.conf import settings
+from api.models import ScreeningEntity
+from core.services.addresses import canonical_country
+from core.services.matching import name_matcher, normalize_name, jaro_winkler
+from core.services.screening_cache import normalize_sources, screening_cache, screening_key
+from core.services.source_lists import list_key
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Distinct names handed to a worker process at a time
+SCREENING_CHUNK_SIZE = 500
+
+# Input columns accepted for each counterparty
+INPUT_FIELDS = ('name', 'country', 'address')
+
+
+class BatchInputError(ValueError):
+    """Raised when a batch screening payload can't be parsed."""
+
+
+def parse_json_rows(data: Any) -> List[Dict[str, str]]:
+    """
+    Parse counterparties from a JSON payload.
+
+    Accepts a list of names, a list of objects with name/country/address,
+    or an object holding either under "rows".
+
+    Args:
+        data: Decoded JSON payload
+
+    Returns:
+        List of counterparty dictionaries
+    """
+    if isinstance(data, dict):
+        data = data.get('rows')
+    if not isinstance(data, list):
+        raise BatchInputError("Expected a list of counterparties or an object with a 'rows' list")
+
+    rows = []
+    for item in data:
+        if isinstance(item, str):
+            item = {'name': item}
+        if not isinstance(item, dict):
+            raise BatchInputError("Each counterparty must be a name or an object with a 'name'")
+        rows.append({field: str(item.get(field) or '').strip() for field in INPUT_FIELDS})
+
+    return rows
+
+
+def parse_csv_rows(fileobj) -> List[Dict[str, str]]:
+    """
+    Parse counterparties from an uploaded CSV file with a header row
+    containing at least a "name" column.
+
+    Args:
+        fileobj: Binary file object
+
+    Returns:
+        List of counterparty dictionaries
+    """
+    reader = csv.DictReader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+    if not reader.fieldnames or 'name' not in [f.strip().lower() for f in reader.fieldnames]:
+        raise BatchInputError("CSV must have a header row with a 'name' column")
+
+    rows = []
+    for record in reader:
+        record = {(key or '').strip().lower(): value for key, value in record.items()}
+        rows.append({field: (record.get(field) or '').strip() for field in INPUT_FIELDS})
+
+    return rows
+
+
+def describe_entities(entity_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Load the details reported for matched entities, from the match
+    snapshot when one is mapped and from the database otherwise.
+
+    Args:
+        entity_ids: Primary keys of matched entities
+
+    Returns:
+        Entity id to summary dictionary
+    """
+    described = name_matcher.describe(entity_ids)
+    missing = [entity_id for entity_id in entity_ids if entity_id not in described]
+    if not missing:
+        return described
+
+    entities = ScreeningEntity.objects.filter(
+        pk__in=missing, is_active=True
+    ).prefetch_related('addresses')
+
+    return described | {
+        entity.pk: {
+            'id': entity.pk,
+            'name': entity.name,
+            'source_list': entity.source_list,
+            'sdn_type': entity.sdn_type,
+            'countries': sorted({a.country_key for a in entity.addresses.all() if a.country_key}),
+            'addresses': [normalize_name(str(a)) for a in entity.addresses.all()],
+        }
+        for entity in entities
+    }
+
+
+class CandidateFilter:
+    """
+    Source list and country restrictions on screening matches, applied to
+    the name search candidates so they hold before the cut to the match
+    limit. Entities without a known country pass the country check.
+
+    The details of each candidate entity are loaded once and kept, so the
+    matched ones are already at hand when the results are reported.
+    """
+
+    def __init__(self, sources: Optional[Set[str]] = None):
+        self.sources = sources
+        self._details = {}  # Entity id -> details, None if inactive
+
+    def accept(self, country: Optional[str]) -> Optional[Callable[[List[int]], Set[int]]]:
+        """
+        Search filter for a row's country.
+
+        Args:
+            country: Canonical country of the row, if any
+
+        Returns:
+            Callable for the `accept` argument of NameMatcher.search, or
+            None when nothing is restricted
+        """
+        if not self.sources and not country:
+            return None
+
+        def accept(entity_ids: List[int]) -> Set[int]:
+            allowed = set()
+            for entity_id, entity in self.details(entity_ids).items():
+                if self.sources and list_key(entity['source_list']) not in self.sources:
+                    continue
+                if country and entity['countries'] and country not in entity['countries']:
+                    continue
+                allowed.add(entity_id)
+            return allowed
+
+        return accept
+
+    def details(self, entity_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Details of active entities, loading the ones not seen yet.
+
+        Args:
+            entity_ids: Primary keys of candidate entities
+
+        Returns:
+            Entity id to summary dictionary
+        """
+        entity_ids = list(entity_ids)
+        missing = [entity_id for entity_id in entity_ids if entity_id not in self._details]
+        if missing:
+            loaded = describe_entities(missing)
+            for entity_id in missing:
+                self._details[entity_id] = loaded.get(entity_id)
+        return {
+            entity_id: self._details[entity_id]
+            for entity_id in entity_ids if self._details[entity_id] is not None
+        }
+
+
+def _screen_names(keys: List[Tuple[str, str]], limit: int, min_score: int,
+                  candidates: CandidateFilter) -> List[Dict[int, int]]:
+    return [
+        name_matcher.search(name, limit=limit, min_score=min_score, accept=candidates.accept(country))
+        for name, country in keys
+    ]
+
+
+class BatchScreener:
+    """
+    Screens large lists of counterparties against the local name index.
+
+    Identical names (with the same country) are screened once. Screening
+    runs in the calling process unless `workers` is more than 1, which
+    spreads the distinct names over worker processes. They're started by
+    a fork server (or spawned), never forked from the threaded caller, and
+    load the index themselves: map CSL_MATCH_SNAPSHOT so they start fast.
+    Only background jobs use them, as the start-up cost outweighs the gain
+    for the short lists screened in a request.
+    Results are cached per normalized input until a source list they cover
+    changes, so repeat screenings are a cache lookup.
+    """
+
+    def __init__(self, limit: int = 10, min_score: Optional[int] = None,
+                 workers: Optional[int] = None, sources: Optional[List[str]] = None,
+                 use_cache: bool = True):
+        self.limit = limit
+        self.min_score = settings.CSL_MATCH_MIN_SCORE if min_score is None else min_score
+        self.workers = workers or 1
+        self.sources = normalize_sources(sources)
+        self.use_cache = use_cache and screening_cache.enabled
+        self._candidates = CandidateFilter(self.sources)
+
+    def match_names(self, keys: List[Tuple[str, str]]) -> Iterator[Dict[int, int]]:
+        """
+        Match each name against the index, restricted to the requested
+        source lists and to entities in the given country.
+
+        Args:
+            keys: Distinct (normalized name, canonical country or '') pairs
+
+        Yields:
+            Entity id to score for each name, in input order
+        """
+        chunks = [keys[i:i + SCREENING_CHUNK_SIZE] for i in range(0, len(keys), SCREENING_CHUNK_SIZE)]
+
+        if self.workers <= 1 or len(chunks) <= 1:
+            name_matcher.ensure_loaded()
+            for chunk in chunks:
+                yield from _screen_names(chunk, self.limit, self.min_score, self._candidates)
+            return
+
+        from core.services.screening_worker import init_worker
+
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        with ProcessPoolExecutor(
+            max_workers=min(self.workers, len(chunks)),
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=init_worker,
+        ) as executor:
+            futures = [
+                executor.submit(_screen_names, chunk, self.limit, self.min_score, CandidateFilter(self.sources))
+                for chunk in chunks
+            ]
+            for future in futures:
+                yield from future.result()
+
+    def describe_entities(self, entity_ids) -> Dict[int, Dict[str, Any]]:
+        """Details reported for matched entities (see describe_entities)"""
+        return describe_entities(entity_ids)
+
+    def screen(self, rows: List[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
+        """
+        Screen counterparties, yielding one result per input row in order.
+
+        Matches are restricted to entities with an address in the row's
+        country when one is given, to the requested source lists, and scored
+        on address similarity when an address is given. Rows with a valid
+        cached result skip matching; the others are matched and cached.
+
+        Args:
+            rows: Counterparty dictionaries with name and optional country/address
+
+        Yields:
+            Result dictionaries with the row index, input and ranked matches
+        """
+        if not self.use_cache:
+            yield from self.match_rows(rows)
+            return
+
+        keys = [screening_key(row, self.sources, self.limit, self.min_score) for row in rows]
+        cached = screening_cache.get_many(keys, self.sources)
+        pending = [i for i, key in enumerate(keys) if key not in cached]
+        logger.debug(f"Screening {len(rows)} rows: {len(rows) - len(pending)} cached")
+
+        def cached_until(start: int, end: int) -> Iterator[Dict[str, Any]]:
+            for i in range(start, end):
+                yield {'row': i, 'input': rows[i], 'matches': copy.deepcopy(cached[keys[i]])}
+
+        next_row = 0
+        if pending:
+            # Read the stamp before the data, so a concurrent change can only make the entry look older
+            version = screening_cache.stamp(self.sources)
+            computed = {}
+            for result in self.match_rows([rows[i] for i in pending]):
+                i = pending[result['row']]
+                yield from cached_until(next_row, i)
+                yield {'row': i, 'input': rows[i], 'matches': result['matches']}
+                next_row = i + 1
+
+                computed[keys[i]] = result['matches']
+                if len(computed) >= SCREENING_CHUNK_SIZE:
+                    screening_cache.set_many(computed, self.sources, version)
+                    computed = {}
+            screening_cache.set_many(computed, self.sources, version)
+
+        yield from cached_until(next_row, len(rows))
+
+    def match_rows(self, rows: List[Dict[str, str]]) -> Iterator[Dict[str, Any]]:
+        """
+        Screen counterparties against the index, without the result cache.
+
+        Args:
+            rows: Counterparty dictionaries with name and optional country/address
+
+        Yields:
+            Result dictionaries with the row index, input and ranked matches
+        """
+        # Entity details are kept for this screening only
+        self._candidates = CandidateFilter(self.sources)
+
+        # Rows are matched on their normalized name and country
+        keys = []
+        for row in rows:
+            name = normalize_name(row['name'])
+            keys.append((name, canonical_country(row.get('country')) or '') if name else None)
+        distinct = list(dict.fromkeys(key for key in keys if key))
+        position = {key: i for i, key in enumerate(distinct)}
+
+        def ready_until(start: int) -> int:
+            # Rows whose names have all been matched, up to the first one still pending
+            end = start
+            while end < len(rows) and (
+                not keys[end] or position[keys[end]] < len(matches_by_name)
+            ):
+                end += 1
+            return end
+
+        # Emit rows a chunk at a time as their names come back from the workers
+        matches_by_name = []
+        next_row = 0
+        for matches in self.match_names(distinct):
+            matches_by_name.append(matches)
+            if len(matches_by_name) % SCREENING_CHUNK_SIZE == 0:
+                end = ready_until(next_row)
+                yield from self._results(rows, keys, position, matches_by_name, next_row, end)
+                next_row = end
+
+        yield from self._results(rows, keys, position, matches_by_name, next_row, len(rows))
+
+    def _results(self, rows, keys, position, matches_by_name, start, end) -> Iterator[Dict[str, Any]]:
+        if start >= end:
+            return
+        candidate_ids = set()
+        for i in range(start, end):
+            if keys[i]:
+                candidate_ids.update(matches_by_name[position[keys[i]]])
+        details = self._candidates.details(candidate_ids) if candidate_ids else {}
+
+        for i in range(start, end):
+            row = rows[i]
+            matches = matches_by_name[position[keys[i]]] if keys[i] else {}
+            address = normalize_name(row.get('address', ''))
+
+            results = []
+            for entity_id, score in matches.items():
+                entity = details.get(entity_id)
+                if entity is None:
+                    continue
+                match = {key: value for key, value in entity.items() if key != 'addresses'}
+                match['score'] = score
+                if address and entity['addresses']:
+                    match['address_score'] = round(100 * max(
+                        jaro_winkler(address, candidate) for candidate in entity['addresses']
+                    ))
+                results.append(match)
+
+            yield {'row': i, 'input': row, 'matches': results}
+
+
+def stream_ndjson(results: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    """
+    Encode screening results as newline-delimited JSON.
+
+    Args:
+        results: Result dictionaries
+
+    Yields:
+        One JSON line per result
+    """
+    for result in results:
+        yield json.dumps(result) + '\n'
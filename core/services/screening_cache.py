@@ -0,0 +1,237 @@
+import hashlib
+import json
+import logging
+import threading
+from typing import Dict, List, Any, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from api.models import ScreeningEntity, SourceVersion, ScreeningResult
+from core.services.addresses import canonical_country
+from core.services.matching import name_matcher, normalize_name
+from core.services.source_lists import list_key
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Keys per IN (...) lookup and rows per upsert
+CACHE_BATCH_SIZE = 500
+
+
+def normalize_sources(sources: Optional[Iterable[str]]) -> List[str]:
+    """Distinct list keys for a sources filter, sorted; empty means every list"""
+    return sorted({list_key(source) for source in sources or [] if source and source.strip()})
+
+
+def screening_key(row: Dict[str, str], sources: List[str], limit: int, min_score: int) -> str:
+    """
+    Cache key of a screening: the normalized input plus every option that
+    changes its result.
+
+    Args:
+        row: Counterparty with name and optional country/address
+        sources: Normalized source list filter
+        limit: Maximum matches per row
+        min_score: Minimum fuzzy match score
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    payload = json.dumps([
+        normalize_name(row.get('name', '')),
+        canonical_country(row.get('country')) or '',
+        normalize_name(row.get('address', '')),
+        sources,
+        limit,
+        min_score,
+    ], separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ScreeningCache:
+    """
+    Persisted screening results with per-source-list invalidation.
+
+    Every change to a list's entities bumps that list's version stamp (and
+    the global counter the stamps are drawn from). A cached result is valid
+    while its version is at least the newest stamp among the lists it
+    covers, so a change to one list only invalidates results screened
+    against that list (and unrestricted screenings, which cover every list).
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self, source_lists: Iterable[str]) -> int:
+        """
+        Record that the entities of some source lists changed. Call inside
+        the transaction making the change.
+
+        Args:
+            source_lists: Stored source_list values that changed
+
+        Returns:
+            The new version stamp
+        """
+        keys = {list_key(source_list) for source_list in source_lists} - {'', SourceVersion.GLOBAL}
+        with transaction.atomic():
+            # The row lock on the counter orders concurrent bumps
+            SourceVersion.objects.filter(source_list=SourceVersion.GLOBAL).update(
+                version=F('version') + 1, updated_at=timezone.now()
+            )
+            version = SourceVersion.objects.get(source_list=SourceVersion.GLOBAL).version
+            if keys:
+                SourceVersion.objects.bulk_create(
+                    [SourceVersion(source_list=key, version=version) for key in keys],
+                    update_conflicts=True,
+                    unique_fields=['source_list'],
+                    update_fields=['version', 'updated_at'],
+                )
+            # The change is this process's own: its name matcher applies it without a reload
+            transaction.on_commit(lambda: name_matcher.note_stamp(version))
+        return version
+
+    def stamp_query(self, sources: List[str]) -> Subquery:
+        """Expression for the newest version stamp among the lists a screening covers"""
+        versions = SourceVersion.objects.filter(source_list__in=sources or [SourceVersion.GLOBAL])
+        return Coalesce(
+            Subquery(versions.order_by('-version').values('version')[:1]),
+            Value(0),
+        )
+
+    def stamp(self, sources: List[str]) -> int:
+        """
+        Current version stamp of the lists a screening covers. Read it
+        before the data the screening is computed from.
+        """
+        versions = SourceVersion.objects.filter(source_list__in=sources or [SourceVersion.GLOBAL])
+        return max(versions.values_list('version', flat=True), default=0)
+
+    def get_many(self, keys: List[str], sources: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Look up still-valid results, one indexed query per CACHE_BATCH_SIZE keys.
+
+        Args:
+            keys: Screening keys
+            sources: Normalized source list filter the keys were built with
+
+        Returns:
+            Matches for each key with a valid entry
+        """
+        if not self.enabled:
+            return {}
+
+        stamp = self.stamp_query(sources)
+        distinct = list(dict.fromkeys(keys))
+        found = {}
+        for i in range(0, len(distinct), CACHE_BATCH_SIZE):
+            found.update(
+                ScreeningResult.objects.filter(
+                    key__in=distinct[i:i + CACHE_BATCH_SIZE], version__gte=stamp
+                ).values_list('key', 'matches')
+            )
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(distinct) - len(found)
+        return found
+
+    def set_many(self, results: Dict[str, List[Dict[str, Any]]], sources: List[str], version: int) -> None:
+        """
+        Store results, replacing any stale entries for the same keys.
+
+        Args:
+            results: Matches for each key
+            sources: Normalized source list filter the keys were built with
+            version: Stamp read before the results were computed
+        """
+        if not self.enabled or not results:
+            return
+
+        now = timezone.now()
+        ScreeningResult.objects.bulk_create(
+            [
+                ScreeningResult(key=key, sources=','.join(sources), version=version, matches=matches, created_at=now)
+                for key, matches in results.items()
+            ],
+            batch_size=CACHE_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['sources', 'version', 'matches', 'created_at'],
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get hit/miss counters for the cache.
+
+        Returns:
+            Dictionary with hits, misses and hit rate
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+
+        return {
+            'enabled': self.enabled,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
+
+    def prune(self) -> int:
+        """
+        Delete entries invalidated by list changes.
+
+        Returns:
+            Number of entries deleted
+        """
+        stale = ScreeningResult.objects.filter(version__lt=Coalesce(
+            Subquery(
+                SourceVersion.objects.filter(source_list=OuterRef('sources')).values('version')[:1]
+            ),
+            Value(-1),
+        ))
+        deleted = stale.delete()[0]
+
+        # Entries covering several lists (or all of them) are checked per filter
+        for sources in ScreeningResult.objects.exclude(
+            sources__in=SourceVersion.objects.values('source_list')
+        ).values_list('sources', flat=True).distinct():
+            deleted += ScreeningResult.objects.filter(
+                sources=sources, version__lt=self.stamp(sources.split(',') if sources else [])
+            ).delete()[0]
+
+        if deleted:
+            logger.info(f"Pruned {deleted} invalidated screening results")
+        return deleted
+
+
+screening_cache = ScreeningCache(enabled=settings.CSL_SCREENING_CACHE)
+
+
+@receiver(post_save, sender=ScreeningEntity)
+def bump_saved_entity_list(sender, instance, created, **kwargs):
+    """
+    Single-row saves (API, admin) bypass the ingest path's version bump.
+    Nested address edits go through the entity's save. The list an entity
+    moves out of comes from the values it was loaded with.
+    """
+    loaded = getattr(instance, '_loaded_values', {})
+    if created or 'source_list' in loaded:
+        screening_cache.bump([instance.source_list, loaded.get('source_list') or ''])
+    else:
+        # Saved without being loaded: the list it left is unknown
+        screening_cache.bump(SourceVersion.objects.values_list('source_list', flat=True))
+
+
+@receiver(post_delete, sender=ScreeningEntity)
+def bump_deleted_entity_list(sender, instance, **kwargs):
+    """Single-row deletes (API, admin) bypass the ingest path's version bump"""
+    screening_cache.bump([instance.source_list])
@@ -0,0 +1,25 @@
+import logging
+import os
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+def init_worker() -> None:
+    """
+    Initializer of batch screening worker processes.
+
+    Workers start from a fresh interpreter (forkserver or spawn) rather than
+    a fork of a threaded parent, so this module is imported before Django is
+    set up and keeps its Django imports inside the function. The worker then
+    maps the match snapshot (CSL_MATCH_SNAPSHOT), or builds its own index
+    from the database.
+    """
+    import django
+
+    django.setup()
+
+    from core.services.matching import name_matcher
+
+    name_matcher.ensure_loaded()
+    logger.debug(f"Screening worker {os.getpid()} ready")
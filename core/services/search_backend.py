@@ -0,0 +1,160 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from django.db import connection
+from django.db.models import FloatField, QuerySet
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+from api.models import AlternateName
+from core.services.matching import normalize_name
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'api_screeningentity_fts'
+
+
+def build_search_text(name: Optional[str], alt_names: Any, remarks: Optional[str]) -> str:
+    """
+    Build the denormalized, folded text indexed for local entity search.
+
+    Args:
+        name: Entity name
+        alt_names: List of alternative names (or a single name)
+        remarks: Free-text remarks
+
+    Returns:
+        Folded name, alt names and remarks joined by spaces
+    """
+    if not isinstance(alt_names, (list, tuple)):
+        alt_names = [alt_names]
+    parts = [name, *alt_names, remarks]
+    return ' '.join(normalize_name(part) for part in parts if isinstance(part, str) and part)
+
+
+def build_aliases(alt_names: Any) -> List[Dict[str, str]]:
+    """
+    Build AlternateName field values for an entity's alt names.
+
+    Args:
+        alt_names: List of alternative names (or a single name)
+
+    Returns:
+        List of dictionaries with the raw and normalized name, one per distinct alias
+    """
+    if not isinstance(alt_names, (list, tuple)):
+        alt_names = [alt_names]
+    aliases = {}
+    for name in alt_names:
+        if isinstance(name, str) and name.strip() and name not in aliases:
+            aliases[name] = {'name': name, 'normalized_name': normalize_name(name)}
+    return list(aliases.values())
+
+
+def has_sqlite_fts() -> bool:
+    """Whether the SQLite FTS5 index was created by the migrations"""
+    if not hasattr(connection, '_csl_has_fts'):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            connection._csl_has_fts = cursor.fetchone() is not None
+    return connection._csl_has_fts
+
+
+def full_text_search(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Filter and rank ScreeningEntity rows by their indexed search text.
+
+    PostgreSQL matches the search_vector (prefix full-text), or names and
+    aliases through their trigram indexes (typos, transliterations), ranked
+    by ts_rank plus the best name or alias similarity. SQLite
+    uses the FTS5 table, ranked by bm25. Other backends fall back to a
+    substring match.
+
+    Args:
+        queryset: ScreeningEntity queryset
+        query: User search terms
+
+    Returns:
+        Queryset filtered to matches and ordered by descending search_rank
+    """
+    tokens: List[str] = normalize_name(query).split()
+    if not tokens:
+        return queryset
+
+    folded = ' '.join(tokens)
+    table = queryset.model._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{token}:*' for token in tokens)
+        aliases = AlternateName._meta.db_table
+        # One index-driven branch per kind of match, so none of them needs a scan
+        matched = RawSQL(
+            f'SELECT id FROM "{table}" WHERE search_vector @@ to_tsquery(\'simple\', %s) '
+            f'UNION SELECT id FROM "{table}" WHERE name %% %s '
+            f'UNION SELECT entity_id FROM "{aliases}" WHERE name %% %s',
+            [tsquery, folded, folded]
+        )
+        rank = RawSQL(
+            f'ts_rank("{table}".search_vector, to_tsquery(\'simple\', %s)) + GREATEST('
+            f'similarity("{table}".name, %s), COALESCE((SELECT MAX(similarity(alt.name, %s)) '
+            f'FROM "{aliases}" alt WHERE alt.entity_id = "{table}".id), 0))',
+            [tsquery, folded, folded],
+            output_field=FloatField()
+        )
+        return queryset.filter(id__in=matched).annotate(search_rank=rank).order_by('-search_rank', '-updated_at')
+
+    if connection.vendor == 'sqlite' and has_sqlite_fts():
+        fts_query = ' '.join(f'"{token}"*' for token in tokens)
+        # bm25 is lower for better matches; negate so ordering matches the other backends.
+        # The MATCH runs once into a materialized CTE (SQLite 3.35+) that each row looks
+        # its rank up in; a plain correlated MATCH re-runs the query for every matched row
+        materialized = 'MATERIALIZED ' if connection.Database.sqlite_version_info >= (3, 35) else ''
+        rank = RawSQL(
+            f'(WITH ranks AS {materialized}(SELECT rowid AS id, -rank AS rank FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s) SELECT ranks.rank FROM ranks WHERE ranks.id = "{table}".id)',
+            [fts_query],
+            output_field=FloatField()
+        )
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [fts_query])
+        ).annotate(search_rank=rank).order_by('-search_rank', '-updated_at')
+
+    for token in tokens:
+        queryset = queryset.filter(search_text__contains=token)
+    return queryset
+
+
+def alias_search(queryset: QuerySet, alias: str) -> QuerySet:
+    """
+    Filter ScreeningEntity rows to those with an alias starting with `alias`.
+
+    The lookup is a prefix match on the indexed AlternateName.normalized_name,
+    joined back to the entities through a subquery so rows aren't duplicated.
+
+    Args:
+        queryset: ScreeningEntity queryset
+        alias: Alias to look up (folded before matching)
+
+    Returns:
+        Filtered queryset
+    """
+    folded = normalize_name(alias)
+    if not folded:
+        return queryset
+    return queryset.filter(
+        pk__in=AlternateName.objects.filter(normalized_name__startswith=folded).values('entity_id')
+    )
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that answers ?search= from the full-text/trigram index
+    instead of ILIKE scans over search_fields.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = ' '.join(self.get_search_terms(request))
+        if not terms:
+            return queryset
+        return full_text_search(queryset, terms)
@@ -0,0 +1,172 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from api.models import SearchQuery
+from core.services.stats import dataset_stats
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+class SearchLogWriter:
+    """
+    Buffers search history records in memory and writes them with
+    bulk_create from a background thread, so logging a search costs no
+    database round trip on the request path.
+
+    The buffer is flushed when it reaches batch_size records or every
+    flush_interval seconds, whichever comes first, and once more by
+    shutdown(), which also stops the thread (run at interpreter exit, and
+    by test modules before their database is torn down). With
+    enabled=False every record is written immediately instead.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 2.0,
+                 max_buffer: int = 10000, enabled: bool = True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.enabled = enabled
+        self._reset()
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer: List[SearchQuery] = []
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stop: Optional[threading.Event] = None  # Set to stop the current thread
+        self.dropped = 0
+
+    def log(self, query_text: str, results_count: int = 0, user: Optional[str] = None,
+            search_params: Optional[Dict[str, Any]] = None,
+            timestamp: Optional[datetime] = None) -> None:
+        """
+        Record a search, with its final result count, in a single write.
+
+        Args:
+            query_text: Search query string
+            results_count: Number of results found
+            user: Optional user identifier
+            search_params: Parameters of the search
+            timestamp: When the search started (defaults to now)
+        """
+        record = SearchQuery(
+            query_text=query_text[:255],
+            results_count=results_count,
+            user=user,
+            timestamp=timestamp or timezone.now(),
+            search_params=search_params,
+        )
+
+        if not self.enabled:
+            self._write([record])
+            return
+
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                # The database is falling behind; shed load rather than grow without bound
+                self.dropped += 1
+                return
+            self._buffer.append(record)
+            pending = len(self._buffer)
+            self._ensure_thread()
+
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    async def alog(self, query_text: str, **kwargs) -> None:
+        """Async variant of log(), for use from async views and services"""
+        if self.enabled:
+            self.log(query_text, **kwargs)
+        else:
+            await sync_to_async(self.log)(query_text, **kwargs)
+
+    def flush(self) -> int:
+        """
+        Write all buffered records now.
+
+        Returns:
+            Number of records written
+        """
+        with self._flush_lock:
+            with self._lock:
+                records, self._buffer = self._buffer, []
+            if records:
+                self._write(records)
+            return len(records)
+
+    def shutdown(self, timeout: Optional[float] = 5.0) -> int:
+        """
+        Stop the background thread, waiting for its last flush, then write
+        anything logged since. Logging again starts a new thread.
+
+        Args:
+            timeout: Longest wait for the thread (None waits indefinitely)
+
+        Returns:
+            Number of records written after the thread stopped
+        """
+        with self._lock:
+            thread, stop = self._thread, self._stop
+            self._thread = self._stop = None
+        if thread is not None:
+            stop.set()
+            self._wakeup.set()
+            thread.join(timeout)
+        return self.flush()
+
+    def pending(self) -> int:
+        """Number of records waiting to be written"""
+        with self._lock:
+            return len(self._buffer)
+
+    def _write(self, records: List[SearchQuery]) -> None:
+        try:
+            with transaction.atomic():
+                SearchQuery.objects.bulk_create(records, batch_size=self.batch_size)
+                dataset_stats.apply(Counter({('searches', ''): len(records)}))
+        except Exception as e:
+            logger.error(f"Failed to write {len(records)} search history records: {e}")
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._stop,), name='search-log-writer', daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, stop: threading.Event) -> None:
+        try:
+            while not stop.is_set():
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                close_old_connections()
+                self.flush()
+        finally:
+            # Closed here, on the thread that opened it, before shutdown() returns
+            connection.close()
+
+
+search_log = SearchLogWriter(
+    batch_size=settings.CSL_SEARCH_LOG_BATCH_SIZE,
+    flush_interval=settings.CSL_SEARCH_LOG_FLUSH_INTERVAL,
+    enabled=settings.CSL_SEARCH_LOG_ASYNC,
+)
+
+# Write whatever is still buffered when the process exits, and stop the thread first
+atexit.register(search_log.shutdown)
+
+# A forked child (e.g. a preloaded server worker) gets neither the parent's thread nor its records
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=search_log._reset)
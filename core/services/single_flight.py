@@ -0,0 +1,163 @@
+import asyncio
+import contextlib
+import copy
+import hashlib
+import logging
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+from django.db import connection
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """An in-flight call that waiters can block on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for it and receive a copy of its result (or its exception).
+    Nothing is cached: once the call finishes, the next caller starts a new one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn, or wait for the identical call already in flight.
+
+        Args:
+            key: Identifies equivalent calls
+            fn: Function to run when no call for the key is in flight
+
+        Returns:
+            fn's result
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            # Each waiter gets its own copy; callers may mutate the payload
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            if call.waiters:
+                logger.debug(f"Single-flight call shared with {call.waiters} waiters")
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        """Calls run and calls that joined one already in flight"""
+        with self._lock:
+            return {'executed': self.executed, 'shared': self.shared, 'in_flight': len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    asyncio variant of SingleFlight: concurrent coroutines awaiting the same
+    key share one execution. The call runs as its own task, so a caller that
+    is cancelled (e.g. its client disconnected) doesn't cancel it for the
+    others. Calls are tracked per event loop.
+    """
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await fn(), or the identical call already in flight.
+
+        Args:
+            key: Identifies equivalent calls
+            fn: Coroutine function to run when no call for the key is in flight
+
+        Returns:
+            fn's result
+        """
+        loop = asyncio.get_running_loop()
+        calls = self._calls.setdefault(loop, {})
+
+        task = calls.get(key)
+        leader = task is None
+        if leader:
+            task = calls[key] = loop.create_task(fn())
+            self.executed += 1
+
+            def finished(done: asyncio.Task) -> None:
+                calls.pop(key, None)
+                if not done.cancelled():
+                    done.exception()  # Mark retrieved in case every caller was cancelled
+
+            task.add_done_callback(finished)
+        else:
+            self.shared += 1
+
+        result = await asyncio.shield(task)
+        return result if leader else copy.deepcopy(result)
+
+
+def lock_id(key: str) -> int:
+    """Signed 64-bit advisory lock id for a key"""
+    return int.from_bytes(hashlib.sha256(key.encode('utf-8')).digest()[:8], 'big', signed=True)
+
+
+@contextlib.contextmanager
+def advisory_lock(key: str, enabled: bool = True) -> Iterator[bool]:
+    """
+    Hold a PostgreSQL session-level advisory lock on a key, so equivalent work
+    in other processes waits for this one to finish. A no-op on other databases.
+
+    Args:
+        key: Identifies equivalent work
+        enabled: Take the lock at all
+
+    Yields:
+        Whether a lock is held
+    """
+    if not enabled or connection.vendor != 'postgresql':
+        yield False
+        return
+
+    lock = lock_id(key)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s)', [lock])
+    try:
+        yield True
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [lock])
@@ -0,0 +1,345 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from api.models import ScreeningEntity, Address, SourceVersion
+from core.services.matching import normalize_name, ngrams, name_variants
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CSLSNAP\0'
+FORMAT_VERSION = 1
+
+# magic, format version, section count, metadata offset, metadata length
+HEADER = struct.Struct('<8sIIQQ')
+# name, offset, length
+SECTION = struct.Struct('<8sQQ')
+
+# Normalized names only hold these characters, so an n-gram is a number below GRAM_SPACE
+GRAM_ALPHABET = ' 0123456789abcdefghijklmnopqrstuvwxyz'
+GRAM_CODES = {ch: i for i, ch in enumerate(GRAM_ALPHABET)}
+GRAM_SPACE = len(GRAM_ALPHABET) ** 3
+
+# String references stored per entity, in order
+ENTITY_FIELDS = ('name', 'source_list', 'sdn_type', 'countries', 'addresses')
+
+# Array typecode of each section (None for raw bytes)
+SECTIONS = {
+    'nameoff': 'I',   # Name slot -> offset into names (one extra entry for the end)
+    'names': None,    # Normalized names, concatenated
+    'owners': 'q',    # Name slot -> entity id
+    'gramcnt': 'I',   # Name slot -> number of distinct n-grams
+    'postoff': 'I',   # N-gram code -> offset into postings (one extra entry for the end)
+    'postings': 'I',  # Name slots per n-gram, by code
+    'entids': 'q',    # Entity ids, sorted
+    'entrefs': 'I',   # Per entity, one string-table index per ENTITY_FIELDS
+    'stroff': 'I',    # String index -> offset into strings (one extra entry for the end)
+    'strings': None,  # UTF-8 strings, concatenated
+}
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file can't be read."""
+
+
+def gram_code(gram: str) -> int:
+    """Number of an n-gram of a normalized name"""
+    a, b, c = gram
+    return (GRAM_CODES[a] * len(GRAM_ALPHABET) + GRAM_CODES[b]) * len(GRAM_ALPHABET) + GRAM_CODES[c]
+
+
+class StringTable:
+    """Deduplicated strings addressed by index"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.offsets = array('I', [0])
+        self.data = bytearray()
+
+    def add(self, value: str) -> int:
+        ref = self.index.get(value)
+        if ref is None:
+            ref = self.index[value] = len(self.offsets) - 1
+            self.data += value.encode('utf-8')
+            self.offsets.append(len(self.data))
+        return ref
+
+
+def iter_entities() -> Iterator[Tuple[int, str, Any, str, str, List[Address]]]:
+    """Active entities in id order, each with its addresses"""
+    entities = ScreeningEntity.objects.filter(is_active=True).order_by('id').values_list(
+        'id', 'name', 'alt_names', 'source_list', 'sdn_type'
+    )
+    addresses = iter(Address.objects.filter(entity__is_active=True).order_by('entity_id', 'id').only(
+        'entity_id', 'address', 'city', 'country', 'country_key'
+    ).iterator(chunk_size=5000))
+    address = next(addresses, None)
+
+    for entity_id, name, alt_names, source_list, sdn_type in entities.iterator(chunk_size=5000):
+        own = []
+        while address is not None and address.entity_id <= entity_id:
+            if address.entity_id == entity_id:
+                own.append(address)
+            address = next(addresses, None)
+        yield entity_id, name, alt_names, source_list, sdn_type, own
+
+
+def write_snapshot(path: str) -> Dict[str, Any]:
+    """
+    Compile the active entities, their names, aliases and addresses into a
+    snapshot file. The file is written beside `path` and renamed over it, so
+    readers see either the old or the new version, never a partial one.
+
+    Args:
+        path: Snapshot file path
+
+    Returns:
+        The snapshot's metadata
+    """
+    started_at = time.time()
+    version = SourceVersion.objects.filter(source_list=SourceVersion.GLOBAL).values_list(
+        'version', flat=True
+    ).first() or 0
+
+    name_offsets = array('I', [0])
+    names = bytearray()
+    owners = array('q')
+    gram_counts = array('I')
+    postings: Dict[int, array] = {}
+    entity_ids = array('q')
+    entity_refs = array('I')
+    strings = StringTable()
+
+    for entity_id, name, alt_names, source_list, sdn_type, addresses in iter_entities():
+        for normalized in sorted(name_variants(name, alt_names)):
+            slot = len(owners)
+            grams = ngrams(normalized)
+            names += normalized.encode('ascii')
+            name_offsets.append(len(names))
+            owners.append(entity_id)
+            gram_counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram_code(gram), array('I')).append(slot)
+
+        entity_ids.append(entity_id)
+        entity_refs.extend(strings.add(value) for value in (
+            name or '',
+            source_list or '',
+            sdn_type or '',
+            ','.join(sorted({a.country_key for a in addresses if a.country_key})),
+            '\n'.join(normalize_name(str(a)) for a in addresses),
+        ))
+
+    posting_offsets = array('I', [0])
+    posting_slots = array('I')
+    for code in range(GRAM_SPACE):
+        posting_slots.extend(postings.get(code, ()))
+        posting_offsets.append(len(posting_slots))
+
+    sections = {
+        'nameoff': name_offsets,
+        'names': bytes(names),
+        'owners': owners,
+        'gramcnt': gram_counts,
+        'postoff': posting_offsets,
+        'postings': posting_slots,
+        'entids': entity_ids,
+        'entrefs': entity_refs,
+        'stroff': strings.offsets,
+        'strings': bytes(strings.data),
+    }
+    meta = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'byteorder': sys.byteorder,
+        'started_at': started_at,
+        'built_at': timezone.now().isoformat(),
+        'entities': len(entity_ids),
+        'names': len(owners),
+    }
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            meta_bytes = json.dumps(meta).encode('utf-8')
+            # Sections start 8-byte aligned so their arrays can be cast in place
+            offset = HEADER.size + SECTION.size * len(sections) + len(meta_bytes)
+            table = []
+            for name, data in sections.items():
+                offset += -offset % 8
+                length = len(data) * data.itemsize if isinstance(data, array) else len(data)
+                table.append((name, offset, length))
+                offset += length
+
+            fp.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), HEADER.size + SECTION.size * len(sections), len(meta_bytes)))
+            for name, offset, length in table:
+                fp.write(SECTION.pack(name.encode('ascii'), offset, length))
+            fp.write(meta_bytes)
+            for (name, offset, _), data in zip(table, sections.values()):
+                fp.write(b'\0' * (offset - fp.tell()))
+                fp.write(data.tobytes() if isinstance(data, array) else data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    logger.info(f"Wrote match snapshot v{version} to {path}: {meta['entities']} entities, {meta['names']} names")
+    return meta
+
+
+def publish_snapshot() -> Optional[Dict[str, Any]]:
+    """
+    Rebuild the configured snapshot after the data changed (e.g. after a
+    sync). Workers map the new version on their next check.
+
+    Returns:
+        The new snapshot's metadata, or None if no snapshot is configured
+    """
+    if not settings.CSL_MATCH_SNAPSHOT:
+        return None
+    return write_snapshot(settings.CSL_MATCH_SNAPSHOT)
+
+
+class MatchSnapshot:
+    """
+    Read-only view of a snapshot file mapped into memory.
+
+    Every process mapping the same file shares its pages through the OS
+    page cache, so the index costs each worker almost no private memory
+    and opening it doesn't depend on the dataset size.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as fp:
+            stat = os.fstat(fp.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._views = []
+            self._open()
+        except Exception:
+            self.close()
+            raise
+
+    def _open(self) -> None:
+        buffer = memoryview(self._mmap)
+        self._views.append(buffer)
+        if len(buffer) < HEADER.size:
+            raise SnapshotError(f"{self.path} is not a match snapshot")
+        magic, fmt, count, meta_offset, meta_length = HEADER.unpack_from(buffer)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise SnapshotError(f"{self.path} is not a version {FORMAT_VERSION} match snapshot")
+
+        self.meta = json.loads(bytes(buffer[meta_offset:meta_offset + meta_length]))
+        if self.meta['byteorder'] != sys.byteorder:
+            raise SnapshotError(f"{self.path} was built on a {self.meta['byteorder']}-endian machine")
+
+        sections = {}
+        for i in range(count):
+            name, offset, length = SECTION.unpack_from(buffer, HEADER.size + i * SECTION.size)
+            name = name.rstrip(b'\0').decode('ascii')
+            typecode = SECTIONS.get(name, False)
+            if typecode is False:
+                continue
+            view = buffer[offset:offset + length]
+            if typecode:
+                view = view.cast(typecode)
+            self._views.append(view)
+            sections[name] = view
+        missing = set(SECTIONS) - set(sections)
+        if missing:
+            raise SnapshotError(f"{self.path} is missing sections: {', '.join(sorted(missing))}")
+
+        self._name_offsets = sections['nameoff']
+        self._names = sections['names']
+        self._owners = sections['owners']
+        self._gram_counts = sections['gramcnt']
+        self._posting_offsets = sections['postoff']
+        self._postings = sections['postings']
+        self._entity_ids = sections['entids']
+        self._entity_refs = sections['entrefs']
+        self._string_offsets = sections['stroff']
+        self._strings = sections['strings']
+
+    @property
+    def version(self) -> int:
+        return self.meta['version']
+
+    @property
+    def slots(self) -> int:
+        return len(self._owners)
+
+    @property
+    def entities(self) -> int:
+        return len(self._entity_ids)
+
+    def shared_grams(self, grams: Iterable[str]) -> Counter:
+        """Number of the given n-grams each name slot has"""
+        shared = Counter()
+        for gram in grams:
+            code = gram_code(gram)
+            shared.update(self._postings[self._posting_offsets[code]:self._posting_offsets[code + 1]].tolist())
+        return shared
+
+    def name(self, slot: int) -> str:
+        return bytes(self._names[self._name_offsets[slot]:self._name_offsets[slot + 1]]).decode('ascii')
+
+    def owner(self, slot: int) -> int:
+        return self._owners[slot]
+
+    def gram_count(self, slot: int) -> int:
+        return self._gram_counts[slot]
+
+    def string(self, ref: int) -> str:
+        return bytes(self._strings[self._string_offsets[ref]:self._string_offsets[ref + 1]]).decode('utf-8')
+
+    def describe(self, entity_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Details of an entity as reported in screening matches.
+
+        Args:
+            entity_id: Entity primary key
+
+        Returns:
+            Dictionary with id, name, source_list, sdn_type, countries and
+            normalized addresses, or None if the entity isn't in the snapshot
+        """
+        position = bisect_left(self._entity_ids, entity_id)
+        if position == len(self._entity_ids) or self._entity_ids[position] != entity_id:
+            return None
+        base = position * len(ENTITY_FIELDS)
+        values = dict(zip(ENTITY_FIELDS, (self.string(ref) for ref in self._entity_refs[base:base + len(ENTITY_FIELDS)])))
+        return {
+            'id': entity_id,
+            'name': values['name'],
+            'source_list': values['source_list'],
+            'sdn_type': values['sdn_type'] or None,
+            'countries': values['countries'].split(',') if values['countries'] else [],
+            'addresses': values['addresses'].split('\n') if values['addresses'] else [],
+        }
+
+    def close(self) -> None:
+        """Unmap the file; the snapshot must not be used afterwards"""
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
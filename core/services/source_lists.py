@@ -0,0 +1,41 @@
+import re
+from typing import Optional
+
+from core.constants.csl_constants import CSL_SOURCES, CSL_SOURCES_DICT
+
+# Source list codes quoted in upstream source names, e.g. "Entity List (EL) - Bureau of Industry and Security"
+CODE_PATTERN = re.compile(r'\(([A-Z0-9-]+)\)')
+
+
+def source_code(source: str) -> Optional[str]:
+    """
+    Work out the source list code (the value the search endpoint's `sources`
+    parameter takes) for a source as named by the /sources endpoint.
+
+    Args:
+        source: Source name or code reported upstream
+
+    Returns:
+        Source list code, or None if it can't be identified
+    """
+    source = (source or '').strip()
+    if source in CSL_SOURCES_DICT:
+        return source
+    for code in CODE_PATTERN.findall(source):
+        if code in CSL_SOURCES_DICT:
+            return code
+
+    # Fall back to the list's full name; prefer the longest match ("Non-SDN ..." over "SDN ...")
+    lowered = source.lower()
+    matches = [item for item in CSL_SOURCES if lowered.startswith(item['name'].lower())]
+    if matches:
+        return max(matches, key=lambda item: len(item['name']))['code']
+    return None
+
+
+def list_key(source_list: str) -> str:
+    """
+    Identify a stored source_list value by its code where it can be worked
+    out (search results name lists in full), or else by the value itself.
+    """
+    return source_code(source_list) or (source_list or '').strip()
@@ -0,0 +1,247 @@
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from api.models import ScreeningEntity, Address, SearchQuery, FacetCount
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Facets holding distinct values; a value is dropped when its count reaches zero
+VALUE_FACETS = ('country', 'source_list')
+
+# Marker row set when a write bypassed the incremental bookkeeping
+STALE_MARKER = ('_state', 'stale')
+
+
+def compute_facets() -> Counter:
+    """
+    Aggregate every facet from scratch.
+
+    Returns:
+        Counter keyed by (facet, value)
+    """
+    facets = Counter()
+    entity_counts = ScreeningEntity.objects.aggregate(
+        entities=Count('id'), active_entities=Count('id', filter=Q(is_active=True))
+    )
+    facets[('entities', '')] = entity_counts['entities']
+    facets[('active_entities', '')] = entity_counts['active_entities']
+    facets[('searches', '')] = SearchQuery.objects.count()
+    for source_list, count in ScreeningEntity.objects.exclude(source_list='').values_list(
+        'source_list'
+    ).annotate(n=Count('id')).order_by():
+        facets[('source_list', source_list)] = count
+    for country, count in Address.objects.exclude(country__isnull=True).exclude(country='').values_list(
+        'country'
+    ).annotate(n=Count('id')).order_by():
+        facets[('country', country)] = count
+    return facets
+
+
+def ingest_deltas(records: Iterable[Dict[str, Any]],
+                  existing: Dict[str, Tuple[int, str, bool]],
+                  replaced_countries: Counter) -> Counter:
+    """
+    Work out how an ingest batch changes the facets.
+
+    Args:
+        records: Parsed entities (CSLService.parse_entity output) being stored
+        existing: source_id -> (id, source_list, is_active) of entities being replaced
+        replaced_countries: Country counts of the addresses being replaced
+
+    Returns:
+        Counter of deltas keyed by (facet, value)
+    """
+    deltas = Counter()
+    for country, count in replaced_countries.items():
+        deltas[('country', country)] -= count
+
+    for record in records:
+        old = existing.get(record['source_id'])
+        if old is None:
+            deltas[('entities', '')] += 1
+            deltas[('active_entities', '')] += 1
+        else:
+            _, old_source_list, was_active = old
+            if old_source_list:
+                deltas[('source_list', old_source_list)] -= 1
+            if not was_active:
+                deltas[('active_entities', '')] += 1
+        if record['fields']['source_list']:
+            deltas[('source_list', record['fields']['source_list'])] += 1
+        for address in record['addresses']:
+            if address.get('country'):
+                deltas[('country', address['country'])] += 1
+
+    return deltas
+
+
+class DatasetStats:
+    """
+    Pre-aggregated counters and filter-dropdown values.
+
+    Ingest applies deltas to the FacetCount rows in the same transaction as
+    the data, so reading the statistics is a single query on a small table
+    however large the data grows. Reads are also cached in-process for
+    `ttl` seconds; local writes invalidate the cache, and writes from other
+    processes show up once it expires. Single-row saves (API, admin) apply
+    their own deltas; writes whose effect is unknown (deletes, address
+    edits) mark the statistics stale and the next read rebuilds them.
+    """
+
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._expires = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current statistics.
+
+        Returns:
+            Dictionary with entities, active_entities and searches counts and
+            sorted countries and source_lists
+        """
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() < self._expires:
+                return self._snapshot
+
+        rows = list(FacetCount.objects.values_list('facet', 'value', 'count'))
+        if not rows or any((facet, value) == STALE_MARKER for facet, value, _ in rows):
+            self.rebuild()
+            rows = list(FacetCount.objects.values_list('facet', 'value', 'count'))
+
+        counts = {}
+        values = {facet: [] for facet in VALUE_FACETS}
+        for facet, value, count in rows:
+            if facet in values:
+                if count > 0:
+                    values[facet].append(value)
+            else:
+                counts[facet] = count
+
+        snapshot = {
+            'entities': counts.get('entities', 0),
+            'active_entities': counts.get('active_entities', 0),
+            'searches': counts.get('searches', 0),
+            'countries': sorted(values['country']),
+            'source_lists': sorted(values['source_list']),
+        }
+        with self._lock:
+            self._snapshot = snapshot
+            self._expires = time.monotonic() + self.ttl
+        return snapshot
+
+    def rebuild(self) -> None:
+        """Recompute every facet from the data tables"""
+        with transaction.atomic():
+            facets = compute_facets()
+            FacetCount.objects.all().delete()
+            FacetCount.objects.bulk_create(
+                FacetCount(facet=facet, value=value, count=count)
+                for (facet, value), count in facets.items()
+            )
+        logger.info(f"Rebuilt dataset statistics ({len(facets)} facets)")
+        self.invalidate()
+
+    def apply(self, deltas: Counter) -> None:
+        """
+        Add deltas to the stored facets with one upsert statement.
+
+        Args:
+            deltas: Counter keyed by (facet, value)
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        table = connection.ops.quote_name(FacetCount._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {table} (facet, value, count) VALUES (%s, %s, %s) '
+                f'ON CONFLICT (facet, value) DO UPDATE SET count = {table}.count + excluded.count',
+                # Key order, so concurrent ingests lock the rows in the same order
+                [(facet, value, delta) for (facet, value), delta in sorted(deltas.items())]
+            )
+        if any(delta < 0 and facet in VALUE_FACETS for (facet, _), delta in deltas.items()):
+            FacetCount.objects.filter(facet__in=VALUE_FACETS, count__lte=0).delete()
+        transaction.on_commit(self.invalidate)
+
+    def mark_stale(self) -> None:
+        """Force a rebuild on the next read"""
+        facet, value = STALE_MARKER
+        FacetCount.objects.update_or_create(facet=facet, value=value, defaults={'count': 1})
+        transaction.on_commit(self.invalidate)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+
+dataset_stats = DatasetStats(ttl=settings.CSL_STATS_CACHE_TTL)
+
+
+def entity_deltas(instance: ScreeningEntity, created: bool) -> Optional[Counter]:
+    """
+    Work out how a single-row entity save changes the facets.
+
+    Args:
+        instance: The saved entity
+        created: Whether the save inserted it
+
+    Returns:
+        Counter of deltas keyed by (facet, value), or None when the values
+        it replaced are unknown (the instance was not loaded from the database)
+    """
+    deltas = Counter()
+    if created:
+        deltas[('entities', '')] += 1
+    else:
+        loaded = getattr(instance, '_loaded_values', {})
+        if any(name not in loaded for name in ScreeningEntity.TRACKED_FIELDS):
+            return None
+        if loaded['source_list']:
+            deltas[('source_list', loaded['source_list'])] -= 1
+        if loaded['is_active']:
+            deltas[('active_entities', '')] -= 1
+    if instance.source_list:
+        deltas[('source_list', instance.source_list)] += 1
+    if instance.is_active:
+        deltas[('active_entities', '')] += 1
+    return deltas
+
+
+@receiver(post_save, sender=ScreeningEntity)
+def count_entity_save(sender, instance, created, raw=False, **kwargs):
+    """Single-row saves (API, admin) bypass the ingest bookkeeping"""
+    deltas = None if raw else entity_deltas(instance, created)
+    if deltas is None:
+        dataset_stats.mark_stale()
+    else:
+        dataset_stats.apply(deltas)
+
+
+@receiver(post_save, sender=Address)
+def count_address_save(sender, instance, created, raw=False, **kwargs):
+    """Addresses added outside ingest (nested API writes, admin inlines)"""
+    if created and not raw:
+        if instance.country:
+            dataset_stats.apply(Counter({('country', instance.country): 1}))
+    else:
+        dataset_stats.mark_stale()
+
+
+@receiver(post_delete, sender=ScreeningEntity)
+@receiver(post_delete, sender=SearchQuery)
+def mark_stats_stale(sender, **kwargs):
+    """Deletes cascade to addresses without signals, so their counts are unknown"""
+    dataset_stats.mark_stale()
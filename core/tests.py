@@ -1,3 +1,806 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # Optional dependency: pip install "csl-api-app[async]"
+    httpx = None
+
+from api.models import ScreeningEntity, Address, EntityID, Job, RateLimitBucket
+from core.services.addresses import address_keys, canonical_country, fold_postal_code, fold_street
+from core.services.async_csl_service import AsyncCSLService
+from core.services.csl_service import CSLAPIError, CSLService, JitteredRetry, csl_service
+from core.services.identifiers import normalize_id_number
+from core.services.jobs import JOB_HANDLERS, claim_next_job, run_job, submit_job
+from core.services.matching import NameMatcher, name_matcher
+from core.services.mirror import MirrorSync, MirrorSyncError, iter_json_array
+from core.services.rate_limiter import BULK, INTERACTIVE, DatabaseTokenStore, RateLimitTimeout, UpstreamGovernor
+from core.services.response_cache import InProcessCache, ResponseCache, make_cache_key
+from core.services.screening import BatchScreener
+from core.services.search_log import SearchLogWriter
+from core.services.single_flight import SingleFlight
+from core.services.snapshot import write_snapshot
+
+
+def json_response(data, status=200, headers=None):
+    """A requests Response carrying `data` as its JSON body"""
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(data).encode('utf-8')
+    response.headers.update(headers or {})
+    return response
+
+
+@override_settings(CSL_API_URL='https://csl.example/search', CSL_API_RATE_LIMIT=0)
+class PooledSessionTests(SimpleTestCase):
+    """
+    Upstream calls share one pooled session with timeouts, and transient
+    failures are retried with jittered backoff.
+    """
+
+    def setUp(self):
+        self.service = CSLService()
+
+    def test_session_configuration(self):
+        adapter = self.service.session.get_adapter('https://csl.example/search')
+        self.assertIs(self.service.session.get_adapter('http://csl.example/'), adapter)
+        self.assertEqual(adapter._pool_maxsize, 10)
+        self.assertIsInstance(adapter.max_retries, JitteredRetry)
+        self.assertEqual(adapter.max_retries.allowed_methods, frozenset(['GET']))
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+        # 429s are retried through the governor, not inside urllib3
+        self.assertNotIn(429, adapter.max_retries.status_forcelist)
+        self.assertEqual(self.service.timeout, (3.05, 15.0))
+
+    def test_backoff_is_jittered(self):
+        retry = JitteredRetry(total=5, backoff_factor=1)
+        with mock.patch.object(Retry, 'get_backoff_time', return_value=4.0):
+            waits = {retry.get_backoff_time() for _ in range(50)}
+        self.assertTrue(all(0 <= wait <= 4.0 for wait in waits))
+        self.assertGreater(len(waits), 1)
+        with mock.patch.object(Retry, 'get_backoff_time', return_value=0):
+            self.assertEqual(retry.get_backoff_time(), 0)
+
+    def test_fetch_data(self):
+        with mock.patch.object(self.service.session, 'get', return_value=json_response({'total': 1, 'results': []})) as get:
+            self.assertEqual(self.service.fetch_data(use_cache=False, name='acme', sources=None), {'total': 1, 'results': []})
+        get.assert_called_once_with(
+            'https://csl.example/search', params={'name': 'acme'}, timeout=(3.05, 15.0)
+        )
+
+        with mock.patch.object(self.service.session, 'get', return_value=json_response({}, status=503)):
+            self.assertEqual(self.service.fetch_data(use_cache=False, name='acme')['error'], 'API Error: 503')
+
+        with mock.patch.object(self.service.session, 'get', side_effect=requests.exceptions.ConnectTimeout('timed out')):
+            self.assertEqual(self.service.fetch_data(use_cache=False, name='acme'), {'error': 'timed out'})
+
+    def test_429_is_retried_through_the_governor(self):
+        responses = [json_response({}, status=429, headers={'Retry-After': '0'}), json_response({'total': 0, 'results': []})]
+        with mock.patch.object(self.service.session, 'get', side_effect=responses) as get, \
+                mock.patch.object(self.service.governor, 'throttle', wraps=self.service.governor.throttle) as throttle:
+            self.assertEqual(self.service.fetch_data(use_cache=False, name='acme'), {'total': 0, 'results': []})
+        self.assertEqual(get.call_count, 2)
+        throttle.assert_called_once_with(0.0)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    """
+    Equivalent searches share one cache entry; entries expire, the least
+    recently used is evicted first, and errors are never cached.
+    """
+
+    def test_canonical_keys(self):
+        url = 'https://csl.example/search'
+        self.assertEqual(
+            make_cache_key(url, {'name': ' John  SMITH ', 'sources': 'sdn,EL', 'offset': 0}),
+            make_cache_key(url, {'name': 'john smith', 'sources': 'EL, SDN'}),
+        )
+        self.assertNotEqual(
+            make_cache_key(url, {'name': 'john smith'}),
+            make_cache_key(url, {'name': 'john smith', 'countries': 'IR'}),
+        )
+
+    def test_expiry_and_eviction(self):
+        backend = InProcessCache(ttl=60, max_entries=2)
+        backend.set('a', {'results': [1]})
+        backend.set('b', {'results': [2]})
+        backend.get('a')
+        backend.set('c', {'results': [3]})
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), {'results': [1]})
+
+        # Callers get their own copy
+        backend.get('a')['results'].append(99)
+        self.assertEqual(backend.get('a'), {'results': [1]})
+
+        with mock.patch('core.services.response_cache.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(backend.get('a'))
+
+    @override_settings(CSL_API_URL='https://csl.example/search', CSL_API_RATE_LIMIT=0)
+    def test_fetch_data_uses_cache(self):
+        service = CSLService()
+        service.cache = ResponseCache(InProcessCache(ttl=60, max_entries=10))
+        with mock.patch.object(service.session, 'get', return_value=json_response({'total': 0, 'results': []})) as get:
+            service.fetch_data(name='Smith')
+            service.fetch_data(name=' smith ')
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(service.cache.stats()['hits'], 1)
+
+        with mock.patch.object(service.session, 'get', return_value=json_response({}, status=500)) as get:
+            service.fetch_data(name='Jones')
+            service.fetch_data(name='Jones')
+        self.assertEqual(get.call_count, 2)
+
+    @override_settings(CSL_API_URL='https://csl.example/search', CSL_API_RATE_LIMIT=0)
+    def test_ingested_flag_lives_with_the_response(self):
+        service = CSLService()
+        service.cache = ResponseCache(InProcessCache(ttl=60, max_entries=1))
+        data = {'total': 1, 'results': [{'id': 'x-1', 'name': 'Acme Trading'}]}
+        with mock.patch.object(service.session, 'get', side_effect=lambda *args, **kwargs: json_response(data)), \
+                mock.patch.object(service, 'store_entities') as store, \
+                mock.patch('core.services.csl_service.search_log'):
+            self.assertEqual(service.search_and_store('acme'), data)
+            self.assertEqual(service.search_and_store('acme'), data)
+            self.assertEqual(store.call_count, 1)
+
+            # Evicting the response also drops the flag, so the refetch is stored again
+            service.search_and_store('globex')
+            service.search_and_store('acme')
+        self.assertEqual(store.call_count, 3)
+
+
+def page(start, count, **overrides):
+    """CSL API results for entities start..start+count with one address and ID each"""
+    return [
+        {
+            'id': f'ingest-{i}',
+            'name': f'Acme Trading {i}',
+            'source_list': 'SDN',
+            'addresses': [{'address': f'{i} Main St', 'city': 'Tehran', 'country': 'IR'}],
+            'ids': [{'type': 'Passport', 'number': f'P{i}'}],
+            **overrides,
+        }
+        for i in range(start, start + count)
+    ]
+
+
+@override_settings(CSL_API_URL='https://csl.example/search', CSL_API_RATE_LIMIT=0)
+class PagedFetchTests(SimpleTestCase):
+    """
+    Pages are fetched concurrently but yielded in offset order, a bounded
+    number ahead of the consumer, and a failed page stops the iteration.
+    """
+
+    def setUp(self):
+        self.service = CSLService()
+        self.offsets = []
+
+    def fetch(self, total, failing=None):
+        def fetch_data(use_cache, priority, size, offset, **kwargs):
+            self.offsets.append(offset)
+            # Later pages finish first
+            time.sleep(0.001 * ((total - offset) // size % 4))
+            if offset == failing:
+                return {'error': 'API Error: 500'}
+            return {'total': total, 'results': [{'id': i} for i in range(offset, min(offset + size, total))]}
+        return mock.patch.object(self.service, 'fetch_data', side_effect=fetch_data)
+
+    def test_pages_in_order(self):
+        with self.fetch(total=95):
+            pages = list(self.service.iter_pages(page_size=10, workers=3, rate=0, name='acme'))
+        self.assertEqual([result['id'] for page in pages for result in page['results']], list(range(95)))
+        self.assertEqual(sorted(self.offsets), list(range(0, 95, 10)))
+
+        with self.fetch(total=4):
+            self.assertEqual(len(list(self.service.iter_pages(page_size=10, rate=0))), 1)
+
+    def test_prefetch_is_bounded(self):
+        with self.fetch(total=1000):
+            pages = self.service.iter_pages(page_size=10, workers=2, rate=0)
+            next(pages)
+            next(pages)
+            # The first page, then at most two per worker ahead of the consumer
+            self.assertLessEqual(len(self.offsets), 1 + 2 * 2)
+            pages.close()
+
+    def test_failed_page_raises(self):
+        with self.fetch(total=50, failing=30):
+            with self.assertRaisesMessage(CSLAPIError, 'offset 30'):
+                list(self.service.iter_pages(page_size=10, workers=2, rate=0))
+
+
+@skipUnless(httpx, 'httpx is not installed')
+@override_settings(CSL_API_URL='https://csl.example/search', CSL_API_RATE_LIMIT=0)
+class AsyncServiceTests(SimpleTestCase):
+    """
+    The async client retries like the sync one, and runs the blocking cache
+    and governor calls in worker threads rather than on the event loop.
+    """
+
+    def setUp(self):
+        self.service = AsyncCSLService(CSLService())
+        self.responses = []
+        self.requests = []
+
+        def handler(request):
+            self.requests.append(request)
+            return self.responses.pop(0)
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        patcher = mock.patch.object(self.service, 'get_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def track_threads(self, target, name):
+        """Record the thread each call of target.name runs on"""
+        threads = []
+        original = getattr(target, name)
+
+        def call(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return original(*args, **kwargs)
+
+        patcher = mock.patch.object(target, name, side_effect=call)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return threads
+
+    async def test_cache_runs_off_the_loop(self):
+        get_threads = self.track_threads(self.service.service.cache, 'get')
+        set_threads = self.track_threads(self.service.service.cache, 'set')
+        self.responses.append(httpx.Response(200, json={'total': 1, 'results': []}))
+
+        self.assertEqual(await self.service.fetch_data(name='acme'), {'total': 1, 'results': []})
+        self.assertEqual(await self.service.fetch_data(name='acme'), {'total': 1, 'results': []})
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(len(get_threads), 2)
+        self.assertEqual(len(set_threads), 1)
+        self.assertNotIn(threading.get_ident(), get_threads + set_threads)
+        await self.client.aclose()
+
+    async def test_throttle_and_retry(self):
+        throttle_threads = self.track_threads(self.service.service.governor, 'throttle')
+        self.responses += [
+            httpx.Response(429, headers={'Retry-After': '0'}),
+            httpx.Response(503, headers={'Retry-After': '0'}),
+            httpx.Response(200, json={'total': 0, 'results': []}),
+        ]
+        self.assertEqual(await self.service.fetch_data(use_cache=False, name='acme'), {'total': 0, 'results': []})
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(len(throttle_threads), 1)
+        self.assertNotEqual(throttle_threads[0], threading.get_ident())
+        await self.client.aclose()
+
+
+class UpstreamGovernorTests(SimpleTestCase):
+    """
+    The governor enforces the token bucket and the concurrency cap, admits
+    interactive calls ahead of bulk ones, and keeps the bulk reserve.
+    """
+
+    def wait_for(self, governor, priority, count):
+        """Block until `count` callers of `priority` are queued"""
+        deadline = time.monotonic() + 5
+        while governor.stats()['priorities'][priority]['waiting'] < count:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_burst_then_timeout(self):
+        governor = UpstreamGovernor(rate=1, burst=2)
+        for _ in range(2):
+            with governor.slot(timeout=0):
+                pass
+        with self.assertRaises(RateLimitTimeout):
+            governor.acquire(timeout=0.05)
+        stats = governor.stats()
+        self.assertEqual((stats['in_flight'], stats['priorities'][INTERACTIVE]['timeouts']), (0, 1))
+
+    def test_throttle_pauses_the_bucket(self):
+        governor = UpstreamGovernor(rate=50, burst=5)
+        governor.throttle(0.2)
+        self.assertGreaterEqual(governor.acquire(), 0.15)
+        self.assertEqual(governor.stats()['throttled'], 1)
+
+    def test_concurrency_cap(self):
+        governor = UpstreamGovernor(rate=0, burst=1, max_concurrency=1)
+        governor.acquire()
+        with self.assertRaises(RateLimitTimeout):
+            governor.acquire(timeout=0.05)
+        governor.release()
+        with governor.slot(timeout=0):
+            self.assertEqual(governor.stats()['in_flight'], 1)
+
+    def test_unlimited_calls_skip_the_cap(self):
+        governor = UpstreamGovernor(rate=0, burst=1, max_concurrency=1)
+        governor.acquire()
+        # The async client's calls aren't held back by the sync client's cap, nor hold it
+        for _ in range(3):
+            governor.acquire(timeout=0, limited=False)
+        self.assertEqual(governor.stats()['in_flight'], 4)
+        governor.release()
+        with governor.slot(timeout=0):
+            pass
+        for _ in range(3):
+            governor.release(limited=False)
+        self.assertEqual(governor.stats()['in_flight'], 0)
+
+    def test_interactive_calls_go_first(self):
+        governor = UpstreamGovernor(rate=0, burst=1, max_concurrency=1)
+        governor.acquire()
+        admitted = []
+
+        def call(priority):
+            with governor.slot(priority):
+                admitted.append(priority)
+
+        threads = []
+        for priority, queued in ((BULK, 2), (INTERACTIVE, 2)):
+            for _ in range(queued):
+                threads.append(threading.Thread(target=call, args=(priority,)))
+                threads[-1].start()
+            self.wait_for(governor, priority, queued)
+        governor.release()
+        for thread in threads:
+            thread.join()
+        # Bulk calls queued first, but every interactive call is admitted ahead of them
+        self.assertEqual(admitted, [INTERACTIVE, INTERACTIVE, BULK, BULK])
+
+    def test_bulk_reserve(self):
+        governor = UpstreamGovernor(rate=0.1, burst=4, bulk_reserve=0.5)
+        for _ in range(2):
+            with governor.slot(BULK, timeout=0):
+                pass
+        with self.assertRaises(RateLimitTimeout):
+            governor.acquire(BULK, timeout=0.05)
+        # The reserve is still there for interactive calls
+        for _ in range(2):
+            with governor.slot(INTERACTIVE, timeout=0):
+                pass
+
+    def test_store_is_called_outside_the_lock(self):
+        governor = UpstreamGovernor(rate=1, burst=1)
+        take = governor.store.take
+        blocked = []
+
+        def slow_take(floor):
+            # Another thread reading the stats must not block on this call
+            reader = threading.Thread(target=governor.stats)
+            reader.start()
+            reader.join(timeout=1)
+            blocked.append(reader.is_alive())
+            return take(floor)
+
+        with mock.patch.object(governor.store, 'take', side_effect=slow_take):
+            governor.acquire(timeout=5)
+        self.assertEqual(blocked, [False])
+
+
+class DatabaseTokenStoreTests(TestCase):
+    """
+    The shared bucket is created by the first take; reading it never writes.
+    """
+
+    def test_available_is_read_only(self):
+        store = DatabaseTokenStore(rate=1, capacity=5)
+        with self.assertNumQueries(1):
+            self.assertEqual(store.available(), 5)
+        self.assertFalse(RateLimitBucket.objects.exists())
+
+        self.assertEqual(store.take(), 0)
+        self.assertAlmostEqual(store.available(), 4, delta=0.1)
+
+
+class BulkIngestTests(TestCase):
+    """
+    A page of results is stored with a fixed number of queries, and
+    re-ingesting an entity replaces its children instead of adding to them.
+    """
+
+    def test_query_count_is_fixed(self):
+        # savepoint, existing lookup, entities, aliases, addresses, IDs,
+        # facet upsert, version bump (savepoint, update, read, upsert, release), release
+        with self.assertNumQueries(12):
+            csl_service.store_entities(page(0, 10))
+        with self.assertNumQueries(12):
+            csl_service.store_entities(page(10, 40))
+        self.assertEqual(ScreeningEntity.objects.count(), 50)
+        self.assertEqual(Address.objects.count(), 50)
+
+    def test_reingest_replaces_children(self):
+        csl_service.store_entities(page(0, 3))
+        first = ScreeningEntity.objects.get(source_id='ingest-1')
+
+        updated = page(0, 3, addresses=[
+            {'address': '1 New Rd', 'country': 'AE'}, {'address': '2 New Rd', 'country': 'AE'}
+        ])
+        entities = csl_service.store_entities(updated)
+
+        self.assertEqual([entity.pk for entity in entities][1], first.pk)
+        self.assertEqual(ScreeningEntity.objects.count(), 3)
+        self.assertEqual(
+            sorted(Address.objects.filter(entity=first).values_list('address', flat=True)),
+            ['1 New Rd', '2 New Rd'],
+        )
+        self.assertEqual(EntityID.objects.filter(entity=first).count(), 1)
+
+    def test_later_duplicate_wins(self):
+        results = page(0, 1) + page(0, 1, name='Acme Trading Renamed')
+        entities = csl_service.store_entities(results)
+        self.assertEqual(len(entities), 1)
+        self.assertEqual(ScreeningEntity.objects.get().name, 'Acme Trading Renamed')
+        self.assertEqual(Address.objects.count(), 1)
+
+
+class AddressNormalizationTests(SimpleTestCase):
+    """
+    Address index keys fold case, diacritics, punctuation and street words,
+    and countries resolve to ISO alpha-2 codes from codes, names and aliases.
+    """
+
+    def test_canonical_country(self):
+        for value in ('IR', 'ir', 'IRN', 'Iran', 'iran, islamic republic of', 'Islamic Republic of Iran'):
+            self.assertEqual(canonical_country(value), 'IR', value)
+        self.assertEqual(canonical_country('UK'), 'GB')
+        self.assertEqual(canonical_country("Côte d'Ivoire"), 'CI')
+        self.assertEqual(canonical_country('North Korea'), 'KP')
+        # Unknown values are kept, folded, so they still match themselves
+        self.assertEqual(canonical_country('Narnia-land'), 'NARNIA LAND')
+        self.assertIsNone(canonical_country(''))
+        self.assertIsNone(canonical_country(None))
+
+    def test_street_and_postal_code(self):
+        self.assertEqual(fold_street('12 Main Street, Suite 4'), '12 main st ste 4')
+        self.assertEqual(fold_street('12 MAIN ST.'), '12 main st')
+        self.assertEqual(fold_street('Königstraße 5'), 'konigstrasse 5')
+        self.assertEqual(fold_street('Haupt Straße 5'), 'haupt st 5')
+        self.assertEqual(fold_postal_code('sw1a 1aa'), 'SW1A1AA')
+        self.assertEqual(fold_postal_code('SW1A-1AA'), 'SW1A1AA')
+
+    def test_address_keys(self):
+        self.assertEqual(
+            address_keys({'address': '5 North Avenue', 'city': 'Zürich', 'state': 'ZH', 'country': 'Switzerland'}),
+            {
+                'street_key': '5 n ave', 'city_key': 'zurich', 'state_key': 'zh',
+                'postal_key': None, 'country_key': 'CH',
+            },
+        )
+        self.assertEqual(set(address_keys({}).values()), {None})
+
+    def test_migration_matches_service(self):
+        # Migration 0010 carries its own copy of the normalizer to backfill existing rows
+        migration = importlib.import_module('api.migrations.0010_address_index')
+        countries = migration.country_lookup()
+        for fields in (
+            {'address': '12 Main Street', 'city': 'Tehran', 'state': None, 'postal_code': None, 'country': 'Iran'},
+            {'address': 'Königstraße 5', 'city': 'Zürich', 'state': 'ZH', 'postal_code': '8001', 'country': 'CHE'},
+            {'address': None, 'city': '', 'state': None, 'postal_code': 'sw1a 1aa', 'country': 'UK'},
+            {'address': 'PO Box 7', 'city': None, 'state': None, 'postal_code': None, 'country': 'Narnia'},
+        ):
+            self.assertEqual(migration.address_keys(fields, countries), address_keys(fields), fields)
+
+
+class IdentifierNormalizationTests(SimpleTestCase):
+    """
+    Identifiers normalize to their upper-cased letters and digits, the same
+    way in the service and in the migration that backfilled them.
+    """
+
+    def test_normalize_id_number(self):
+        self.assertEqual(normalize_id_number('ab-123 456'), 'AB123456')
+        self.assertEqual(normalize_id_number(' A.B/123\t'), 'AB123')
+        self.assertEqual(normalize_id_number('Ñ-0042'), 'N0042')
+        self.assertEqual(normalize_id_number('--'), '')
+        self.assertEqual(normalize_id_number(None), '')
+
+    def test_migration_matches_service(self):
+        migration = importlib.import_module('api.migrations.0011_entityid_normalized_number')
+        for value in ('ab-123 456', ' A.B/123\t', 'Ñ-0042', 'IR 1234-5678', '--', None):
+            self.assertEqual(migration.normalize_id_number(value), normalize_id_number(value), value)
+
+
+class DumpParserTests(SimpleTestCase):
+    """
+    The dump parser streams array items across read-chunk boundaries, from
+    a bare array or from the results member of the CSL JSON file.
+    """
+
+    def test_items_across_chunks(self):
+        items = [{'name': f'Acme "{i}"', 'addresses': [{'city': 'Tehran'}]} for i in range(20)] + [7, 'x', None]
+        document = json.dumps({'sources_used': [{'source': 'SDN'}], 'total': 23, 'results': items}, indent=1)
+        with mock.patch('core.services.mirror.READ_CHUNK_SIZE', 5):
+            self.assertEqual(list(iter_json_array(io.StringIO(document))), items)
+            self.assertEqual(list(iter_json_array(io.StringIO(json.dumps(items)))), items)
+        self.assertEqual(list(iter_json_array(io.StringIO('{"results": []}'))), [])
+
+    def test_malformed_documents(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('{"total": 0}')))
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('[{"name": "Acme"}, {"name"')))
+
+
+class Listing(CSLService):
+    """CSL service whose paged search returns one canned page"""
+
+    def __init__(self, page):
+        self.page = page
+
+    def iter_pages(self, page_size=100, sources=None, **kwargs):
+        yield self.page
+
+
+@override_settings(CSL_MIRROR_MAX_REMOVE_FRACTION=1.0)
+class MirrorSyncTests(TestCase):
+    """
+    A re-sync only writes new and changed records, and soft-deletes the
+    ones that are no longer listed, unless the listing looks truncated.
+    """
+
+    def sync(self, results, **options):
+        sync = MirrorSync(csl_service, publish=False, **options)
+        with mock.patch.object(csl_service, 'store_entities', wraps=csl_service.store_entities) as store:
+            stats = sync.sync_from_dump(io.StringIO(json.dumps({'results': results})))
+        stored = [entity['id'] for call in store.call_args_list for entity in call.args[0]]
+        return stats, stored
+
+    def test_resync(self):
+        stats, stored = self.sync(page(0, 5))
+        self.assertEqual((stats['inserted'], stats['updated'], stats['unchanged']), (5, 0, 0))
+        self.assertEqual(len(stored), 5)
+
+        # ingest-1 changed, ingest-4 dropped off the list
+        results = page(0, 4)
+        results[1]['name'] = 'Acme Trading Renamed'
+        stats, stored = self.sync(results)
+        self.assertEqual(
+            (stats['inserted'], stats['updated'], stats['unchanged'], stats['removed']), (0, 1, 3, 1)
+        )
+        self.assertEqual(stored, ['ingest-1'])
+        self.assertFalse(ScreeningEntity.objects.get(source_id='ingest-4').is_active)
+        self.assertEqual(ScreeningEntity.objects.get(source_id='ingest-1').name, 'Acme Trading Renamed')
+
+        # A removed record that comes back is reactivated
+        stats, stored = self.sync(page(0, 5))
+        self.assertEqual(stored, ['ingest-1', 'ingest-4'])
+        self.assertEqual(ScreeningEntity.objects.filter(is_active=True).count(), 5)
+
+    def test_truncated_listing_removes_nothing(self):
+        self.sync(page(0, 5))
+
+        # An empty dump, an empty API listing and a listing short of its total
+        with self.assertRaises(MirrorSyncError):
+            self.sync([])
+        for listing in ({'total': 0, 'results': []}, {'total': 5, 'results': page(0, 3)}):
+            with self.assertRaises(MirrorSyncError):
+                MirrorSync(Listing(listing), publish=False).sync_from_api()
+        self.assertEqual(ScreeningEntity.objects.filter(is_active=True).count(), 5)
+
+    def test_removal_cap(self):
+        self.sync(page(0, 5))
+
+        with self.assertRaisesMessage(MirrorSyncError, 'Refusing to remove 2 of 5'):
+            self.sync(page(0, 3), max_remove_fraction=0.2)
+        self.assertEqual(ScreeningEntity.objects.filter(is_active=True).count(), 5)
+
+        stats, _ = self.sync(page(0, 3), max_remove_fraction=0.4)
+        self.assertEqual(stats['removed'], 2)
+        self.assertEqual(ScreeningEntity.objects.filter(is_active=True).count(), 3)
+
+
+class SearchLogWriterTests(SimpleTestCase):
+    """
+    Shutdown waits for the background thread's last flush, so nothing is
+    written after the caller goes on to close the database.
+    """
+
+    def test_shutdown_joins_the_thread(self):
+        writer = SearchLogWriter(flush_interval=3600)
+        written = []
+        with mock.patch.object(writer, '_write', side_effect=written.extend):
+            writer.log('acme')
+            thread = writer._thread
+            writer.shutdown()
+            self.assertFalse(thread.is_alive())
+            self.assertEqual([record.query_text for record in written], ['acme'])
+
+            # Logging again starts a new thread
+            writer.log('globex')
+            self.assertIsNot(writer._thread, thread)
+            writer.shutdown()
+        self.assertEqual(len(written), 2)
+        self.assertEqual(writer.pending(), 0)
+
+
+class SingleFlightTests(SimpleTestCase):
+    """
+    Concurrent identical calls share one execution; each caller gets the result.
+    """
+
+    def test_concurrent_calls_share_one_execution(self):
+        flights = SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return {'results': [{'name': 'Acme Trading'}]}
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do('acme', fetch)))
+        leader.start()
+        started.wait()
+        waiters = [
+            threading.Thread(target=lambda: results.append(flights.do('acme', fetch)))
+            for _ in range(5)
+        ]
+        for thread in waiters:
+            thread.start()
+        for thread in [leader, *waiters]:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'results': [{'name': 'Acme Trading'}]}] * 6)
+        self.assertEqual(flights.stats(), {'executed': 1, 'shared': 5, 'in_flight': 0})
+
+        # Once finished, the next call runs again
+        flights.do('acme', fetch)
+        self.assertEqual(len(calls), 2)
+
+
+class MatchSnapshotTests(TestCase):
+    """
+    A mapped snapshot matches and describes entities like the database-built
+    index, and later changes show through until a new snapshot is swapped in.
+    """
+
+    def setUp(self):
+        csl_service.store_entities([
+            {
+                'id': f'snap-{i}',
+                'name': f'Acme Trading {i}',
+                'alt_names': [f'Acme Intl {i}'],
+                'source_list': 'SDN',
+                'addresses': [{'address': f'{i} Main St', 'city': 'Tehran', 'country': 'Iran'}],
+            }
+            for i in range(20)
+        ])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'match.snapshot')
+        write_snapshot(self.path)
+
+    def test_snapshot_matches_database_index(self):
+        from_db = NameMatcher()
+        mapped = NameMatcher(snapshot_path=self.path, check_interval=0)
+        for query in ['Acme Trading 7', 'acme intl 12', 'Akme Tradng']:
+            self.assertEqual(mapped.search(query, min_score=70), from_db.search(query, min_score=70))
+
+        ids = list(from_db.search('Acme Trading 3', min_score=70))
+        with self.assertNumQueries(0):
+            described = mapped.describe(ids)
+        self.assertEqual(described, BatchScreener().describe_entities(ids))
+        self.assertEqual(described[ids[0]]['countries'], ['IR'])
+
+    def test_changes_until_swapped(self):
+        mapped = NameMatcher(snapshot_path=self.path, check_interval=0)
+        mapped.ensure_loaded()
+        entity = ScreeningEntity.objects.get(source_id='snap-5')
+        entity.name = 'Globex Holdings'
+        entity.alt_names = []
+        entity.save()
+        mapped.update_entities([entity])
+        self.assertIn(entity.pk, mapped.search('Globex Holdings'))
+        self.assertNotIn(entity.pk, mapped.search('Acme Trading 5'))
+        self.assertEqual(mapped.describe([entity.pk]), {})
+
+        # The next snapshot includes the rename, so the overlay is dropped on swap
+        write_snapshot(self.path)
+        self.assertIn(entity.pk, mapped.search('Globex Holdings'))
+        self.assertEqual(mapped.stats()['overlay_entities'], 0)
+        self.assertEqual(mapped.describe([entity.pk])[entity.pk]['name'], 'Globex Holdings')
+
+
+class BatchScreeningTests(TestCase):
+    """
+    Source list and country restrictions apply before each name's matches
+    are cut to the limit, so weaker matches on the requested lists survive.
+    """
+
+    def setUp(self):
+        csl_service.store_entities([
+            {
+                'id': f'sdn-{i}', 'name': f'Acme Trading {i}', 'source_list': 'SDN',
+                'addresses': [{'city': 'Tehran', 'country': 'IR'}],
+            }
+            for i in range(5)
+        ] + [{
+            'id': 'el-1', 'name': 'Acme Tradeco Holdings', 'source_list': 'EL',
+            'addresses': [{'city': 'Shenzhen', 'country': 'China'}],
+        }])
+        name_matcher.load()
+        self.rows = [{'name': 'Acme Trading', 'country': '', 'address': ''}]
+
+    def matched(self, rows, **options):
+        results = BatchScreener(limit=3, min_score=70, use_cache=False, **options).screen(rows)
+        return [[match['name'] for match in result['matches']] for result in results]
+
+    def test_restrictions_before_limit(self):
+        self.assertEqual(len(self.matched(self.rows)[0]), 3)
+        self.assertEqual(self.matched(self.rows, sources=['EL']), [['Acme Tradeco Holdings']])
+        matched = self.matched(self.rows, sources=['SDN'])[0]
+        self.assertEqual(len(matched), 3)
+        self.assertTrue(all(name.startswith('Acme Trading ') for name in matched))
+
+        # Rows with the same name but another country are matched separately
+        rows = [dict(self.rows[0], country='CN'), dict(self.rows[0], country='IR'), dict(self.rows[0], country='CN')]
+        matched = self.matched(rows)
+        self.assertEqual(matched[0], ['Acme Tradeco Holdings'])
+        self.assertEqual(len(matched[1]), 3)
+        self.assertNotIn('Acme Tradeco Holdings', matched[1])
+        self.assertEqual(matched[2], matched[0])
+        self.assertEqual(self.matched(rows[:1], sources=['SDN']), [[]])
+
+
+@mock.patch.dict(JOB_HANDLERS, {'echo': lambda params, context: {'echo': params}})
+class JobQueueTests(TestCase):
+    """
+    Workers claim queued jobs oldest first, exactly once, and re-claim a
+    running job whose worker stopped renewing its lease.
+    """
+
+    def test_claims_oldest_first(self):
+        first = submit_job('echo', {'n': 1})
+        second = submit_job('echo', {'n': 2})
+
+        claimed = claim_next_job('worker-a')
+        self.assertEqual((claimed.pk, claimed.status, claimed.worker), (first.pk, Job.STATUS_RUNNING, 'worker-a'))
+        self.assertGreater(claimed.lease_expires_at, timezone.now())
+        self.assertEqual(claim_next_job('worker-b').pk, second.pk)
+        self.assertIsNone(claim_next_job('worker-c'))
+
+        run_job(claimed)
+        claimed.refresh_from_db()
+        self.assertEqual((claimed.status, claimed.result), (Job.STATUS_SUCCEEDED, {'echo': {'n': 1}}))
+        self.assertIsNone(claimed.lease_expires_at)
+
+    def test_expired_lease_is_reclaimed(self):
+        job = submit_job('echo')
+        crashed = claim_next_job('worker-a')
+        self.assertIsNone(claim_next_job('worker-b'))
+
+        Job.objects.filter(pk=job.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertLogs('core.services.jobs', 'WARNING'):
+            reclaimed = claim_next_job('worker-b')
+        self.assertEqual((reclaimed.pk, reclaimed.worker), (job.pk, 'worker-b'))
+
+        # The worker that lost its claim doesn't record an outcome
+        with mock.patch.dict(JOB_HANDLERS, {'echo': lambda params, context: {'stale': True}}):
+            run_job(crashed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.STATUS_RUNNING, None))
+        run_job(reclaimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.STATUS_SUCCEEDED, {'echo': {}}))
+
+    def test_failure_is_recorded(self):
+        submit_job('echo', {'n': 1})
+        job = claim_next_job('worker-a')
+        with mock.patch.dict(JOB_HANDLERS, {'echo': mock.Mock(side_effect=RuntimeError('upstream down'))}):
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertIn('upstream down', job.error)
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'csl_api_project.settings')
+# Let the search views use the async CSL client on the server's event loop
+os.environ.setdefault('CSL_ASGI', 'True')
 
 application = get_asgi_application()
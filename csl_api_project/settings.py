@@ -66,6 +66,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',  # Request metrics (removed from the chain when disabled)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
@@ -112,6 +113,10 @@ if USE_SQLITE:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Wait for the write lock instead of failing with "database is locked"
+            'OPTIONS': {
+                'timeout': 20,
+            },
         }
     }
 else:
@@ -175,7 +180,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.TimedJSONRenderer',  # JSONRenderer timing the 'serialize' stage
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_FILTER_BACKENDS': [
@@ -190,5 +195,93 @@ CSL_API_URL = os.getenv('CSL_API_URL')
 
 CSL_SUBSCRIPTION_KEY = os.getenv('CSL_SUBSCRIPTION_KEY')
 
+# CSL API /sources endpoint (defaults to the sibling of CSL_API_URL) and seconds between
+# scheduled delta refreshes of the changed source lists
+CSL_SOURCES_URL = os.getenv('CSL_SOURCES_URL')
+CSL_REFRESH_INTERVAL = int(os.getenv('CSL_REFRESH_INTERVAL', '3600'))
+
+# CSL HTTP client settings (connection pool, timeouts in seconds, retry policy)
+CSL_HTTP_POOL_SIZE = int(os.getenv('CSL_HTTP_POOL_SIZE', '10'))
+CSL_HTTP_CONNECT_TIMEOUT = float(os.getenv('CSL_HTTP_CONNECT_TIMEOUT', '3.05'))
+CSL_HTTP_READ_TIMEOUT = float(os.getenv('CSL_HTTP_READ_TIMEOUT', '15'))
+CSL_HTTP_MAX_RETRIES = int(os.getenv('CSL_HTTP_MAX_RETRIES', '3'))
+CSL_HTTP_BACKOFF_FACTOR = float(os.getenv('CSL_HTTP_BACKOFF_FACTOR', '0.5'))
+
+# Connection pool size for the async CSL client (ASGI deployments)
+CSL_ASYNC_MAX_CONNECTIONS = int(os.getenv('CSL_ASYNC_MAX_CONNECTIONS', '100'))
+
+# Served by an ASGI server, so views can wait on the CSL API on the event loop
+# (set by asgi.py; under WSGI the search views call the API synchronously)
+CSL_ASGI = os.getenv('CSL_ASGI', 'False') == 'True'
+
+# Quota for all CSL API calls: token bucket (requests per second, 0 = unlimited, and burst),
+# sync client calls in flight per process (0 = unlimited; the async client is bounded by
+# CSL_ASYNC_MAX_CONNECTIONS), share of the burst bulk syncs leave to
+# interactive searches, where the bucket lives (local: per process, database: shared)
+# and the longest a call queues for a slot
+CSL_API_RATE_LIMIT = float(os.getenv('CSL_API_RATE_LIMIT', '10'))
+CSL_API_BURST = float(os.getenv('CSL_API_BURST', '20'))
+CSL_API_MAX_CONCURRENCY = int(os.getenv('CSL_API_MAX_CONCURRENCY', str(CSL_HTTP_POOL_SIZE)))
+CSL_API_BULK_RESERVE = float(os.getenv('CSL_API_BULK_RESERVE', '0.25'))
+CSL_API_RATE_LIMIT_STORE = os.getenv('CSL_API_RATE_LIMIT_STORE', 'local')
+CSL_API_QUEUE_TIMEOUT = float(os.getenv('CSL_API_QUEUE_TIMEOUT', '30'))
+
+# Multi-page fetches: concurrent page requests and maximum page requests per second (0 = unlimited)
+CSL_FETCH_WORKERS = int(os.getenv('CSL_FETCH_WORKERS', '4'))
+CSL_FETCH_RATE_LIMIT = float(os.getenv('CSL_FETCH_RATE_LIMIT', '5'))
+
+# Largest fraction of the active entities one mirror sync may soft-delete; a run
+# that would remove more fails instead (guards against truncated listings)
+CSL_MIRROR_MAX_REMOVE_FRACTION = float(os.getenv('CSL_MIRROR_MAX_REMOVE_FRACTION', '0.1'))
+
+# CSL response cache (TTL in seconds; 0 disables caching)
+# Backends: core.services.response_cache.InProcessCache, .DjangoCacheBackend, .RedisCacheBackend
+CSL_RESPONSE_CACHE = {
+    'BACKEND': os.getenv('CSL_CACHE_BACKEND', 'core.services.response_cache.InProcessCache'),
+    'TTL': int(os.getenv('CSL_CACHE_TTL', '300')),
+    'MAX_ENTRIES': int(os.getenv('CSL_CACHE_MAX_ENTRIES', '1024')),
+    'OPTIONS': {'url': os.getenv('CSL_CACHE_REDIS_URL')} if os.getenv('CSL_CACHE_REDIS_URL') else {},
+}
+
+# Make concurrent identical upstream searches in other processes wait for one another
+# (PostgreSQL advisory locks; pair with a shared response cache backend)
+CSL_SINGLE_FLIGHT_LOCK = os.getenv('CSL_SINGLE_FLIGHT_LOCK', 'False') == 'True'
+
+# Local fuzzy name matching: minimum score (0-100) and maximum matches per query
+CSL_MATCH_MIN_SCORE = int(os.getenv('CSL_MATCH_MIN_SCORE', '80'))
+CSL_MATCH_LIMIT = int(os.getenv('CSL_MATCH_LIMIT', '500'))
+
+# Shared match index: snapshot file mapped by every worker instead of a per-worker copy built
+# from the database (empty disables), and seconds between checks for a newly published version
+CSL_MATCH_SNAPSHOT = os.getenv('CSL_MATCH_SNAPSHOT', '')
+CSL_MATCH_SNAPSHOT_CHECK_INTERVAL = float(os.getenv('CSL_MATCH_SNAPSHOT_CHECK_INTERVAL', '5'))
+
+# Batch screening: worker processes (1 disables multiprocessing) and maximum rows per request
+CSL_SCREENING_WORKERS = int(os.getenv('CSL_SCREENING_WORKERS', str(os.cpu_count() or 1)))
+CSL_SCREENING_MAX_ROWS = int(os.getenv('CSL_SCREENING_MAX_ROWS', '100000'))
+
+# Seconds a running job's claim lasts without a heartbeat before another worker may re-claim it
+CSL_JOB_LEASE_SECONDS = int(os.getenv('CSL_JOB_LEASE_SECONDS', '300'))
+
+# Built-in instrumentation exported at /api/v1/metrics in the Prometheus text format
+CSL_METRICS_ENABLED = os.getenv('CSL_METRICS_ENABLED', 'False') == 'True'
+
+# Maximum identifiers per bulk ID lookup request
+CSL_ID_LOOKUP_MAX_IDS = int(os.getenv('CSL_ID_LOOKUP_MAX_IDS', '1000'))
+
+# Persist batch screening results until a source list they cover changes
+CSL_SCREENING_CACHE = os.getenv('CSL_SCREENING_CACHE', 'True') == 'True'
+
+# Default total count for keyset-paginated listings: exact, estimate (planner statistics) or none
+CSL_PAGINATION_COUNT = os.getenv('CSL_PAGINATION_COUNT', 'estimate')
+
+# Search history: buffer records and bulk-write them from a background thread
+CSL_SEARCH_LOG_ASYNC = os.getenv('CSL_SEARCH_LOG_ASYNC', 'True') == 'True'
+CSL_SEARCH_LOG_BATCH_SIZE = int(os.getenv('CSL_SEARCH_LOG_BATCH_SIZE', '100'))
+CSL_SEARCH_LOG_FLUSH_INTERVAL = float(os.getenv('CSL_SEARCH_LOG_FLUSH_INTERVAL', '2.0'))
+
+# Seconds each process caches the pre-aggregated dashboard statistics
+CSL_STATS_CACHE_TTL = float(os.getenv('CSL_STATS_CACHE_TTL', '60'))
+
 logger.info(f"CSL_API_URL loaded: {'Yes' if CSL_API_URL else 'No'}")
 logger.info(f"CSL_SUBSCRIPTION_KEY loaded: {'Yes' if CSL_SUBSCRIPTION_KEY else 'No'}")
@@ -1,3 +1,208 @@
-from django.test import TestCase
+from unittest import mock
+from urllib.parse import parse_qs
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.models import ScreeningEntity, SearchQuery
+from api.tests import make_entities
+from core.services.csl_service import csl_service
+from core.services.matching import name_matcher
+from core.services.search_log import search_log
+from core.services.stats import dataset_stats
+
+
+def tearDownModule():
+    # Stop the search log thread while the test database still exists
+    search_log.shutdown()
+
+
+class PageQueryCountTests(TestCase):
+    """
+    Guards against N+1 queries in the web pages: related rows are
+    prefetched, so the query count doesn't grow with the result size.
+    """
+
+    def setUp(self):
+        make_entities(15)
+        # on_commit hooks don't fire inside TestCase, so rebuild the index and stats directly
+        name_matcher.load()
+        dataset_stats.rebuild()
+        # Only flush the search log explicitly, on this test's connection
+        patcher = mock.patch.object(search_log, 'flush_interval', 3600)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        search_log.flush()
+
+    def test_index(self):
+        # latest entities, statistics
+        with self.assertNumQueries(2):
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_entities'], 15)
+        self.assertEqual(list(response.context['source_lists']), ['SDN'])
+
+    def test_search(self):
+        # entities, addresses, statistics (country and source list filter options);
+        # the search log is written later in one batch
+        with self.assertNumQueries(3):
+            response = self.client.get('/search/', {'q': 'Acme Trading'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_results'], 15)
+        self.assertEqual(response.context['countries'], ['AE', 'IR'])
+        country_facet = response.context['facets'][-1]
+        self.assertEqual([(item['value'], item['count']) for item in country_facet['values']], [('AE', 15), ('IR', 15)])
+        self.assertIn('country=AE', country_facet['values'][0]['url'])
+
+        self.assertEqual(search_log.pending(), 1)
+        # savepoint, insert, searches counter, release
+        with self.assertNumQueries(4):
+            search_log.flush()
+        logged = SearchQuery.objects.get()
+        self.assertEqual((logged.query_text, logged.results_count), ('Acme Trading', 15))
+        dataset_stats.invalidate()
+        self.assertEqual(dataset_stats.snapshot()['searches'], 1)
+
+    def test_entity_detail(self):
+        entity = ScreeningEntity.objects.first()
+        # entity, addresses, ids
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/entity/{entity.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(CSL_MATCH_LIMIT=3)
+    def test_filtered_search(self):
+        csl_service.store_entities([{
+            'id': 'el-1', 'name': 'Acme Tradeco Holdings', 'source_list': 'EL',
+            'addresses': [{'city': 'Shenzhen', 'country': 'CN'}],
+        }])
+        name_matcher.load()
+
+        response = self.client.get('/search/', {'q': 'Acme Trading'})
+        self.assertEqual(response.context['total_results'], 3)
+
+        for filters in ({'source_list': 'EL'}, {'country': 'CN'}, {'city': 'shenzhen'}):
+            response = self.client.get('/search/', {'q': 'Acme Trading', **filters})
+            self.assertEqual(response.context['total_results'], 1, filters)
+            self.assertEqual(response.context['entities'][0].name, 'Acme Tradeco Holdings')
+
+    def test_address_filters(self):
+        csl_service.store_entities([{
+            'id': 'uk-1', 'name': 'Acme Trading Londinium', 'source_list': 'EL',
+            'addresses': [
+                {'address': '10 Downing Street', 'city': 'London', 'postal_code': 'SW1A 2AA', 'country': 'UK'},
+                {'address': '1 Rue de Rivoli', 'city': 'Paris', 'country': 'France'},
+            ],
+        }])
+        name_matcher.load()
+
+        for filters in (
+            {'postal_code': 'sw1a2aa', 'city': 'LONDON'},
+            {'address': 'downing st', 'country': 'GBR'},
+            {'country': 'United Kingdom'},
+        ):
+            response = self.client.get('/search/', {'q': 'Acme Trading', **filters})
+            self.assertEqual([entity.source_id for entity in response.context['entities']], ['uk-1'], filters)
+
+        # Every criterion must hold for the same address
+        response = self.client.get('/search/', {'q': 'Acme Trading', 'postal_code': 'sw1a2aa', 'city': 'Paris'})
+        self.assertEqual(response.context['total_results'], 0)
+
+    def test_api_search_is_synchronous(self):
+        # Under WSGI the page calls the CSL API through the sync service, not on a per-request event loop
+        with mock.patch.object(csl_service, 'search_and_store', return_value={'total': 2, 'results': []}) as search:
+            response = self.client.get('/search/', {'q': 'Acme Trading', 'use_api': 'on', 'source_list': 'SDN'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(search.call_args.kwargs['sources'], ['SDN'])
+        self.assertEqual(response.context['total_results'], 15)
+
+
+class SearchFacetTests(TestCase):
+    """
+    The search page lists facet counts over all matches, with links that
+    refine by a value (dropping the page number) or clear it again.
+    """
+
+    def setUp(self):
+        make_entities(12)
+        csl_service.store_entities([{
+            'id': 'el-1', 'name': 'Acme Tradeco', 'source_list': 'EL', 'sdn_type': 'Entity',
+            'addresses': [{'city': 'Shenzhen', 'country': 'CN'}, {'city': 'Beijing', 'country': 'CN'}],
+        }])
+        name_matcher.load()
+        patcher = mock.patch.object(search_log, 'flush_interval', 3600)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        search_log.flush()
+
+    def sections(self, response):
+        return {
+            section['label']: {item['value']: item for item in section['values']}
+            for section in response.context['facets']
+        }
+
+    def test_counts_and_links(self):
+        response = self.client.get('/search/', {'q': 'Acme Trading', 'page': 2})
+        total = response.context['total_results']
+        self.assertGreater(total, 10)
+        sections = self.sections(response)
+        self.assertEqual(sum(item['count'] for item in sections['Source List'].values()), total)
+        self.assertEqual(sections['Source List']['EL']['count'], 1)
+        self.assertEqual(sections['Entity Type']['Entity']['count'], 1)
+        self.assertEqual(sections['Country']['CN']['count'], 1)
+        self.assertContains(response, 'Refine Results')
+
+        link = sections['Country']['CN']
+        self.assertFalse(link['selected'])
+        self.assertIn('country=CN', link['url'])
+        self.assertIn('q=Acme+Trading', link['url'])
+        self.assertNotIn('page=', link['url'])
+
+        response = self.client.get('/search/' + link['url'])
+        self.assertEqual([entity.name for entity in response.context['entities']], ['Acme Tradeco'])
+        sections = self.sections(response)
+        self.assertEqual(list(sections['Country']), ['CN'])
+        self.assertTrue(sections['Country']['CN']['selected'])
+        # Clicking the selected value again clears it
+        cleared = parse_qs(sections['Country']['CN']['url'][1:], keep_blank_values=True)
+        self.assertEqual(cleared['country'], [''])
+
+    def test_no_matches(self):
+        response = self.client.get('/search/', {'q': 'Zzyzx Qwerty'})
+        self.assertEqual(response.context['facets'], [])
+        self.assertNotContains(response, 'Refine Results')
+
+
+class MatcherFreshnessTests(TestCase):
+    """
+    The search page finds entities created or renamed through the API.
+    """
+
+    def setUp(self):
+        make_entities(2)
+        name_matcher.load()
+        patcher = mock.patch.object(search_log, 'flush_interval', 3600)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        search_log.flush()
+
+    def found(self, query):
+        response = self.client.get('/search/', {'q': query})
+        return [entity.name for entity in response.context['entities']]
+
+    def test_api_create_and_rename(self):
+        client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/v1/entities/', {'name': 'Volga Shipping', 'source_list': 'EL'}, format='json')
+        self.assertEqual(self.found('Volga Shiping'), ['Volga Shipping'])
+
+        entity = ScreeningEntity.objects.get(source_id='test-0')
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(f'/api/v1/entities/{entity.pk}/', {'name': 'Quuxcorp Limited'}, format='json')
+        self.assertEqual(self.found('Quuxcorp Limted'), ['Quuxcorp Limited'])
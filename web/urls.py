@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -5,7 +6,8 @@ app_name = 'web'
 
 urlpatterns = [
     path('', views.index, name='index'),
-    path('search/', views.search, name='search'),
+    # Under WSGI each async view call would run on a new event loop, with a new HTTP client
+    path('search/', views.search_async if settings.CSL_ASGI else views.search, name='search'),
     path('entity/<int:pk>/', views.entity_detail, name='entity_detail'),
     path('about/', views.about, name='about'),
 ]
\ No newline at end of file
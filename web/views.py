@@ -1,33 +1,88 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib import messages
-from api.models import ScreeningEntity, Address, SearchQuery
+from django.utils import timezone
+from api.models import ScreeningEntity
+from core.services.addresses import filter_entities_by_address
+from core.services.async_csl_service import async_csl_service
 from core.services.csl_service import csl_service
+from core.services.facets import facets_from_entities
+from core.services.matching import accept_queryset, name_matcher, rank_by_score
+from core.services.metrics import metrics
+from core.services.search_log import search_log
+from core.services.stats import dataset_stats
 from core.constants.csl_constants import CSL_SOURCES, CSL_ENTITY_TYPES
 
 
 def index(request):
     """Home page view"""
     # Get latest entities for display
-    latest_entities = ScreeningEntity.objects.all().order_by('-updated_at')[:10]
+    latest_entities = ScreeningEntity.objects.filter(is_active=True).order_by('-updated_at')[:10]
     
-    # Get search statistics
-    total_entities = ScreeningEntity.objects.count()
-    total_searches = SearchQuery.objects.count()
-    source_lists = ScreeningEntity.objects.values_list('source_list', flat=True).distinct()
+    # Get search statistics (pre-aggregated)
+    stats = dataset_stats.snapshot()
     
     context = {
         'latest_entities': latest_entities,
-        'total_entities': total_entities,
-        'total_searches': total_searches,
-        'source_lists': source_lists,
+        'total_entities': stats['active_entities'],
+        'total_searches': stats['searches'],
+        'source_lists': stats['source_lists'],
     }
     
-    return render(request, 'web/index.html', context)
+    with metrics.timer('render'):
+        return render(request, 'web/index.html', context)
+
+
+def api_search_kwargs(request):
+    """CSL API search arguments for the search page, or None if the API wasn't asked for"""
+    query = request.GET.get('q', '')
+    if not query or request.GET.get('use_api', 'off') != 'on':
+        return None
+    
+    source_list = request.GET.get('source_list', '')
+    entity_type = request.GET.get('entity_type', '')
+    country = request.GET.get('country', '')
+    return {
+        'query': query,
+        'sources': [source_list] if source_list else None,
+        'countries': [country] if country else None,
+        'entity_types': [entity_type] if entity_type else None,
+        'address': request.GET.get('address') or None,
+        'city': request.GET.get('city') or None,
+        'state': request.GET.get('state') or None,
+        'postal_code': request.GET.get('postal_code') or None,
+    }
 
 
 def search(request):
     """Search page view"""
+    search_kwargs = api_search_kwargs(request)
+    api_results = csl_service.search_and_store(**search_kwargs) if search_kwargs else None
+    return render_search(request, api_results)
+
+
+async def search_async(request):
+    """
+    Search page view for ASGI deployments (CSL_ASGI).
+    
+    The CSL API call is made asynchronously so it doesn't hold a worker
+    while waiting on trade.gov; the local search and rendering run in a thread.
+    """
+    search_kwargs = api_search_kwargs(request)
+    api_results = None
+    
+    if search_kwargs:
+        if async_csl_service is not None:
+            api_results = await async_csl_service.search_and_store(**search_kwargs)
+        else:
+            api_results = await sync_to_async(csl_service.search_and_store)(**search_kwargs)
+    
+    return await sync_to_async(render_search)(request, api_results)
+
+
+def render_search(request, api_results=None):
+    """Run the local search and render the search page"""
     query = request.GET.get('q', '')
     source_list = request.GET.get('source_list', '')
     entity_type = request.GET.get('entity_type', '')
@@ -41,92 +96,72 @@ def search(request):
     
     entities = []
     total_results = 0
+    facets = []
     
     if query:
-        # Record search query
-        SearchQuery.objects.create(
-            query_text=query,
-            results_count=0,  # Will be updated after search
-            search_params={
-                'source_list': source_list,
-                'entity_type': entity_type,
-                'country': country,
-                'address': address,
-                'city': city,
-                'state': state,
-                'postal_code': postal_code,
-                'use_api': use_api
-            }
-        )
+        started_at = timezone.now()
         
-        if use_api:
-            # Search using external API
-            api_results = csl_service.search_entities(
-                query=query,
-                sources=[source_list] if source_list else None,
-                countries=[country] if country else None,
-                entity_types=[entity_type] if entity_type else None,
-                address=address if address else None,
-                city=city if city else None,
-                state=state if state else None,
-                postal_code=postal_code if postal_code else None
-            )
-            
+        if api_results is not None:
+            # Results from the external API were already fetched and stored by search()
             if 'results' in api_results:
-                # Process and store results
-                for entity_data in api_results.get('results', []):
-                    csl_service.fetch_and_store_entity(entity_data)
-                
                 total_results = api_results.get('total', 0)
                 messages.success(request, f"Found {total_results} results from the CSL API")
         
         # Query database for results
-        queryset = ScreeningEntity.objects.all().order_by('-updated_at')  # Add explicit ordering to fix pagination warning
+        queryset = ScreeningEntity.objects.filter(is_active=True).prefetch_related('addresses').order_by('-updated_at')  # Add explicit ordering to fix pagination warning
         
-        if query:
-            queryset = queryset.filter(name__icontains=query)
-            
         if source_list:
             queryset = queryset.filter(source_list=source_list)
             
         if entity_type:
             queryset = queryset.filter(sdn_type=entity_type)
             
-        if country:
-            queryset = queryset.filter(addresses__country__iexact=country).distinct()
-            
-        if address:
-            queryset = queryset.filter(addresses__address__icontains=address).distinct()
-            
-        if city:
-            queryset = queryset.filter(addresses__city__iexact=city).distinct()
-            
-        if state:
-            queryset = queryset.filter(addresses__state__iexact=state).distinct()
-            
-        if postal_code:
-            queryset = queryset.filter(addresses__postal_code__iexact=postal_code).distinct()
+        # All address criteria must hold for the same address (one EXISTS on the address index)
+        address_criteria = {
+            'address': address, 'city': city, 'state': state, 'postal_code': postal_code, 'country': country
+        }
+        queryset = filter_entities_by_address(queryset, **address_criteria)
+        
+        # Ranked fuzzy matches from the in-memory name index, among the entities passing the filters
+        filtered = source_list or entity_type or any(address_criteria.values())
+        matches = name_matcher.search(query, accept=accept_queryset(queryset) if filtered else None)
+        queryset = queryset.filter(pk__in=list(matches))
+        
+        ranked = rank_by_score(queryset, matches)
+        
+        # Counts per source list, type and country across all results, from the loaded matches
+        facets = facet_links(request, facets_from_entities(ranked))
         
         # Paginate results
-        paginator = Paginator(queryset, 10)
+        paginator = Paginator(ranked, 10)
         
         try:
             entities = paginator.page(page_number)
-            total_results = queryset.count()
+            total_results = len(ranked)
         except PageNotAnInteger:
             entities = paginator.page(1)
         except EmptyPage:
             entities = paginator.page(paginator.num_pages)
         
-        # Update search query with result count
-        search_query = SearchQuery.objects.filter(query_text=query).order_by('-timestamp').first()
-        if search_query:
-            search_query.results_count = total_results
-            search_query.save()
+        # Log the search with its result count (buffered, written in the background)
+        search_log.log(
+            query,
+            results_count=total_results,
+            search_params={
+                'source_list': source_list,
+                'entity_type': entity_type,
+                'country': country,
+                'address': address,
+                'city': city,
+                'state': state,
+                'postal_code': postal_code,
+                'use_api': use_api
+            },
+            timestamp=started_at
+        )
     
-    # Get list of available countries and source lists for filters
-    countries = Address.objects.values_list('country', flat=True).distinct()
-    db_source_lists = ScreeningEntity.objects.values_list('source_list', flat=True).distinct()
+    # Get list of available countries and source lists for filters (pre-aggregated)
+    stats = dataset_stats.snapshot()
     
     context = {
         'query': query,
@@ -139,27 +174,55 @@ def search(request):
         'city': city,
         'state': state,
         'postal_code': postal_code,
-        'countries': sorted(c for c in countries if c),
-        'source_lists': sorted(db_source_lists),
+        'countries': stats['countries'],
+        'source_lists': stats['source_lists'],
         'csl_sources': CSL_SOURCES,  # Add CSL sources from constants
         'entity_types': CSL_ENTITY_TYPES,  # Add entity types from constants
-        'use_api': use_api
+        'use_api': use_api,
+        'facets': facets
     }
     
-    return render(request, 'web/search.html', context)
+    with metrics.timer('render'):
+        return render(request, 'web/search.html', context)
+
+
+# Facets shown on the search page: facet name, query parameter and heading
+WEB_FACETS = (
+    ('source_list', 'source_list', 'Source List'),
+    ('sdn_type', 'entity_type', 'Entity Type'),
+    ('country', 'country', 'Country'),
+)
+
+
+def facet_links(request, facet_counts):
+    """Attach a refine/clear link to each facet value, keeping the other search parameters"""
+    sections = []
+    for facet, param, label in WEB_FACETS:
+        values = []
+        for item in facet_counts[facet]:
+            params = request.GET.copy()
+            params.pop('page', None)
+            selected = params.get(param, '') == item['value']
+            params[param] = '' if selected else item['value']
+            values.append({**item, 'selected': selected, 'url': '?' + params.urlencode()})
+        if values:
+            sections.append({'label': label, 'values': values})
+    return sections
 
 
 def entity_detail(request, pk):
     """Entity detail page view"""
-    entity = get_object_or_404(ScreeningEntity, pk=pk)
+    entity = get_object_or_404(ScreeningEntity.objects.prefetch_related('addresses', 'ids'), pk=pk)
     
     context = {
         'entity': entity,
     }
     
-    return render(request, 'web/entity_detail.html', context)
+    with metrics.timer('render'):
+        return render(request, 'web/entity_detail.html', context)
 
 
 def about(request):
     """About page view"""
-    return render(request, 'web/about.html')
+    with metrics.timer('render'):
+        return render(request, 'web/about.html')